@@ -1,24 +1,59 @@
+import io
 import os
+import re
+import bisect
 import sys
+import time
+import queue
+import codecs
+import itertools
+import mmap
+import tempfile
+import threading
 import configparser
 import json
+import array
+import sqlite3
+import hashlib
+import heapq
+import fnmatch
+import multiprocessing
+try:
+    from re import _parser as sre_parse # Python 3.11+
+except ImportError:
+    import sre_parse
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QPlainTextEdit, QFileDialog, QStatusBar,
     QWidget, QHBoxLayout, QVBoxLayout, QLabel, QPushButton, QToolBar, QDockWidget,
-    QTreeView, QStackedWidget, QInputDialog, QTabWidget, QLineEdit,QMenuBar, QMenu, QMessageBox
+    QTreeView, QStackedWidget, QInputDialog, QTabWidget, QLineEdit,QMenuBar, QMenu, QMessageBox,
+    QAbstractScrollArea, QFrame, QTextEdit, QTreeWidget, QTreeWidgetItem, QListWidget, QListWidgetItem,
+    QFileIconProvider
 )
 from PyQt6.QtGui import (
-    QIcon, QAction, QSyntaxHighlighter, QTextCharFormat, QColor, QFont, QFileSystemModel,
-    QTextBlockFormat, QPalette, QPainter, QTextOption, QTextCursor, QKeySequence
+    QIcon, QAction, QSyntaxHighlighter, QTextCharFormat, QColor, QFont, QStandardItemModel, QStandardItem,
+    QTextBlockFormat, QPalette, QPainter, QTextOption, QTextCursor, QKeySequence, QTextLayout, QFontMetrics, QStaticText
+)
+from PyQt6.QtCore import (
+    QSize, Qt, QRect, QPoint, QPointF, QObject, QTimer, QThread, pyqtSignal,
+    QFileSystemWatcher, QStandardPaths, QEvent
 )
-from PyQt6.QtCore import QRegularExpression, QSize, Qt, QRect, QPoint
 
 class NumerosDeLineaArea(QWidget):
+    MAXIMO_GLIFOS = 4096 # Números preparados que se conservan (unas cuantas pantallas)
+
     def __init__(self, editor):
         super().__init__(editor)
         self.editor_texto = editor
         # Establecer el color de fondo para que coincida con el tema oscuro
         self.setStyleSheet("background-color: #383A59;") 
+
+        # Números ya preparados como QStaticText; al desplazar sólo se preparan los nuevos
+        self.fuente = QFont(self.font())
+        self.fuente.setPointSize(10)
+        metricas = QFontMetrics(self.fuente)
+        self.ancho_digito = max(metricas.horizontalAdvance(d) for d in '0123456789')
+        self.alto_digito = metricas.height()
+        self.glifos = {}
         
     def sizeHint(self):
         """Devuelve el ancho preferido para esta barra lateral."""
@@ -28,82 +63,3960 @@ class NumerosDeLineaArea(QWidget):
         """Maneja el evento de dibujo (pintar los números de línea)."""
         self.editor_texto.dibujar_area_numeros(event)
 
-# --- 1. Definición del Resaltador de Sintaxis ---
+    def dibujar_numero(self, painter, numero, derecha, top, alto):
+        """Pinta ``numero`` alineado a la derecha de ``derecha`` y centrado en la franja ``top``/``alto``."""
+        glifo = self.glifos.get(numero)
+        if glifo is None:
+            if len(self.glifos) >= self.MAXIMO_GLIFOS:
+                self.glifos.clear()
+            glifo = QStaticText(str(numero))
+            glifo.setTextFormat(Qt.TextFormat.PlainText)
+            glifo.prepare(font=self.fuente)
+            self.glifos[numero] = glifo
+        x = derecha - len(str(numero)) * self.ancho_digito
+        painter.drawStaticText(x, top + (alto - self.alto_digito) // 2, glifo)
+
+# --- 1. Motor de tokenización ---
+
+# Caracteres fuera del BMP: ocupan dos unidades UTF-16 en las posiciones de Qt.
+_PATRON_ASTRAL = re.compile('[\U00010000-\U0010FFFF]')
+
+def ajustar_posiciones_utf16(texto, tramos):
+    """Convierte tramos con índices de Python a posiciones UTF-16 de Qt."""
+    if texto.isascii() or not _PATRON_ASTRAL.search(texto):
+        return tramos
+    astrales = [m.start() for m in _PATRON_ASTRAL.finditer(texto)]
+    ajustados = []
+    for inicio, longitud, categoria in tramos:
+        inicio_qt = inicio + bisect.bisect_left(astrales, inicio)
+        fin_qt = inicio + longitud + bisect.bisect_left(astrales, inicio + longitud)
+        ajustados.append((inicio_qt, fin_qt - inicio_qt, categoria))
+    return ajustados
+
+class Gramatica:
+    """Reglas de un lenguaje compiladas en una única expresión alternada.
+
+    Cada regla es un grupo con nombre dentro de la alternancia; el bloque se
+    recorre una sola vez y el primer grupo que coincide en cada posición
+    decide la categoría, así que los tramos nunca se solapan.
+
+    ``bloques`` son construcciones que pueden ocupar varias líneas
+    (categoría, apertura, cierre). El estado léxico de una línea es 0 fuera de
+    ellas o ``i + 1`` si termina dentro de ``bloques[i]``.
+
+    Una gramática no se modifica después de construirse, así que la misma
+    instancia se comparte entre editores y con el hilo de tokenización.
+    """
+    def __init__(self, reglas, bloques=()):
+        self.categorias = {}
+        self.bloques = tuple(bloques)
+        self.aperturas = {} # Nombre de grupo -> índice en self.bloques
+        alternativas = []
+        # Las aperturas van primero para que '"""' gane a la cadena simple '""'
+        for indice, (categoria, apertura, _) in enumerate(self.bloques):
+            nombre = f"b{indice}"
+            self.categorias[nombre] = categoria
+            self.aperturas[nombre] = indice
+            alternativas.append(f"(?P<{nombre}>{re.escape(apertura)})")
+        for indice, (categoria, patron) in enumerate(reglas):
+            nombre = f"r{indice}"
+            self.categorias[nombre] = categoria
+            alternativas.append(f"(?P<{nombre}>{patron})")
+        self.patron = re.compile('|'.join(alternativas)) if alternativas else None
+
+    @classmethod
+    def desde_sintaxis(cls, seccion):
+        """Compila las reglas declaradas en la sección [syntax] de un .lib.
+
+        El orden de las reglas fija su prioridad: comentarios, cadenas,
+        patrones propios, funciones, palabras clave y operadores.
+        """
+        def lista(clave):
+            return seccion.get(clave, '').split()
+
+        reglas = []
+        def patron(categoria):
+            valor = seccion.get(f'{categoria}_pattern', '').strip()
+            if valor:
+                reglas.append((categoria, valor))
+
+        patron('comment')
+        for inicio in lista('line_comment'):
+            reglas.append(('comment', re.escape(inicio) + '.*'))
+        patron('string')
+        for comilla in lista('strings'): # Un solo carácter; admite escapes con barra invertida
+            c = re.escape(comilla)
+            reglas.append(('string', f'{c}(?:[^{c}\\\\]|\\\\.)*{c}'))
+        patron('keyword')
+        patron('function')
+        if seccion.getboolean('functions', fallback=False):
+            reglas.append(('function', r'\b[A-Za-z0-9_]+(?=\()'))
+        palabras = lista('keywords')
+        if palabras:
+            reglas.append(('keyword', r'\b(?:' + '|'.join(map(re.escape, palabras)) + r')\b'))
+        patron('operator')
+        operadores = lista('operators')
+        if operadores:
+            if all(len(operador) == 1 for operador in operadores):
+                reglas.append(('operator', '[' + ''.join(map(re.escape, operadores)) + ']+'))
+            else:
+                operadores.sort(key=len, reverse=True)
+                reglas.append(('operator', '(?:' + '|'.join(map(re.escape, operadores)) + ')+'))
+
+        bloques = []
+        delimitadores = lista('block_comment')
+        for apertura, cierre in zip(delimitadores[::2], delimitadores[1::2]):
+            bloques.append(('comment', apertura, cierre))
+        for delimitador in lista('multiline_strings'):
+            bloques.append(('string', delimitador, delimitador))
+        return cls(reglas, bloques)
+
+    def tokenizar(self, texto, estado=0):
+        """Devuelve los tramos (inicio, longitud, categoría) en posiciones de Qt y el estado final."""
+        if self.patron is None:
+            return [], 0 # Texto plano: sin reglas ni bloques multilínea
+        tramos = []
+        posicion = 0
+        if estado:
+            # La línea empieza dentro de un bloque abierto en una línea anterior
+            categoria, _, cierre = self.bloques[estado - 1]
+            fin = texto.find(cierre)
+            if fin < 0:
+                return ajustar_posiciones_utf16(texto, [(0, len(texto), categoria)]), estado
+            posicion = fin + len(cierre)
+            tramos.append((0, posicion, categoria))
+
+        categorias = self.categorias
+        aperturas = self.aperturas
+        while True:
+            for m in self.patron.finditer(texto, posicion):
+                inicio, fin = m.span()
+                nombre = m.lastgroup
+                indice = aperturas.get(nombre)
+                if indice is None:
+                    if fin > inicio:
+                        tramos.append((inicio, fin - inicio, categorias[nombre]))
+                    continue
+                cierre = self.bloques[indice][2]
+                fin_cierre = texto.find(cierre, fin)
+                if fin_cierre < 0:
+                    tramos.append((inicio, len(texto) - inicio, categorias[nombre]))
+                    return ajustar_posiciones_utf16(texto, tramos), indice + 1
+                posicion = fin_cierre + len(cierre)
+                tramos.append((inicio, posicion - inicio, categorias[nombre]))
+                break # Seguir explorando después del cierre
+            else:
+                return ajustar_posiciones_utf16(texto, tramos), 0
+
+# Gramáticas compartidas por todo el proceso, indexadas por la ruta del .lib
+_GRAMATICAS = {}
+
+def obtener_gramatica(ruta_lib):
+    """Devuelve la gramática del .lib, compilándola sólo la primera vez que se pide."""
+    clave = os.path.normcase(os.path.abspath(ruta_lib))
+    gramatica = _GRAMATICAS.get(clave)
+    if gramatica is None:
+        parser = configparser.ConfigParser(interpolation=None)
+        if os.path.exists(ruta_lib):
+            parser.read(ruta_lib, encoding='utf-8')
+        if not parser.has_section('syntax'):
+            parser.add_section('syntax') # Sin reglas: texto plano
+        gramatica = _GRAMATICAS[clave] = Gramatica.desde_sintaxis(parser['syntax'])
+    return gramatica
+
+# --- Registro de temas compartido por todo el proceso ---
+
+class Tema:
+    """Formatos y gramática de un archivo .lib, ya construidos (no se modifican)."""
+    def __init__(self, ruta, nombre, formatos, gramatica):
+        self.ruta = ruta
+        self.nombre = nombre
+        self.formatos = formatos
+        self.gramatica = gramatica
+
+_TEMAS = {}
+
+def crear_formato(color, estilo=None):
+    formato = QTextCharFormat()
+    formato.setForeground(color)
+    if estilo == 'bold':
+        formato.setFontWeight(QFont.Weight.Bold)
+    elif estilo == 'italic':
+        formato.setFontItalic(True)
+    return formato
+
+def obtener_tema(theme_file):
+    """Devuelve el Tema del .lib, leyéndolo y construyendo sus formatos sólo la primera vez."""
+    clave = os.path.normcase(os.path.abspath(theme_file))
+    tema = _TEMAS.get(clave)
+    if tema is not None:
+        return tema
+
+    # Colores por defecto en caso de que el archivo o una clave falte
+    defaults = {
+        'keyword': "#5151F0", 'operator': "#F79F34", 'string': "#F54141",
+        'comment': "#2AC52A", 'function': "#D8AA37"
+    }
+
+    colors = defaults.copy()
+    nombre = os.path.basename(theme_file)
+    if os.path.exists(theme_file):
+        # Los .lib llevan comentarios al final de línea ("#FF6188   ; Para ...")
+        parser = configparser.ConfigParser(interpolation=None, inline_comment_prefixes=(';',))
+        parser.read(theme_file, encoding='utf-8')
+        if 'colors' in parser:
+            for name, color_code in parser['colors'].items():
+                if QColor(color_code).isValid():
+                    colors[name] = color_code
+        nombre = parser.get('theme', 'name', fallback=nombre)
+
+    # Formatos por categoría de token
+    formatos = {
+        'keyword': crear_formato(QColor(colors['keyword']), 'bold'),
+        'operator': crear_formato(QColor(colors['operator'])),
+        'string': crear_formato(QColor(colors['string'])),
+        'comment': crear_formato(QColor(colors['comment']), 'italic'),
+        'function': crear_formato(QColor(colors['function'])),
+    }
+    tema = _TEMAS[clave] = Tema(theme_file, nombre, formatos, obtener_gramatica(theme_file))
+    return tema
+
+# --- 2. Definición del Resaltador de Sintaxis ---
 
 class PythonHighlighter(QSyntaxHighlighter):
     def __init__(self, parent=None):
         super().__init__(parent)
         
-        self.reglas_resaltado = []
+        self.tema = None
+        self.gramatica = None
+        self.formatos = {}
+        self.programador = None # ProgramadorResaltado opcional (resaltado diferido)
+        self._generacion = 0 # Estado de bloque que marca "resaltado con las reglas actuales"
+
+        # Tokenización en segundo plano (ver TrabajadorTokenizacion)
+        self.trabajador = None
+        self._pendientes = [] # QTextCursor en los bloques editados que esperan al hilo
+        self._trabajo_en_curso = None
+        self._precalculados = {} # Número de bloque -> (texto, estado inicial, tramos, estado final)
+        self._temporizador_envio = QTimer(self)
+        self._temporizador_envio.setSingleShot(True)
+        self._temporizador_envio.setInterval(0) # Agrupa las ediciones de un mismo ciclo
+        self._temporizador_envio.timeout.connect(self._enviar_trabajo)
         self.load_theme('lib/txt/txt.lib') # Cargar tema por defecto 'txt' al inicio
 
     def load_theme(self, theme_file):
-        """Carga los colores desde un archivo de tema .lib y reconstruye las reglas."""
-        # Colores por defecto en caso de que el archivo o una clave falte
-        defaults = {
-            'keyword': "#5151F0", 'operator': "#F79F34", 'string': "#F54141",
-            'comment': "#2AC52A", 'function': "#D8AA37"
-        }
-
-        colors = defaults.copy()
-        if os.path.exists(theme_file):
-            parser = configparser.ConfigParser()
-            parser.read(theme_file)
-            if 'colors' in parser:
-                for name, color_code in parser['colors'].items():
-                    colors[name] = color_code
+        """Activa el tema .lib indicado; no hace nada si ya es el tema activo."""
+        tema = obtener_tema(theme_file)
+        if tema is self.tema:
+            return # Mismo tema: los bloques ya tienen estos colores
+        self.tema = tema
+        self.formatos = tema.formatos
+        self.gramatica = tema.gramatica
+        self.invalidar()
+
+    def invalidar(self):
+        """Marca todos los bloques como obsoletos y los vuelve a colorear."""
+        self._generacion = (self._generacion + 1) % (1 << 22)
+        if self.programador is not None:
+            self.programador.reiniciar()
+        else:
+            self.rehighlight()
+
+    def bloque_al_dia(self, bloque):
+        """Indica si el bloque ya se coloreó con la gramática y el tema actuales."""
+        estado = bloque.userState()
+        return estado >= 0 and estado >> 8 == self._generacion
 
-        # Paleta de Colores desde el archivo
-        COLOR_KEYWORD = QColor(colors['keyword'])
-        COLOR_OPERATOR = QColor(colors['operator'])
-        COLOR_STRING = QColor(colors['string'])
-        COLOR_COMMENT = QColor(colors['comment'])
-        COLOR_FUNCTION = QColor(colors['function'])
-
-        # Formatos
-        self.formato_palabra_clave = self.crear_formato(COLOR_KEYWORD, 'bold')
-        self.formato_operador = self.crear_formato(COLOR_OPERATOR)
-        self.formato_cadena = self.crear_formato(COLOR_STRING)
-        self.formato_comentario = self.crear_formato(COLOR_COMMENT, 'italic')
-        self.formato_funcion = self.crear_formato(COLOR_FUNCTION)
-        
-        # Limpiar reglas antiguas y definir las nuevas con los formatos actualizados
-        self.reglas_resaltado = []
-        self.definir_reglas()
-        self.rehighlight() # Forzar el repintado de todo el documento
-
-    def crear_formato(self, color, estilo=None):
-        formato = QTextCharFormat()
-        formato.setForeground(color)
-        if estilo == 'bold':
-            formato.setFontWeight(QFont.Weight.Bold)
-        elif estilo == 'italic':
-            formato.setFontItalic(True)
-        return formato
-
-    def definir_reglas(self):
-        palabras_clave = ['False', 'None', 'True', 'and', 'as', 'assert', 'async', 'await', 'break', 'class', 'continue', 'def', 'del', 'elif', 'else', 'except', 'finally', 'for', 'from', 'global', 'if', 'import', 'in', 'is', 'lambda', 'nonlocal', 'not', 'or', 'pass', 'raise', 'return', 'try', 'while', 'with', 'yield']
-        for palabra in palabras_clave:
-            patron = r'\b' + palabra + r'\b'
-            self.reglas_resaltado.append((QRegularExpression(patron), self.formato_palabra_clave))
-
-        operadores = [r'=', r'\+', r'-', r'\*', r'/', r'%', r'!', r'==', r'!=', r'&gt;', r'&lt;', r'&gt;=', r'&lt;=', r'\(', r'\)', r'\[', r'\]', r'\{', r'\}', r',']
-        for operador in operadores:
-            self.reglas_resaltado.append((QRegularExpression(operador), self.formato_operador))
-
-        self.reglas_resaltado.append((QRegularExpression(r"'[^']*'"), self.formato_cadena))
-        self.reglas_resaltado.append((QRegularExpression(r'"[^\"]*"'), self.formato_cadena))
-        self.reglas_resaltado.append((QRegularExpression(r'#.*'), self.formato_comentario))
-        self.reglas_resaltado.append((QRegularExpression(r'\b[A-Za-z0-9_]+(?=\()'), self.formato_funcion))
-        
     def highlightBlock(self, texto):
-        for patron_expr, formato in self.reglas_resaltado:
-            iterator = patron_expr.globalMatch(texto)
-            while iterator.hasNext():
-                match = iterator.next()
-                inicio = match.capturedStart()
-                longitud = match.capturedLength()
-                self.setFormat(inicio, longitud, formato)
+        """Colorea un bloque partiendo del estado léxico con el que terminó el anterior.
+
+        El estado del bloque guarda ``generación << 8 | estado léxico``. Qt sólo
+        sigue con el bloque siguiente si este estado cambia, así que una edición
+        deja de propagarse en cuanto una línea termina igual que antes.
+        """
+        programador = self.programador
+        bloque = self.currentBlock()
+        if programador is not None and programador.suspendido:
+            # Edición masiva: conserva los colores y el programador lo recoloreará al reactivarse
+            for rango in bloque.layout().formats():
+                self.setFormat(rango.start, rango.length, rango.format)
+            programador.tocado(bloque)
+            return
+        if programador is not None and not programador.permite(bloque):
+            return # Se coloreará cuando sea visible o en segundo plano
+        anterior = self.previousBlockState()
+        estado_inicial = anterior & 0xFF if anterior >= 0 else 0
+
+        entrada = self._precalculados.get(bloque.blockNumber()) if self._precalculados else None
+        if entrada is not None and entrada[0] == texto and entrada[1] == estado_inicial:
+            _, _, tramos, estado_final = entrada
+        elif self.trabajador is not None and self.programador is not None and not self.programador.en_pasada():
+            self._diferir(bloque)
+            return
+        else:
+            tramos, estado_final = self.gramatica.tokenizar(texto, estado_inicial)
+
+        self.setCurrentBlockState((self._generacion << 8) | estado_final)
+        formatos = self.formatos
+        for inicio, longitud, categoria in tramos:
+            self.setFormat(inicio, longitud, formatos[categoria])
+
+    # --- Tokenización en segundo plano ---
+    LOTE_BLOQUES = 256 # Bloques extra que se envían tras un bloque editado
+
+    def usar_trabajador(self, trabajador):
+        """Envía la tokenización de las ediciones al hilo ``trabajador``."""
+        self.trabajador = trabajador
+        trabajador.tokenizado.connect(self._aplicar_trabajo)
+
+    def soltar_trabajador(self):
+        if self.trabajador is not None:
+            self.trabajador.tokenizado.disconnect(self._aplicar_trabajo)
+            self.trabajador = None
+        self._temporizador_envio.stop()
+        self._pendientes = []
+
+    def _diferir(self, bloque):
+        """Mantiene los formatos actuales del bloque y pide al hilo que lo tokenice."""
+        for rango in bloque.layout().formats():
+            self.setFormat(rango.start, rango.length, rango.format)
+        self._pendientes.append(QTextCursor(bloque))
+        if self._trabajo_en_curso is None:
+            self._temporizador_envio.start()
+
+    def _enviar_trabajo(self):
+        """Toma una instantánea de los bloques pendientes y la encola en el hilo."""
+        if self._trabajo_en_curso is not None or not self._pendientes or self.trabajador is None:
+            return
+        documento = self.document()
+        pendientes, self._pendientes = self._pendientes, []
+        por_numero = {cursor.block().blockNumber(): cursor for cursor in pendientes}
+
+        # Bloques editados cercanos comparten rango para no lexear dos veces
+        grupos = []
+        for numero in sorted(por_numero):
+            if grupos and numero - grupos[-1][-1] <= self.LOTE_BLOQUES:
+                grupos[-1].append(numero)
+            else:
+                grupos.append([numero])
+
+        rangos, cursores = [], []
+        for grupo in grupos:
+            primero, ultimo = grupo[0], grupo[-1]
+            cursores.append([por_numero[numero] for numero in grupo])
+            bloque = documento.findBlockByNumber(primero)
+            previo = bloque.previous().userState() if bloque.previous().isValid() else -1
+            textos, estados = [], []
+            limite = ultimo - primero + 1 + self.LOTE_BLOQUES
+            while bloque.isValid() and len(textos) < limite:
+                estado = bloque.userState()
+                textos.append(bloque.text())
+                estados.append(estado & 0xFF if estado >= 0 else -1)
+                bloque = bloque.next()
+            rangos.append((primero, previo & 0xFF if previo >= 0 else 0, textos, estados, ultimo - primero + 1))
+
+        self._trabajo_en_curso = TrabajoTokenizacion(self, documento.revision(), self.gramatica, rangos, cursores)
+        self.trabajador.encolar(self._trabajo_en_curso)
+
+    def _aplicar_trabajo(self, trabajo):
+        """Aplica los tramos calculados en el hilo y descarta los rangos que quedaron obsoletos."""
+        if trabajo is not self._trabajo_en_curso:
+            return # Es de otro resaltador (o de uno ya soltado)
+        self._trabajo_en_curso = None
+        documento = self.document()
+        editados = []
+        for (primero, entradas), cursores in zip(trabajo.resultados, trabajo.cursores):
+            if trabajo.gramatica is self.gramatica and self._rango_vigente(primero, entradas, trabajo.revision):
+                editados.extend(cursores)
+                for desplazamiento, entrada in enumerate(entradas):
+                    self._precalculados[primero + desplazamiento] = entrada
+            else:
+                # Algo cambió mientras se tokenizaba: se repite con una instantánea nueva
+                self._pendientes.extend(cursores)
+        try:
+            # Qt continúa por su cuenta con los bloques siguientes cuyo estado cambie
+            for cursor in editados:
+                self.rehighlightBlock(cursor.block())
+        finally:
+            self._precalculados = {}
+        if self._pendientes:
+            self._temporizador_envio.start()
+
+    def _rango_vigente(self, primero, entradas, revision):
+        """Comprueba que ningún bloque del rango se editó después de la instantánea."""
+        # QTextBlock.revision() guarda la revisión del documento de su última edición de texto
+        # (los cambios de formato no la tocan, a diferencia de QTextDocument.revision())
+        bloque = self.document().findBlockByNumber(primero)
+        for entrada in entradas:
+            if not bloque.isValid() or bloque.revision() > revision or bloque.text() != entrada[0]:
+                return False
+            bloque = bloque.next()
+        return True
+
+class TrabajoTokenizacion:
+    """Instantánea de rangos de bloques que se tokenizan fuera del hilo de la interfaz.
+
+    Cada rango es (primer bloque, estado inicial, textos, estados previos,
+    bloques obligatorios). Tras los obligatorios se deja de lexear en cuanto
+    un bloque termina en el mismo estado que ya tenía. ``cursores`` guarda,
+    por rango, los bloques editados que originaron el trabajo.
+    """
+    def __init__(self, solicitante, revision, gramatica, rangos, cursores):
+        self.solicitante = solicitante
+        self.revision = revision
+        self.gramatica = gramatica
+        self.rangos = rangos
+        self.cursores = cursores
+        self.resultados = []
+
+    def ejecutar(self):
+        for primero, estado, textos, estados_previos, obligatorios in self.rangos:
+            entradas = []
+            for indice, texto in enumerate(textos):
+                tramos, estado_final = self.gramatica.tokenizar(texto, estado)
+                entradas.append((texto, estado, tramos, estado_final))
+                estado = estado_final
+                if indice + 1 >= obligatorios and estado_final == estados_previos[indice]:
+                    break
+            self.resultados.append((primero, entradas))
+
+class TrabajadorTokenizacion(QThread):
+    """Hilo compartido por todos los resaltadores que ejecuta trabajos de tokenización."""
+    tokenizado = pyqtSignal(object) # Emite el TrabajoTokenizacion ya resuelto
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._cola = queue.Queue()
+        self._is_running = True
+
+    def encolar(self, trabajo):
+        self._cola.put(trabajo)
+
+    def detener(self):
+        self._is_running = False
+        self._cola.put(None)
+        self.wait()
+
+    def run(self):
+        while self._is_running:
+            trabajo = self._cola.get()
+            if trabajo is None:
+                break
+            try:
+                trabajo.ejecutar()
+            except Exception as e:
+                print(f"Error al tokenizar en segundo plano: {e}")
+                continue
+            self.tokenizado.emit(trabajo)
+
+_trabajador_tokenizacion = None
+
+def obtener_trabajador_tokenizacion():
+    """Devuelve el hilo de tokenización del proceso, creándolo la primera vez."""
+    global _trabajador_tokenizacion
+    if _trabajador_tokenizacion is None:
+        _trabajador_tokenizacion = TrabajadorTokenizacion()
+        _trabajador_tokenizacion.start()
+        QApplication.instance().aboutToQuit.connect(_trabajador_tokenizacion.detener)
+    return _trabajador_tokenizacion
+
+# --- 3. Programador del resaltado (primero la vista, luego el resto) ---
+
+class ProgramadorResaltado(QObject):
+    """Colorea al instante los bloques visibles y el resto en porciones durante la inactividad.
+
+    Mientras quedan bloques sin colorear, el resaltador sólo trabaja sobre los
+    bloques visibles o ya coloreados; el temporizador completa el documento en
+    porciones de ``PRESUPUESTO_MS`` y se detiene al ocultar o cerrar la pestaña.
+    """
+    PRESUPUESTO_MS = 8
+    MARGEN_LINEAS = 10 # Líneas extra por encima y por debajo de la vista
+
+    def __init__(self, highlighter, text_editor):
+        super().__init__(highlighter)
+        self.highlighter = highlighter
+        self.text_editor = text_editor
+        self._bloque_forzado = None
+        self._limite_porcion = 0.0 # Fin de la porción en curso (0 = ninguna)
+        self._pausado = True
+        self.suspendido = False # Durante una edición masiva no se colorea nada
+        self._tocados = [] # QTextCursor en los bloques al día que se editaron mientras estaba suspendido
+        self._siguiente = 0 # Primer bloque que aún puede estar sin colorear
+        self._primer_visible = 0
+        self._ultimo_visible = self.MARGEN_LINEAS * 6
+
+        self.temporizador = QTimer(self)
+        self.temporizador.setInterval(0) # Se ejecuta cuando el bucle de eventos está libre
+        self.temporizador.timeout.connect(self._procesar_porcion)
+
+        self.temporizador_vista = QTimer(self)
+        self.temporizador_vista.setSingleShot(True)
+        self.temporizador_vista.setInterval(0)
+        self.temporizador_vista.timeout.connect(self.resaltar_visibles)
+
+        text_editor.verticalScrollBar().valueChanged.connect(self.temporizador_vista.start)
+        text_editor.document().contentsChange.connect(self._contenido_cambiado)
+        highlighter.programador = self
+
+    def permite(self, bloque):
+        """Decide si ``highlightBlock`` debe colorear el bloque ahora."""
+        if bloque == self._bloque_forzado or self.highlighter.bloque_al_dia(bloque):
+            return True
+        if self._limite_porcion and time.perf_counter() < self._limite_porcion:
+            return True # Qt encadena los bloques siguientes dentro de la porción
+        return self._primer_visible <= bloque.blockNumber() <= self._ultimo_visible
+
+    def en_pasada(self):
+        """Indica si el resaltado en curso lo ha pedido el programador (se hace en este hilo)."""
+        return self._bloque_forzado is not None or bool(self._limite_porcion)
+
+    def reiniciar(self):
+        """Vuelve a colorear todo: primero la vista y después el resto en segundo plano."""
+        self._siguiente = 0
+        self.resaltar_visibles()
+        self._reanudar_fondo()
+
+    def pausar(self):
+        self._pausado = True
+        self.temporizador.stop()
+
+    def reanudar(self):
+        self._pausado = False
+        self.resaltar_visibles()
+        self._reanudar_fondo()
+
+    def suspender(self):
+        """Deja de colorear hasta ``reactivar`` (Qt sigue llamando a highlightBlock por cada bloque)."""
+        self.suspendido = True
+
+    def tocado(self, bloque):
+        """Anota un bloque editado durante la suspensión (sólo hace falta si figura como al día)."""
+        if self.highlighter.bloque_al_dia(bloque):
+            self._tocados.append(QTextCursor(bloque))
+
+    def reactivar(self):
+        """Colorea de nuevo la vista y retoma el fondo desde el primer bloque tocado."""
+        self.suspendido = False
+        tocados, self._tocados = self._tocados, []
+        for cursor in tocados:
+            # Fuera de highlightBlock el estado se cambia sin que Qt lo propague al bloque siguiente
+            cursor.block().setUserState(-1)
+        self.resaltar_visibles()
+        self._reanudar_fondo()
+
+    def detener(self):
+        """Detiene todo el trabajo pendiente (la pestaña se está cerrando)."""
+        self.pausar()
+        self.temporizador_vista.stop()
+        self.highlighter.programador = None
+
+    def _actualizar_rango_visible(self):
+        editor = self.text_editor
+        primero = editor.firstVisibleBlock().blockNumber()
+        lineas = editor.viewport().height() // max(1, editor.fontMetrics().lineSpacing()) + 1
+        self._primer_visible = max(0, primero - self.MARGEN_LINEAS)
+        self._ultimo_visible = primero + max(lineas, self.MARGEN_LINEAS * 5) + self.MARGEN_LINEAS
+
+    def resaltar_visibles(self):
+        """Colorea de inmediato los bloques que están (o casi están) en pantalla."""
+        self._actualizar_rango_visible()
+        documento = self.text_editor.document()
+        bloque = documento.findBlockByNumber(self._primer_visible)
+        numero = self._primer_visible
+        while bloque.isValid() and numero <= self._ultimo_visible:
+            self._resaltar_bloque(bloque)
+            bloque = bloque.next()
+            numero += 1
+
+    def _resaltar_bloque(self, bloque):
+        if self.highlighter.bloque_al_dia(bloque):
+            return
+        self._bloque_forzado = bloque
+        try:
+            self.highlighter.rehighlightBlock(bloque)
+        finally:
+            self._bloque_forzado = None
+
+    def _contenido_cambiado(self, posicion, eliminados, anadidos):
+        # Un pegado grande puede dejar bloques sin colorear fuera de la vista
+        bloque = self.text_editor.document().findBlock(posicion)
+        if bloque.isValid():
+            self._siguiente = min(self._siguiente, bloque.blockNumber())
+        self._reanudar_fondo()
+
+    def _reanudar_fondo(self):
+        if not self._pausado and not self.temporizador.isActive():
+            self.temporizador.start()
+
+    def _procesar_porcion(self):
+        limite = self._limite_porcion = time.perf_counter() + self.PRESUPUESTO_MS / 1000
+        bloque = self.text_editor.document().findBlockByNumber(self._siguiente)
+        try:
+            while bloque.isValid():
+                if time.perf_counter() >= limite:
+                    return # Se agotó el presupuesto de esta porción
+                self._resaltar_bloque(bloque)
+                bloque = bloque.next()
+                self._siguiente += 1
+        finally:
+            self._limite_porcion = 0.0
+        self.temporizador.stop() # Documento completo
+
+# --- 4. Carga de archivos en segundo plano ---
+
+_hilos_activos = set()
+
+def conservar_hasta_terminar(hilo):
+    """Guarda una referencia al QThread hasta que termine (su pestaña puede cerrarse antes)."""
+    if not _hilos_activos:
+        QApplication.instance().aboutToQuit.connect(_esperar_hilos_activos)
+    _hilos_activos.add(hilo)
+    hilo.finished.connect(lambda: _hilos_activos.discard(hilo))
+
+def _esperar_hilos_activos():
+    for hilo in list(_hilos_activos):
+        hilo.cancelar()
+        hilo.wait()
+
+# Marcas de orden de bytes, de la más larga a la más corta (la de UTF-32 LE empieza como la de UTF-16 LE)
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# Nombres que se muestran en la barra de estado
+NOMBRES_CODIFICACION = {
+    'utf-8': "UTF-8", 'utf-8-sig': "UTF-8 con BOM", 'utf-16': "UTF-16", 'utf-16-le': "UTF-16 LE",
+    'utf-16-be': "UTF-16 BE", 'utf-32': "UTF-32", 'cp1252': "Windows 1252", 'latin-1': "ISO 8859-1",
+}
+NOMBRES_FIN_LINEA = {'\n': "LF", '\r\n': "CRLF", '\r': "CR"}
+
+def detectar_codificacion(datos):
+    """Adivina la codificación a partir del principio de un archivo (no del archivo entero)."""
+    for bom, encoding in _BOMS:
+        if datos.startswith(bom):
+            return encoding
+    # UTF-16 sin BOM: el texto casi-ASCII deja un byte nulo en cada par. Va antes
+    # que UTF-8, que también acepta bytes nulos.
+    if len(datos) >= 2:
+        pares, impares = datos[0::2], datos[1::2]
+        if impares.count(0) > len(impares) * 0.3 and pares.count(0) < len(pares) * 0.05:
+            return 'utf-16-le'
+        if pares.count(0) > len(pares) * 0.3 and impares.count(0) < len(impares) * 0.05:
+            return 'utf-16-be'
+    try:
+        # final=False: el prefijo puede cortar un carácter multibyte por la mitad
+        codecs.getincrementaldecoder('utf-8')().decode(datos, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    try:
+        datos.decode('cp1252') # Falla con los pocos bytes que Windows 1252 no define
+        return 'cp1252'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+def detectar_fin_linea(texto):
+    """Devuelve el salto de línea más frecuente en ``texto`` (os.linesep si no hay ninguno)."""
+    crlf = texto.count('\r\n')
+    lf = texto.count('\n') - crlf
+    cr = texto.count('\r') - crlf
+    if not (crlf or lf or cr):
+        return os.linesep
+    return max((crlf, '\r\n'), (lf, '\n'), (cr, '\r'))[1]
+
+def firma_archivo(ruta):
+    """(mtime, tamaño, inodo) de una ruta o descriptor: cambia si el archivo se reescribe o se sustituye.
+
+    Devuelve None si el archivo no existe.
+    """
+    try:
+        info = os.stat(ruta)
+    except OSError:
+        return None
+    return (info.st_mtime_ns, info.st_size, info.st_ino)
+
+class CargadorArchivo(QThread):
+    """Lee y decodifica un archivo por fragmentos fuera del hilo de la interfaz.
+
+    Como mucho hay ``FRAGMENTOS_EN_VUELO`` fragmentos esperando a que la
+    interfaz los inserte; el hilo se bloquea hasta que ``fragmento_aplicado``
+    libera un hueco, así la memoria no crece si el disco va más rápido.
+
+    La codificación detectada sólo se basa en el primer fragmento: si más
+    adelante el archivo resulta no serlo, se emite ``carga_reiniciada`` (la
+    interfaz descarta lo recibido) y se vuelve a leer con ``ALTERNATIVAS``,
+    la última de las cuales acepta cualquier byte.
+    """
+    formato_detectado = pyqtSignal(str, str) # codificación, salto de línea
+    fragmento_leido = pyqtSignal(str)
+    carga_reiniciada = pyqtSignal(str) # Motivo
+    progreso = pyqtSignal(int)
+    carga_terminada = pyqtSignal()
+    error_carga = pyqtSignal(str)
+
+    TAMANO_FRAGMENTO = 64 * 1024 # ~50 ms de inserción en la interfaz por fragmento
+    FRAGMENTOS_EN_VUELO = 2
+    ALTERNATIVAS = ('cp1252', 'latin-1')
+
+    def __init__(self, ruta_archivo, encoding=None, parent=None):
+        super().__init__(parent)
+        self.ruta_archivo = ruta_archivo
+        self.encoding = encoding
+        self.firma = None # firma_archivo del archivo al abrirlo
+        self.leidos = 0 # Bytes leídos (puede pasar del tamaño de la firma si el archivo crece mientras tanto)
+        self._is_running = True
+        self._huecos = threading.Semaphore(self.FRAGMENTOS_EN_VUELO)
+
+    def fragmento_aplicado(self):
+        self._huecos.release()
+
+    def cancelar(self):
+        self._is_running = False
+        self._huecos.release() # Despierta al hilo si está esperando hueco
+
+    def run(self):
+        try:
+            total = max(1, os.path.getsize(self.ruta_archivo))
+            with open(self.ruta_archivo, 'rb') as f:
+                self.firma = firma_archivo(f.fileno())
+                # La detección sólo mira el primer fragmento
+                datos = f.read(self.TAMANO_FRAGMENTO)
+                if self.encoding:
+                    codificaciones = [self.encoding] # Pedida expresamente: sin alternativas
+                else:
+                    codificaciones = list(dict.fromkeys((detectar_codificacion(datos), *self.ALTERNATIVAS)))
+                for n, encoding in enumerate(codificaciones):
+                    try:
+                        self._leer(f, datos, encoding, total)
+                        break
+                    except UnicodeDecodeError as e:
+                        if n + 1 == len(codificaciones):
+                            raise
+                        nombre = NOMBRES_CODIFICACION.get(encoding, encoding)
+                        self.carga_reiniciada.emit(f"no es {nombre} válido a partir del byte {self.leidos + e.start}")
+                        f.seek(0)
+            if self._is_running:
+                self.carga_terminada.emit()
+        except UnicodeDecodeError as e:
+            if self._is_running:
+                self.error_carga.emit(f"no es {NOMBRES_CODIFICACION.get(e.encoding, e.encoding)} válido a partir del byte {self.leidos + e.start}")
+        except Exception as e:
+            if self._is_running:
+                self.error_carga.emit(str(e))
+
+    def _leer(self, f, datos, encoding, total):
+        """Decodifica el archivo entero con ``encoding``; ``datos`` es su primer fragmento."""
+        self.leidos = 0
+        fin_linea = detectar_fin_linea(datos.decode(encoding, errors='ignore'))
+        self.formato_detectado.emit(encoding, fin_linea)
+        # Normaliza \r\n y \r a \n aunque queden partidos entre dos fragmentos
+        decodificador = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(encoding)(), translate=True)
+        f.seek(len(datos))
+        while self._is_running:
+            if datos is None:
+                datos = f.read(self.TAMANO_FRAGMENTO)
+            texto = decodificador.decode(datos, final=not datos)
+            if texto:
+                self._huecos.acquire()
+                if not self._is_running:
+                    return
+                self.fragmento_leido.emit(texto)
+            if not datos:
+                break
+            self.leidos += len(datos)
+            datos = None
+            self.progreso.emit(min(100, self.leidos * 100 // total))
+
+class SeguidorArchivo(QThread):
+    """Lee lo que se va añadiendo al final de un archivo (modo seguimiento, como ``tail -F``).
+
+    Recuerda hasta qué byte ha leído y, cuando se le avisa (``avisar``) o cada
+    ``INTERVALO`` segundos, lee sólo los bytes nuevos: el coste depende de lo
+    que crece el archivo, no de su tamaño. Si el archivo se trunca o se
+    sustituye por otro (rotación), emite ``reiniciado`` y lo lee desde el
+    principio. Como CargadorArchivo, no adelanta más de
+    ``FRAGMENTOS_EN_VUELO`` fragmentos a la interfaz.
+    """
+    anadido = pyqtSignal(str, object) # Texto, firma_archivo al acabar una lectura (None a mitad)
+    reiniciado = pyqtSignal()
+
+    INTERVALO = 1.0 # Segundos entre comprobaciones sin aviso (p. ej. en carpetas de red)
+    COLA_INICIAL = 256 * 1024 # Bytes finales que se muestran al empezar sin haber cargado el archivo
+    FRAGMENTOS_EN_VUELO = 2
+
+    def __init__(self, ruta_archivo, encoding, desplazamiento=None, firma=None, parent=None):
+        """Sigue desde ``desplazamiento`` (lo ya mostrado) o, si es None, desde el final."""
+        super().__init__(parent)
+        self.ruta_archivo = ruta_archivo
+        self.encoding = encoding
+        self.desplazamiento = desplazamiento
+        self.firma = firma
+        self._is_running = True
+        self._aviso = threading.Event()
+        self._huecos = threading.Semaphore(self.FRAGMENTOS_EN_VUELO)
+        self._decodificador = self._nuevo_decodificador()
+
+    def avisar(self):
+        self._aviso.set()
+
+    def fragmento_aplicado(self):
+        self._huecos.release()
+
+    def cancelar(self):
+        self._is_running = False
+        self._aviso.set()
+        self._huecos.release()
+
+    def _nuevo_decodificador(self):
+        return io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(self.encoding)(errors='replace'), translate=True)
+
+    def _inicio_cola(self, f, tamano):
+        inicio = max(0, tamano - self.COLA_INICIAL)
+        if inicio:
+            f.seek(inicio)
+            salto = f.read(self.COLA_INICIAL).find(b'\n')
+            if salto >= 0:
+                inicio += salto + 1 # Empieza en una línea completa
+        return inicio
+
+    def _leer_nuevo(self):
+        try:
+            f = open(self.ruta_archivo, 'rb')
+        except OSError:
+            return # Entre el renombrado y la creación del nuevo archivo de una rotación
+        with f:
+            firma = firma_archivo(f.fileno())
+            if firma is None or firma == self.firma:
+                return
+            if self.desplazamiento is None:
+                self.desplazamiento = self._inicio_cola(f, firma[1])
+            elif firma[1] < self.desplazamiento or (self.firma is not None and firma[2] != self.firma[2]):
+                self.desplazamiento = 0
+                self._decodificador = self._nuevo_decodificador()
+                self.reiniciado.emit()
+            self.firma = firma
+            f.seek(self.desplazamiento)
+            pendientes = firma[1] - self.desplazamiento
+            while self._is_running:
+                datos = f.read(min(CargadorArchivo.TAMANO_FRAGMENTO, pendientes)) if pendientes > 0 else b''
+                pendientes -= len(datos)
+                self.desplazamiento += len(datos)
+                texto = self._decodificador.decode(datos)
+                self._huecos.acquire()
+                if not self._is_running:
+                    return
+                self.anadido.emit(texto, None if datos else firma)
+                if not datos:
+                    break
+
+    def run(self):
+        while self._is_running:
+            self._aviso.clear() # Antes de leer: un aviso durante la lectura no se pierde
+            self._leer_nuevo()
+            self._aviso.wait(self.INTERVALO)
+
+# --- 5. Visor de archivos grandes ---
+
+class IndexadorLineas(QThread):
+    """Recorre el archivo en segundo plano y anota dónde empieza cada bloque de ``PASO`` líneas.
+
+    El índice es disperso (un desplazamiento cada ``PASO`` líneas), así que su
+    tamaño apenas crece con el archivo; el visor llega a una línea concreta
+    saltando al punto anterior y contando saltos de línea en el mapa.
+    """
+    puntos_encontrados = pyqtSignal(list, int) # nuevos puntos, líneas contadas hasta ahora
+    progreso = pyqtSignal(int)
+    indexado_terminado = pyqtSignal(int)
+    error_indexado = pyqtSignal(str)
+
+    PASO = 1024
+    TAMANO_LECTURA = 4 * 1024 * 1024
+
+    def __init__(self, ruta_archivo, parent=None):
+        super().__init__(parent)
+        self.ruta_archivo = ruta_archivo
+        self._is_running = True
+
+    def cancelar(self):
+        self._is_running = False
+
+    def run(self):
+        try:
+            total = max(1, os.path.getsize(self.ruta_archivo))
+            base = 0
+            saltos = 0
+            faltan = self.PASO # Saltos de línea hasta el siguiente punto del índice
+            with open(self.ruta_archivo, 'rb') as f:
+                while self._is_running:
+                    datos = f.read(self.TAMANO_LECTURA)
+                    if not datos:
+                        break
+                    n = datos.count(b'\n')
+                    saltos += n
+                    puntos = []
+                    if n >= faltan:
+                        encontrados = re.finditer(b'\n', datos)
+                        while n >= faltan:
+                            # islice consume los saltos intermedios sin bucle en Python
+                            m = next(itertools.islice(encontrados, faltan - 1, None))
+                            puntos.append(base + m.end())
+                            n -= faltan
+                            faltan = self.PASO
+                    faltan -= n
+                    base += len(datos)
+                    self.puntos_encontrados.emit(puntos, saltos + 1)
+                    self.progreso.emit(min(100, base * 100 // total))
+            if self._is_running:
+                self.indexado_terminado.emit(saltos + 1)
+        except Exception as e:
+            if self._is_running:
+                self.error_indexado.emit(str(e))
+
+class VistaArchivoGrande(QAbstractScrollArea):
+    """Área de desplazamiento que sólo decodifica y pinta las líneas visibles del mapa."""
+    LARGO_MAXIMO_LINEA = 4096 # Bytes que se muestran de una línea muy larga
+    MARGEN = 4 # Mismo margen izquierdo que el documento de QPlainTextEdit
+
+    def __init__(self, visor):
+        super().__init__(visor)
+        self.visor = visor
+        self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
+        self.setFrameShape(QFrame.Shape.NoFrame)
+        self.viewport().setStyleSheet("background-color: #282A36;")
+
+        font = QFont("Cascadia Code")
+        font.setPointSize(11)
+        font.setStyleHint(QFont.StyleHint.Monospace)
+        self.setFont(font)
+        self.alto_linea = int(self.fontMetrics().height() * 1.3) # Igual que el editor
+        self.ancho_maximo = 0 # Línea más ancha pintada hasta ahora
+
+        self.verticalScrollBar().setSingleStep(1) # En líneas
+        self.horizontalScrollBar().setSingleStep(self.fontMetrics().horizontalAdvance('9'))
+
+    def primera_linea(self):
+        return self.verticalScrollBar().value()
+
+    def lineas_visibles(self):
+        return self.viewport().height() // self.alto_linea + 1
+
+    def actualizar_rango(self):
+        total = self.visor.total_lineas
+        visibles = max(1, self.viewport().height() // self.alto_linea)
+        barra = self.verticalScrollBar()
+        barra.setRange(0, max(0, total - visibles))
+        barra.setPageStep(visibles)
+        self.horizontalScrollBar().setRange(0, max(0, self.ancho_maximo - self.viewport().width()))
+        self.horizontalScrollBar().setPageStep(self.viewport().width())
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.actualizar_rango()
+
+    def scrollContentsBy(self, dx, dy):
+        self.viewport().update()
+        if dy:
+            self.visor.area_numeros.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        painter.setFont(self.font())
+        painter.setPen(QColor("#F8F8F2"))
+        formatos = self.visor.tema.formatos if self.visor.tema else {}
+        gramatica = self.visor.tema.gramatica if self.visor.tema else None
+        desplazamiento_x = self.horizontalScrollBar().value() - self.MARGEN
+        ascenso = (self.alto_linea + self.fontMetrics().ascent() - self.fontMetrics().descent()) // 2
+
+        ancho_maximo = self.ancho_maximo
+        y = 0
+        for texto in self.visor.leer_lineas(self.primera_linea(), self.lineas_visibles()):
+            if gramatica is not None and gramatica.patron is not None:
+                # Cada línea se colorea por separado: sin estado de bloques multilínea
+                tramos, _ = gramatica.tokenizar(texto)
+                disposicion = QTextLayout(texto, self.font())
+                rangos = []
+                for inicio, longitud, categoria in tramos:
+                    rango = QTextLayout.FormatRange()
+                    rango.start, rango.length, rango.format = inicio, longitud, formatos[categoria]
+                    rangos.append(rango)
+                disposicion.setFormats(rangos)
+                disposicion.beginLayout()
+                disposicion.createLine()
+                disposicion.endLayout()
+                disposicion.draw(painter, QPointF(-desplazamiento_x, y + (self.alto_linea - self.fontMetrics().height()) // 2))
+                ancho = int(disposicion.maximumWidth())
+            else:
+                painter.drawText(-desplazamiento_x, y + ascenso, texto)
+                ancho = self.fontMetrics().horizontalAdvance(texto)
+            ancho_maximo = max(ancho_maximo, ancho + 2 * self.MARGEN)
+            y += self.alto_linea
+        painter.end()
+
+        if ancho_maximo != self.ancho_maximo:
+            self.ancho_maximo = ancho_maximo
+            self.actualizar_rango()
+
+class VisorArchivoGrande(QWidget):
+    """Pestaña de sólo lectura para archivos que no caben cómodamente en un QPlainTextEdit.
+
+    El archivo se proyecta en memoria con mmap y sólo se decodifican las líneas
+    que están en pantalla, así que la memoria no depende del tamaño del archivo.
+    """
+    def __init__(self, parent_window, ruta_archivo):
+        super().__init__()
+        self.parent_window = parent_window
+        self.ruta_archivo = ruta_archivo
+        self.es_guardado = True # Nunca se modifica
+        self.progreso_carga = 0 # Porcentaje indexado (None al terminar)
+        self.tema = None
+        self.total_lineas = 1
+        self.puntos = [0] # Desplazamiento del inicio de cada bloque de IndexadorLineas.PASO líneas
+        self.indexador = None
+        self._primera_linea = None # Línea que se vuelve a mostrar cuando el nuevo índice llegue a ella
+        self._proyectar()
+
+        self.vista = VistaArchivoGrande(self)
+        self.area_numeros = NumerosDeLineaArea(self)
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+        layout.addWidget(self.area_numeros)
+        layout.addWidget(self.vista)
+
+        self.vista.verticalScrollBar().valueChanged.connect(lambda: self.parent_window.programador_estado.marcar('posicion'))
+        self._indexar()
+
+    def _proyectar(self):
+        with open(self.ruta_archivo, 'rb') as f:
+            firma = firma_archivo(f.fileno())
+            mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        prefijo = mapa[:CargadorArchivo.TAMANO_FRAGMENTO]
+        self.firma, self.mapa = firma, mapa
+        self.encoding = detectar_codificacion(prefijo)
+        self.fin_linea = detectar_fin_linea(prefijo.decode(self.encoding, errors='ignore'))
+
+    def _indexar(self):
+        self.indexador = IndexadorLineas(self.ruta_archivo)
+        self.indexador.puntos_encontrados.connect(self._anadir_puntos)
+        self.indexador.progreso.connect(self._mostrar_progreso)
+        self.indexador.indexado_terminado.connect(self._indexado_terminado)
+        self.indexador.error_indexado.connect(self._indexado_fallido)
+        conservar_hasta_terminar(self.indexador)
+        self.indexador.start()
+
+    def _detener_indexador(self):
+        if self.indexador is not None:
+            self.indexador.puntos_encontrados.disconnect()
+            self.indexador.progreso.disconnect()
+            self.indexador.indexado_terminado.disconnect()
+            self.indexador.error_indexado.disconnect()
+            self.indexador.cancelar()
+            self.indexador = None
+
+    def comprobar_disco(self):
+        """Vuelve a proyectar e indexar el archivo si cambió en disco, conservando la línea visible."""
+        if firma_archivo(self.ruta_archivo) == self.firma:
+            return
+        self._detener_indexador()
+        anterior = self.mapa
+        try:
+            self._proyectar()
+        except (OSError, ValueError) as e:
+            self.parent_window.carga_fallida(self, str(e))
+            return
+        anterior.close()
+        self.parent_window.registro_documentos.registrar(self, self.ruta_archivo) # Puede ser otro inodo
+        if self._primera_linea is None:
+            self._primera_linea = self.vista.primera_linea()
+        self.puntos = [0]
+        self.total_lineas = 1
+        self.progreso_carga = 0
+        self.vista.actualizar_rango()
+        self.vista.viewport().update()
+        self.area_numeros.update()
+        self.parent_window.actualizar_titulo_pestana(self)
+        self._indexar()
+
+    def cargar_tema(self, theme_file):
+        tema = obtener_tema(theme_file)
+        if tema is not self.tema:
+            self.tema = tema
+            self.vista.viewport().update()
+
+    def leer_lineas(self, desde, cantidad):
+        """Decodifica ``cantidad`` líneas a partir de la línea ``desde`` (0-based)."""
+        paso = IndexadorLineas.PASO
+        indice = min(desde // paso, len(self.puntos) - 1)
+        posicion = self.puntos[indice]
+        mapa = self.mapa
+        for _ in range(desde - indice * paso):
+            posicion = mapa.find(b'\n', posicion) + 1
+            if posicion == 0:
+                return []
+        lineas = []
+        largo = len(mapa)
+        while len(lineas) < cantidad and posicion <= largo:
+            fin = mapa.find(b'\n', posicion)
+            if fin < 0:
+                fin = largo
+            datos = mapa[posicion:min(fin, posicion + VistaArchivoGrande.LARGO_MAXIMO_LINEA)]
+            lineas.append(datos.decode(self.encoding, errors='replace').rstrip('\r'))
+            posicion = fin + 1
+        return lineas
+
+    # --- Métodos que usa NumerosDeLineaArea ---
+    def ancho_area_numeros(self):
+        digitos = max(1, len(str(self.total_lineas)))
+        return 10 + self.vista.fontMetrics().horizontalAdvance('9') * digitos
+
+    def dibujar_area_numeros(self, event):
+        area = self.area_numeros
+        painter = QPainter(area)
+        painter.fillRect(event.rect(), QColor("#383A59"))
+        painter.setPen(QColor("#6272A4"))
+
+        alto = self.vista.alto_linea
+        derecha = self.ancho_area_numeros() - 5
+        primera = self.vista.primera_linea()
+        ultima = min(self.total_lineas, primera + self.vista.lineas_visibles())
+        for i, numero in enumerate(range(primera, ultima)):
+            area.dibujar_numero(painter, numero + 1, derecha, i * alto, alto)
+
+    # --- Índice en segundo plano ---
+    def _anadir_puntos(self, puntos, total_lineas):
+        self.puntos.extend(puntos)
+        digitos_antes = len(str(self.total_lineas))
+        self.total_lineas = total_lineas
+        self.vista.actualizar_rango()
+        if len(str(total_lineas)) != digitos_antes:
+            self.area_numeros.updateGeometry()
+        self.area_numeros.update()
+        self._recuperar_linea()
+
+    def _recuperar_linea(self, final=False):
+        if self._primera_linea is not None and (final or self.vista.verticalScrollBar().maximum() >= self._primera_linea):
+            self.vista.verticalScrollBar().setValue(self._primera_linea)
+            self._primera_linea = None
+
+    def _mostrar_progreso(self, porcentaje):
+        self.progreso_carga = porcentaje
+        self.parent_window.actualizar_titulo_pestana(self)
+
+    def _indexado_terminado(self, total_lineas):
+        self.total_lineas = total_lineas
+        self.indexador = None
+        self.progreso_carga = None
+        self.vista.actualizar_rango()
+        self._recuperar_linea(final=True)
+        self.parent_window.carga_completada(self)
+
+    def _indexado_fallido(self, mensaje):
+        self.indexador = None
+        self.progreso_carga = None
+        self.parent_window.carga_fallida(self, mensaje)
+
+    def cerrar(self):
+        """Detiene el índice y libera el mapa antes de destruir la pestaña."""
+        self._detener_indexador()
+        self.mapa.close()
+
+# --- 6. Guardado atómico en segundo plano ---
+
+class ArchivoCambiadoEnDisco(Exception):
+    pass
+
+def leer_mascara_permisos():
+    """umask del proceso. Leerla obliga a cambiarla un instante y es de todo el
+    proceso, así que se lee una sola vez al arrancar, antes de lanzar hilos."""
+    mascara = os.umask(0)
+    os.umask(mascara)
+    return mascara
+
+MASCARA_PERMISOS = leer_mascara_permisos()
+
+class TrabajoGuardado:
+    """Instantánea del texto de una pestaña que se escribe en disco fuera del hilo de la interfaz.
+
+    Con ``firma_esperada`` el guardado no se hace si el archivo ya no es el que
+    se leyó (otro programa lo cambió): ``conflicto`` queda a True. Un archivo
+    nuevo se crea con los permisos que deja ``mascara`` (la umask del proceso).
+    """
+    TAMANO_FRAGMENTO = 1024 * 1024 # Caracteres que se codifican de cada vez
+
+    def __init__(self, solicitante, ruta_archivo, texto, encoding='utf-8', fin_linea=os.linesep, firma_esperada=None,
+                 mascara=MASCARA_PERMISOS):
+        self.solicitante = solicitante
+        self.ruta_archivo = ruta_archivo
+        self.texto = texto
+        self.encoding = encoding
+        self.fin_linea = fin_linea
+        self.firma_esperada = firma_esperada
+        self.mascara = mascara
+        self.firma = None # firma_archivo de lo escrito
+        self.conflicto = False
+        self.error = None
+
+    def ejecutar(self):
+        """Escribe en un temporal del mismo directorio, fsync y lo renombra sobre el destino.
+
+        Si algo falla a mitad (disco lleno, corte), el archivo original queda intacto.
+        """
+        destino = os.path.realpath(self.ruta_archivo) # Si es un enlace, se reemplaza su objetivo
+        directorio = os.path.dirname(destino)
+        try:
+            info_original = os.stat(destino)
+        except FileNotFoundError:
+            info_original = None
+        if self.firma_esperada is not None and firma_archivo(destino) != self.firma_esperada:
+            self.conflicto = True
+            self.texto = None
+            raise ArchivoCambiadoEnDisco("el archivo ha cambiado en disco desde que se leyó")
+
+        descriptor, temporal = tempfile.mkstemp(prefix=f".{os.path.basename(destino)}.", suffix=".tmp", dir=directorio)
+        try:
+            with open(descriptor, 'wb', buffering=0) as f:
+                texto = self.texto
+                # Un solo codificador para todo el texto: la BOM (utf-8-sig, utf-16, utf-32) sólo va al principio
+                codificador = codecs.getincrementalencoder(self.encoding)()
+                for inicio in range(0, len(texto), self.TAMANO_FRAGMENTO):
+                    fragmento = texto[inicio:inicio + self.TAMANO_FRAGMENTO]
+                    if self.fin_linea != '\n':
+                        fragmento = fragmento.replace('\n', self.fin_linea)
+                    f.write(codificador.encode(fragmento))
+                f.write(codificador.encode('', final=True))
+                os.fsync(f.fileno())
+            if info_original is not None:
+                os.chmod(temporal, info_original.st_mode & 0o7777)
+                if hasattr(os, 'chown'):
+                    try:
+                        os.chown(temporal, info_original.st_uid, info_original.st_gid)
+                    except OSError:
+                        pass # Sin permisos para conservar el propietario
+            else:
+                # mkstemp crea con 0600; un archivo nuevo lleva los permisos habituales
+                os.chmod(temporal, 0o666 & ~self.mascara)
+            os.replace(temporal, destino)
+            self.firma = firma_archivo(destino)
+        except BaseException:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+            raise
+        finally:
+            self.texto = None
+        if hasattr(os, 'O_DIRECTORY'):
+            # Persistir también la entrada del directorio tras el renombrado
+            try:
+                descriptor_dir = os.open(directorio, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(descriptor_dir)
+                finally:
+                    os.close(descriptor_dir)
+            except OSError:
+                pass
+
+class TrabajadorGuardado(QThread):
+    """Hilo del proceso que escribe los guardados de uno en uno, en el orden en que se piden.
+
+    Al ser un único hilo, dos guardados del mismo archivo nunca se solapan.
+    """
+    guardado = pyqtSignal(object) # Emite el TrabajoGuardado (con ``error`` si falló)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._cola = queue.Queue()
+
+    def encolar(self, trabajo):
+        self._cola.put(trabajo)
+
+    def detener(self):
+        """Termina los guardados pendientes antes de parar (no se pierde ninguno al salir)."""
+        self._cola.put(None)
+        self.wait()
+
+    def run(self):
+        while True:
+            trabajo = self._cola.get()
+            if trabajo is None:
+                break
+            try:
+                trabajo.ejecutar()
+            except Exception as e:
+                trabajo.error = str(e)
+            self.guardado.emit(trabajo)
+
+_trabajador_guardado = None
+
+def obtener_trabajador_guardado():
+    """Devuelve el hilo de guardado del proceso, creándolo la primera vez."""
+    global _trabajador_guardado
+    if _trabajador_guardado is None:
+        _trabajador_guardado = TrabajadorGuardado()
+        _trabajador_guardado.start()
+        QApplication.instance().aboutToQuit.connect(_trabajador_guardado.detener)
+    return _trabajador_guardado
+
+# --- 7. Estadísticas del documento ---
+
+class EstadisticasDocumento(QObject):
+    """Contadores de un documento que se mantienen al día con los cambios, sin copiar el texto.
+
+    Líneas y unidades UTF-16 salen de QTextDocument en O(1); palabras y
+    caracteres astrales (dos unidades en Qt, uno para el usuario) se guardan
+    por bloque y sólo se recuentan los bloques que toca cada ``contentsChange``.
+    """
+    cambiadas = pyqtSignal()
+
+    def __init__(self, text_editor):
+        super().__init__(text_editor)
+        self.text_editor = text_editor
+        self.documento = text_editor.document()
+        self._palabras_por_bloque, self._astrales_por_bloque = self._contar(self.documento.firstBlock(), self.documento.lastBlock())
+        self.palabras = sum(self._palabras_por_bloque)
+        self.astrales = sum(self._astrales_por_bloque)
+        self.seleccion = 0
+
+        self.documento.contentsChange.connect(self._contenido_cambiado)
+        self.text_editor.selectionChanged.connect(self._seleccion_cambiada)
+
+    @property
+    def caracteres(self):
+        return self.documento.characterCount() - 1 - self.astrales # Sin el separador final que añade Qt
+
+    @property
+    def lineas(self):
+        return self.documento.blockCount()
+
+    def _contar(self, primero, ultimo):
+        """Palabras y caracteres astrales de cada bloque entre ``primero`` y ``ultimo`` (incluidos)."""
+        # Un único selectedText es mucho más barato que pedir el texto bloque a bloque
+        cursor = QTextCursor(self.documento)
+        cursor.setPosition(primero.position())
+        cursor.setPosition(ultimo.position() + ultimo.length() - 1, QTextCursor.MoveMode.KeepAnchor)
+        texto = cursor.selectedText()
+        lineas = texto.split('\u2029')
+        palabras = [len(linea.split()) for linea in lineas]
+        if texto.isascii():
+            astrales = [0] * len(lineas)
+        else:
+            astrales = [len(_PATRON_ASTRAL.findall(linea)) for linea in lineas]
+        return palabras, astrales
+
+    def _contenido_cambiado(self, posicion, eliminados, anadidos):
+        documento = self.documento
+        primero = documento.findBlock(posicion)
+        ultimo = documento.findBlock(posicion + anadidos)
+        if not primero.isValid():
+            primero = documento.lastBlock()
+        if not ultimo.isValid():
+            ultimo = documento.lastBlock()
+        inicio = primero.blockNumber()
+        # Bloques que ocupaba el tramo antes del cambio = los de ahora menos los que se han creado
+        anteriores = ultimo.blockNumber() - inicio + 1 - (documento.blockCount() - len(self._palabras_por_bloque))
+        palabras, astrales = self._contar(primero, ultimo)
+        fin = inicio + anteriores
+        self.palabras += sum(palabras) - sum(self._palabras_por_bloque[inicio:fin])
+        self.astrales += sum(astrales) - sum(self._astrales_por_bloque[inicio:fin])
+        self._palabras_por_bloque[inicio:fin] = palabras
+        self._astrales_por_bloque[inicio:fin] = astrales
+        self.cambiadas.emit()
+
+    def _seleccion_cambiada(self):
+        cursor = self.text_editor.textCursor()
+        seleccion = cursor.selectionEnd() - cursor.selectionStart() # En unidades UTF-16
+        if seleccion != self.seleccion:
+            self.seleccion = seleccion
+            self.cambiadas.emit()
+
+# --- 8. Programador de la barra de estado ---
+
+class ProgramadorBarraEstado(QObject):
+    """Agrupa las peticiones de refresco de la barra de estado y las aplica una vez por fotograma.
+
+    Cada campo sucio se recuerda en un conjunto; un único temporizador de un
+    disparo llama a su actualizador como mucho cada ``INTERVALO_MS``, así que
+    una ráfaga de teclas o un reemplazo masivo sólo relayouta las etiquetas una vez.
+    """
+    INTERVALO_MS = 16 # ~60 fps
+
+    def __init__(self, actualizadores, parent=None):
+        super().__init__(parent)
+        self.actualizadores = actualizadores # campo -> función que refresca su etiqueta
+        self._sucios = set()
+        self.temporizador = QTimer(self)
+        self.temporizador.setSingleShot(True)
+        self.temporizador.setInterval(self.INTERVALO_MS)
+        self.temporizador.timeout.connect(self.aplicar)
+
+    def marcar(self, *campos):
+        """Marca campos para refrescar (todos si no se indica ninguno)."""
+        self._sucios.update(campos or self.actualizadores)
+        if not self.temporizador.isActive():
+            self.temporizador.start()
+
+    def aplicar(self):
+        """Refresca ya los campos pendientes."""
+        self.temporizador.stop()
+        sucios, self._sucios = self._sucios, set()
+        for campo, actualizar in self.actualizadores.items():
+            if campo in sucios:
+                actualizar()
+
+# --- 9. Registro de documentos abiertos ---
+
+def clave_ruta(ruta):
+    """Forma canónica de una ruta: real (sin enlaces) y con la capitalización que use el sistema."""
+    return os.path.normcase(os.path.realpath(ruta))
+
+class RegistroDocumentos:
+    """Índice de las pestañas abiertas por ruta canónica y por inodo, con búsqueda O(1).
+
+    La ruta canónica resuelve distintas formas de escribir la misma ruta y los
+    enlaces simbólicos; el par (dispositivo, inodo) resuelve además los enlaces
+    duros y las rutas que ``realpath`` no puede unificar.
+
+    Si se le da un VigilanteDocumentos, vigila en disco cada ruta registrada.
+    """
+    def __init__(self, vigilante=None):
+        self.vigilante = vigilante
+        self._por_ruta = {}
+        self._por_inodo = {}
+        self._claves = {} # editor -> (clave de ruta, inodo o None)
+
+    @staticmethod
+    def _inodo(ruta):
+        try:
+            info = os.stat(ruta)
+        except OSError:
+            return None
+        return (info.st_dev, info.st_ino) if info.st_ino else None # Algunos sistemas no dan inodo
+
+    def buscar(self, ruta):
+        """Devuelve el editor que tiene abierta ``ruta`` o None."""
+        editor = self._por_ruta.get(clave_ruta(ruta))
+        if editor is None and self._por_inodo:
+            inodo = self._inodo(ruta)
+            if inodo is not None:
+                editor = self._por_inodo.get(inodo)
+                # Otro programa puede haber sustituido el archivo de la pestaña (guardado
+                # atómico) y el sistema reutilizar su inodo para un archivo distinto
+                if editor is not None and self._inodo(editor.ruta_archivo) != inodo:
+                    del self._por_inodo[inodo]
+                    self._claves[editor] = (self._claves[editor][0], None)
+                    editor = None
+        return editor
+
+    def registrar(self, editor, ruta):
+        """Asocia ``editor`` a ``ruta`` (sustituye la asociación anterior del editor, si la había)."""
+        self.quitar(editor)
+        clave = clave_ruta(ruta)
+        inodo = self._inodo(ruta)
+        self._por_ruta[clave] = editor
+        if inodo is not None:
+            self._por_inodo[inodo] = editor
+        self._claves[editor] = (clave, inodo)
+        if self.vigilante is not None:
+            self.vigilante.vigilar(clave)
+
+    def quitar(self, editor):
+        if editor not in self._claves:
+            return
+        clave, inodo = self._claves.pop(editor)
+        if self._por_ruta.get(clave) is editor:
+            del self._por_ruta[clave]
+        if self._por_inodo.get(inodo) is editor:
+            del self._por_inodo[inodo]
+        if self.vigilante is not None:
+            self.vigilante.soltar(clave)
+
+class VigilanteDocumentos(QObject):
+    """Vigila en disco los archivos abiertos y avisa, agrupando ráfagas, de los que cambiaron.
+
+    Cada ruta canónica ocupa una sola entrada del QFileSystemWatcher aunque la
+    usen varias pestañas (se cuentan sus usos). Los avisos se retienen
+    ``RETARDO_MS`` para que un formateador o un ``git checkout`` que escriben
+    varias veces produzcan una sola recarga; el temporizador no se reinicia,
+    así que un archivo que no deja de crecer también se avisa.
+    """
+    cambiado = pyqtSignal(str) # Ruta canónica
+
+    RETARDO_MS = 300
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._usos = {}
+        self._pendientes = set()
+        self.observador = QFileSystemWatcher(self)
+        self.observador.fileChanged.connect(self._archivo_cambiado)
+        self.temporizador = QTimer(self)
+        self.temporizador.setSingleShot(True)
+        self.temporizador.setInterval(self.RETARDO_MS)
+        self.temporizador.timeout.connect(self._avisar)
+        self._inactiva = False
+        QApplication.instance().applicationStateChanged.connect(self._estado_aplicacion)
+
+    def vigilar(self, clave):
+        usos = self._usos.get(clave, 0)
+        self._usos[clave] = usos + 1
+        if not usos and os.path.exists(clave):
+            self.observador.addPath(clave)
+
+    def soltar(self, clave):
+        usos = self._usos.pop(clave, 0) - 1
+        if usos > 0:
+            self._usos[clave] = usos
+            return
+        self._pendientes.discard(clave)
+        if clave in self.observador.files():
+            self.observador.removePath(clave)
+
+    def _archivo_cambiado(self, ruta):
+        self._pendientes.add(ruta)
+        if not self.temporizador.isActive():
+            self.temporizador.start()
+
+    def _avisar(self, pendientes=None):
+        if pendientes is None:
+            pendientes, self._pendientes = self._pendientes, set()
+        vigilados = set(self.observador.files())
+        for clave in pendientes:
+            if clave not in self._usos:
+                continue
+            # Un guardado atómico sustituye el archivo y el observador deja de vigilarlo
+            if clave not in vigilados and os.path.exists(clave):
+                self.observador.addPath(clave)
+            self.cambiado.emit(clave)
+
+    def _estado_aplicacion(self, estado):
+        # Lo que cambió mientras la aplicación no estaba activa (o sin vigilancia: un archivo borrado) se revisa al volver
+        if estado != Qt.ApplicationState.ApplicationActive:
+            self._inactiva = True
+        elif self._inactiva:
+            self._inactiva = False
+            self._avisar(set(self._usos))
+
+def tramo_cambiado(viejo, nuevo, paso=64 * 1024):
+    """Devuelve (inicio, fin_viejo, fin_nuevo), el tramo de ``viejo`` que hay que sustituir por ``nuevo[inicio:fin_nuevo]``.
+
+    El prefijo y el sufijo comunes se recorren por trozos de ``paso`` y se
+    afinan por bisección, comparando rebanadas en lugar de carácter a carácter.
+    """
+    corto = min(len(viejo), len(nuevo))
+
+    def comun(igual):
+        largo = 0
+        while largo + paso <= corto and igual(largo, largo + paso):
+            largo += paso
+        bajo, alto = largo, min(corto, largo + paso)
+        while bajo < alto:
+            medio = (bajo + alto + 1) // 2
+            if igual(largo, medio):
+                bajo = medio
+            else:
+                alto = medio - 1
+        return bajo
+
+    inicio = comun(lambda a, b: viejo[a:b] == nuevo[a:b])
+    corto -= inicio
+    fin = comun(lambda a, b: viejo[len(viejo) - b:len(viejo) - a] == nuevo[len(nuevo) - b:len(nuevo) - a])
+    return inicio, len(viejo) - fin, len(nuevo) - fin
+
+# --- 10. Motor de búsqueda y reemplazo ---
+
+def compilar_busqueda(texto, usar_regex=False, mayusculas=False, palabra_completa=False):
+    """Compila lo escrito en la barra de búsqueda como patrón de ``re`` (lanza re.error si no es válido)."""
+    patron = texto if usar_regex else re.escape(texto)
+    if palabra_completa:
+        patron = rf'(?<!\w)(?:{patron})(?!\w)'
+    banderas = re.MULTILINE
+    if not mayusculas:
+        banderas |= re.IGNORECASE
+    return re.compile(patron, banderas)
+
+def texto_documento(documento):
+    """Instantánea del documento con las mismas posiciones que Qt (salvo caracteres astrales).
+
+    ``toRawText`` conserva los espacios duros que ``toPlainText`` convierte;
+    sólo se traducen los separadores de párrafo a ``\\n``.
+    """
+    return documento.toRawText().replace('\u2029', '\n')
+
+def posiciones_utf16(texto, indices):
+    """Convierte índices de ``texto`` (puntos de código) en posiciones de Qt (unidades UTF-16)."""
+    if texto.isascii():
+        return list(indices)
+    astrales = [m.start() for m in _PATRON_ASTRAL.finditer(texto)]
+    return [i + bisect.bisect_left(astrales, i) for i in indices]
+
+def indices_python(texto, posiciones):
+    """Inversa de ``posiciones_utf16``: posiciones de Qt a índices de ``texto``."""
+    if texto.isascii():
+        return list(posiciones)
+    astrales = [m.start() + k for k, m in enumerate(_PATRON_ASTRAL.finditer(texto))] # Ya en posiciones de Qt
+    return [p - bisect.bisect_left(astrales, p) for p in posiciones]
+
+def _a_posiciones_qt(texto, inicios, fines):
+    if not texto.isascii():
+        inicios = posiciones_utf16(texto, inicios)
+        fines = posiciones_utf16(texto, fines)
+    return inicios, [b - a for a, b in zip(inicios, fines)]
+
+TAMANO_TRAMO_BUSQUEDA = 1 << 20 # Caracteres por tramo al recorrer el documento
+
+def recorrer_coincidencias(texto, patron, cancelado=None, vacias=False):
+    """Índices ``(inicios, fines)`` en ``texto`` de las coincidencias de ``patron``.
+
+    El texto se recorre por tramos de líneas completas y entre tramo y tramo se
+    consulta ``cancelado``; si devuelve True se abandona y el resultado es None.
+    La última línea de cada tramo se vuelve a mirar con el siguiente, así que
+    una coincidencia sólo puede cruzar un salto de línea en el límite de un tramo.
+    Las coincidencias vacías sólo se incluyen con ``vacias``.
+    """
+    inicios = []
+    fines = []
+    total = len(texto)
+    pos = 0
+    while pos <= total:
+        if cancelado is not None and cancelado():
+            return None
+        fin = texto.find('\n', pos + TAMANO_TRAMO_BUSQUEDA) + 1 or total
+        corte = total + 1 # El último tramo acepta también lo que empieza al final
+        if fin < total:
+            corte = texto.rfind('\n', pos, fin - 1) + 1 or fin # Inicio de la última línea del tramo
+        siguiente = corte
+        for m in patron.finditer(texto, pos, fin):
+            a, b = m.span()
+            if a >= corte:
+                break
+            if b > a or vacias:
+                inicios.append(a)
+                fines.append(b)
+                siguiente = max(siguiente, b)
+        pos = siguiente
+    return inicios, fines
+
+def buscar_coincidencias(texto, patron, cancelado=None):
+    """Inicios y longitudes (en posiciones de Qt) de las coincidencias no vacías de ``patron``.
+
+    Devuelve None si ``cancelado`` lo pide (ver ``recorrer_coincidencias``).
+    """
+    tramos = recorrer_coincidencias(texto, patron, cancelado)
+    if tramos is None:
+        return None
+    return _a_posiciones_qt(texto, *tramos)
+
+def refinar_coincidencias(texto, patron, candidatos, cancelado=None):
+    """Como ``buscar_coincidencias``, pero probando ``patron`` sólo en las posiciones ``candidatos``.
+
+    Sirve cuando se sabe que toda coincidencia nueva empieza en un candidato
+    (ver ``consulta_refina``); el recorrido voraz de izquierda a derecha da las
+    mismas coincidencias sin solapar que ``finditer``.
+    """
+    inicios = []
+    fines = []
+    ultimo = 0
+    for n, a in enumerate(indices_python(texto, candidatos)):
+        if n % 65536 == 0 and cancelado is not None and cancelado():
+            return None
+        if a < ultimo:
+            continue
+        m = patron.match(texto, a)
+        if m is not None and m.end() > a:
+            inicios.append(a)
+            fines.append(m.end())
+            ultimo = m.end()
+    return _a_posiciones_qt(texto, inicios, fines)
+
+def consulta_refina(anterior, nueva):
+    """True si toda coincidencia de ``nueva`` empieza donde hubo una de ``anterior``.
+
+    Las consultas son ``(texto, usar_regex, mayusculas, palabra_completa)``. Vale
+    cuando se alarga una búsqueda literal que no es de palabra completa y cuyo
+    texto no tiene un prefijo que también sea sufijo: sus apariciones no pueden
+    solaparse, así que ``finditer`` las encontró todas.
+    """
+    if anterior is None or nueva is None:
+        return False
+    texto, usar_regex, mayusculas, palabra_completa = anterior
+    if usar_regex or palabra_completa or nueva[1] or nueva[2] != mayusculas:
+        return False
+    if not nueva[0].startswith(texto):
+        return False
+    banderas = 0 if mayusculas else re.IGNORECASE
+    return not any(re.fullmatch(re.escape(texto[:k]), texto[-k:], banderas) for k in range(1, len(texto)))
+
+def reemplazar_en_texto(texto, patron, reemplazo, cancelado=None):
+    """Sustituye todas las coincidencias de una pasada.
+
+    Devuelve ``(inicio, fin, nuevo, contador)``: basta con cambiar
+    ``texto[inicio:fin]`` por ``nuevo``. Devuelve None si no hay coincidencias
+    (o si ``cancelado`` lo pide). El reemplazo es literal, como en la búsqueda de Qt.
+    """
+    tramos = recorrer_coincidencias(texto, patron, cancelado, vacias=True)
+    if not tramos or not tramos[0]:
+        return None
+    inicios, fines = tramos
+    partes = [reemplazo]
+    for ultimo, a in zip(fines, inicios[1:]):
+        partes.append(texto[ultimo:a])
+        partes.append(reemplazo)
+    return inicios[0], fines[-1], ''.join(partes), len(inicios)
+
+def _ramas_regex(op, av):
+    """Subpatrones hijos de un nodo de ``sre_parse``."""
+    if op == sre_parse.BRANCH:
+        return av[1]
+    hijos = av if isinstance(av, (tuple, list)) else (av,)
+    return [h for h in hijos if isinstance(h, sre_parse.SubPattern)]
+
+def _analizar_nodos(nodos, repetido):
+    for op, av in nodos:
+        if op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            return "usa referencias a grupos"
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            sin_limite = av[1] == sre_parse.MAXREPEAT
+            if sin_limite and repetido:
+                return "tiene cuantificadores anidados"
+            hijos_repetidos = repetido or sin_limite
+        elif op == sre_parse.BRANCH and repetido:
+            return "tiene alternativas dentro de un cuantificador"
+        elif op in (getattr(sre_parse, 'POSSESSIVE_REPEAT', None), getattr(sre_parse, 'ATOMIC_GROUP', None)):
+            hijos_repetidos = False # No retroceden
+        else:
+            hijos_repetidos = repetido
+        for hijo in _ramas_regex(op, av):
+            motivo = _analizar_nodos(hijo, hijos_repetidos)
+            if motivo:
+                return motivo
+    return None
+
+def analizar_regex(patron):
+    """Motivo por el que ``patron`` podría retroceder de forma catastrófica, o None.
+
+    Es un análisis prudente del árbol de ``sre_parse``: marca los cuantificadores
+    sin límite dentro de otro, las alternativas dentro de un cuantificador sin
+    límite y las referencias a grupos. Los patrones marcados nunca se ejecutan en
+    el hilo de la interfaz.
+    """
+    try:
+        return _analizar_nodos(sre_parse.parse(patron.pattern, patron.flags), False)
+    except Exception:
+        return "no se pudo analizar"
+
+class PatronCostoso(Exception):
+    """La expresión regular agotó su presupuesto de tiempo en el proceso vigilante."""
+
+def _proceso_regex(conexion):
+    """Bucle del proceso vigilante: recibe ``(patron, texto, reemplazo)`` y devuelve el resultado.
+
+    Antes de cada tramo manda un latido (None) para que el vigilante sepa que
+    avanza; ``reemplazo`` None significa buscar en lugar de reemplazar.
+    """
+    latido = lambda: conexion.send(None)
+    while True:
+        try:
+            patron, texto, reemplazo = conexion.recv()
+        except (EOFError, OSError):
+            break
+        try:
+            if reemplazo is None:
+                resultado = buscar_coincidencias(texto, patron, latido)
+            else:
+                resultado = reemplazar_en_texto(texto, patron, reemplazo, latido)
+            conexion.send(('ok', resultado))
+        except Exception as e:
+            conexion.send(('error', str(e)))
+
+class VigilanteRegex:
+    """Ejecuta expresiones regulares del usuario en otro proceso con presupuesto de tiempo.
+
+    ``re`` no suelta el GIL ni se puede interrumpir mientras retrocede, así que
+    un patrón catastrófico bloquearía la interfaz aunque corriera en un hilo.
+    Cada tramo de ``TAMANO_TRAMO_BUSQUEDA`` caracteres debe terminar dentro de
+    ``PRESUPUESTO_TRAMO``; si no, o si se cancela, el proceso se termina y se
+    vuelve a lanzar con la siguiente petición.
+    """
+    PRESUPUESTO_TRAMO = 2.0 # Segundos
+    ESPERA_ARRANQUE = 30.0 # El primer latido incluye lanzar el proceso
+
+    def __init__(self):
+        self._proceso = None
+        self._conexion = None
+        self._arrancado = False
+
+    def _arrancar(self):
+        contexto = multiprocessing.get_context('spawn') # fork no es seguro con hilos de Qt
+        conexion, extremo = contexto.Pipe()
+        proceso = contexto.Process(target=_proceso_regex, args=(extremo,), daemon=True)
+        proceso.start()
+        extremo.close()
+        self._proceso, self._conexion = proceso, conexion
+        self._arrancado = False
+
+    def detener(self):
+        if self._proceso is not None:
+            self._proceso.terminate()
+            self._proceso.join()
+            self._conexion.close()
+            self._proceso = self._conexion = None
+
+    def ejecutar(self, patron, texto, reemplazo=None, cancelado=None):
+        """Resultado de ``buscar_coincidencias`` (o de ``reemplazar_en_texto`` si hay ``reemplazo``).
+
+        Devuelve None si ``cancelado`` lo pide y lanza PatronCostoso si un tramo
+        agota el presupuesto.
+        """
+        if self._proceso is None or not self._proceso.is_alive():
+            self.detener()
+            self._arrancar()
+        self._conexion.send((patron, texto, reemplazo))
+        limite = self.PRESUPUESTO_TRAMO if self._arrancado else self.ESPERA_ARRANQUE
+        ultimo_latido = time.monotonic()
+        while True:
+            if self._conexion.poll(0.05):
+                try:
+                    mensaje = self._conexion.recv()
+                except EOFError:
+                    self.detener()
+                    raise PatronCostoso("El proceso de búsqueda terminó")
+                self._arrancado = True
+                if mensaje is None:
+                    limite = self.PRESUPUESTO_TRAMO
+                    ultimo_latido = time.monotonic()
+                    continue
+                tipo, valor = mensaje
+                if tipo == 'error':
+                    raise re.error(valor)
+                return valor
+            if cancelado is not None and cancelado():
+                self.detener()
+                return None
+            if time.monotonic() - ultimo_latido > limite:
+                self.detener()
+                raise PatronCostoso("Patrón demasiado costoso")
+
+class TrabajoBusqueda:
+    """Instantánea del documento en la que se buscan todas las coincidencias fuera de la interfaz.
+
+    Con ``candidatos`` sólo se prueban esas posiciones (la consulta anterior
+    era un prefijo de ésta). Con ``vigilado`` (expresiones regulares del
+    usuario) la búsqueda corre en el VigilanteRegex y, si se pasa del
+    presupuesto, ``error`` queda con el motivo. Con ``reemplazo`` se calcula
+    ``reemplazar_en_texto`` en lugar del índice y se conserva el texto para
+    aplicarlo. La sesión marca ``cancelado`` cuando llega una consulta nueva y
+    el trabajador lo abandona en el siguiente tramo.
+    """
+    def __init__(self, solicitante, generacion, patron, texto, candidatos=None, vigilado=False, reemplazo=None):
+        self.solicitante = solicitante
+        self.generacion = generacion
+        self.patron = patron
+        self.texto = texto
+        self.candidatos = candidatos
+        self.vigilado = vigilado
+        self.reemplazo = reemplazo
+        self.cancelado = False
+        self.error = None
+        self.inicios = []
+        self.longitudes = []
+        self.resultado = None
+
+    def ejecutar(self, vigilante):
+        cancelado = lambda: self.cancelado
+        try:
+            if self.reemplazo is not None:
+                if self.vigilado:
+                    self.resultado = vigilante.ejecutar(self.patron, self.texto, self.reemplazo, cancelado)
+                else:
+                    self.resultado = reemplazar_en_texto(self.texto, self.patron, self.reemplazo, cancelado)
+                return
+            if self.vigilado:
+                resultado = vigilante.ejecutar(self.patron, self.texto, cancelado=cancelado)
+            elif self.candidatos is None:
+                resultado = buscar_coincidencias(self.texto, self.patron, cancelado)
+            else:
+                resultado = refinar_coincidencias(self.texto, self.patron, self.candidatos, cancelado)
+        except (PatronCostoso, re.error) as e:
+            self.error = str(e)
+            resultado = None
+        self.texto = self.candidatos = None
+        if resultado is not None:
+            self.inicios, self.longitudes = resultado
+
+class TrabajadorBusqueda(QThread):
+    """Hilo compartido por todas las sesiones de búsqueda que indexa coincidencias."""
+    buscado = pyqtSignal(object) # Emite el TrabajoBusqueda ya resuelto
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._cola = queue.Queue()
+        self._is_running = True
+        self._en_curso = None
+        self.vigilante = VigilanteRegex()
+
+    def encolar(self, trabajo):
+        self._cola.put(trabajo)
+
+    def detener(self):
+        self._is_running = False
+        trabajo = self._en_curso
+        if trabajo is not None:
+            trabajo.cancelado = True
+        self._cola.put(None)
+        self.wait()
+        self.vigilante.detener()
+
+    def run(self):
+        while self._is_running:
+            trabajo = self._cola.get()
+            if trabajo is None:
+                break
+            if trabajo.cancelado:
+                continue # Ya llegó otra consulta: ni se empieza
+            self._en_curso = trabajo
+            try:
+                trabajo.ejecutar(self.vigilante)
+            except Exception as e:
+                print(f"Error al buscar en segundo plano: {e}")
+                trabajo.error = "Error al buscar"
+            finally:
+                self._en_curso = None
+            if not trabajo.cancelado:
+                self.buscado.emit(trabajo)
+
+_trabajador_busqueda = None
+
+def obtener_trabajador_busqueda():
+    """Devuelve el hilo de búsqueda del proceso, creándolo la primera vez."""
+    global _trabajador_busqueda
+    if _trabajador_busqueda is None:
+        _trabajador_busqueda = TrabajadorBusqueda()
+        _trabajador_busqueda.start()
+        QApplication.instance().aboutToQuit.connect(_trabajador_busqueda.detener)
+    return _trabajador_busqueda
+
+class SesionBusqueda(QObject):
+    """Todas las coincidencias de la búsqueda actual en un editor, ordenadas por posición.
+
+    El índice inicial se calcula en TrabajadorBusqueda; después cada
+    ``contentsChange`` desplaza las coincidencias posteriores y vuelve a buscar
+    sólo en las líneas tocadas. Siguiente/anterior son búsquedas binarias y sólo
+    se resaltan (con ExtraSelections) las coincidencias que están en pantalla.
+    Si la consulta nueva alarga la anterior (``consulta_refina``) sólo se prueban
+    las coincidencias que ya había.
+
+    Las expresiones regulares del usuario se indexan en el VigilanteRegex y sólo
+    se vuelven a ejecutar en la interfaz (al editar) si ``analizar_regex`` no ve
+    riesgo; si no, el índice se descarta y se rehace en segundo plano.
+    """
+    actualizada = pyqtSignal() # Cambió el número de coincidencias o la actual
+
+    COLOR_COINCIDENCIA = QColor(255, 184, 108, 110)
+
+    def __init__(self, text_editor):
+        super().__init__(text_editor)
+        self.text_editor = text_editor
+        self.documento = text_editor.document()
+        self.patron = None
+        self.consulta = None # (texto, usar_regex, mayusculas, palabra_completa) de la barra
+        self.inicios = [] # Posiciones de Qt de cada coincidencia
+        self.longitudes = []
+        self.lista = False # El índice está completo
+        self.vigilada = False # Regex del usuario: se ejecuta en el proceso vigilante
+        self.segura = True # Se puede ejecutar en la interfaz para las líneas editadas
+        self.error = None # Motivo por el que no hay índice (p. ej. patrón demasiado costoso)
+        self._generacion = 0
+        self._trabajo = None # TrabajoBusqueda en curso
+        self._texto = None # Instantánea del documento, válida hasta la siguiente edición
+        self._desde = None # Al terminar, seleccionar la primera coincidencia desde aquí
+        self._obsoleta = False # Hubo cambios mientras el trabajador buscaba
+        self._conectada = False
+        self._formato = QTextCharFormat()
+        self._formato.setBackground(self.COLOR_COINCIDENCIA)
+
+        self._temporizador_reindexado = QTimer(self)
+        self._temporizador_reindexado.setSingleShot(True)
+        self._temporizador_reindexado.setInterval(300)
+        self._temporizador_reindexado.timeout.connect(self._reindexar)
+
+        self.documento.contentsChange.connect(self._contenido_cambiado)
+        text_editor.verticalScrollBar().valueChanged.connect(self.pintar_visibles)
+
+    # --- Consulta ---
+    def buscar(self, patron, consulta=None, seleccionar=False):
+        """Empieza a indexar ``patron`` (None limpia la búsqueda).
+
+        Con ``seleccionar``, al terminar se selecciona la primera coincidencia
+        desde el cursor (búsqueda mientras se escribe).
+        """
+        candidatos = self.inicios if self.lista and consulta_refina(self.consulta, consulta) else None
+        self._cancelar()
+        self.patron = patron
+        self.consulta = consulta if patron is not None else None
+        self.vigilada = consulta is not None and consulta[1]
+        self.segura = not self.vigilada or analizar_regex(patron) is None
+        self.error = None
+        self.inicios, self.longitudes = [], []
+        self.lista = False
+        self._temporizador_reindexado.stop()
+        self._desde = self.text_editor.textCursor().selectionStart() if seleccionar else None
+        if patron is None:
+            self._texto = None
+            self.pintar_visibles()
+            self.actualizada.emit()
+            return
+        self._enviar(candidatos)
+
+    def _cancelar(self):
+        self._generacion += 1
+        if self._trabajo is not None:
+            self._trabajo.cancelado = True
+            self._trabajo = None
+
+    def _enviar(self, candidatos=None):
+        self._obsoleta = False
+        trabajador = obtener_trabajador_busqueda()
+        if not self._conectada:
+            trabajador.buscado.connect(self._resultado)
+            self._conectada = True
+        self._trabajo = TrabajoBusqueda(self, self._generacion, self.patron, self.instantanea(), candidatos, self.vigilada)
+        trabajador.encolar(self._trabajo)
+
+    def _resultado(self, trabajo):
+        if trabajo.solicitante is not self or trabajo.generacion != self._generacion:
+            return
+        self._trabajo = None
+        if trabajo.error:
+            self.error = trabajo.error
+            self._desde = None
+            self.actualizada.emit()
+            return
+        if self._obsoleta:
+            self._enviar() # El texto cambió mientras tanto: se vuelve a pedir
+            return
+        self.inicios, self.longitudes = trabajo.inicios, trabajo.longitudes
+        self.lista = True
+        if self._desde is not None and self.inicios:
+            i = bisect.bisect_left(self.inicios, self._desde) % len(self.inicios)
+            self._desde = None
+            self._ir_a(i)
+        self.pintar_visibles()
+        self.actualizada.emit()
+
+    def instantanea(self):
+        """Texto del documento; se reutiliza entre consultas mientras no se edite."""
+        if self._texto is None:
+            self._texto = texto_documento(self.documento)
+        return self._texto
+
+    def vigente(self, texto):
+        """True si ``texto`` es la instantánea actual (no se ha editado desde entonces)."""
+        return texto is not None and texto is self._texto
+
+    def _reindexar(self):
+        if self.patron is not None and not self.lista and self._trabajo is None and not self.error:
+            self._enviar()
+
+    def indexar_ahora(self):
+        """Completa el índice en este hilo si el trabajador aún no ha respondido.
+
+        Las búsquedas vigiladas nunca se ejecutan aquí: hay que esperar al trabajador.
+        """
+        if self.lista or self.patron is None or self.vigilada:
+            return
+        self._cancelar() # Descarta la respuesta en curso
+        self._desde = None
+        self.inicios, self.longitudes = buscar_coincidencias(self.instantanea(), self.patron)
+        self.lista = True
+        self.pintar_visibles()
+
+    def terminar(self):
+        self.patron = None
+        self._texto = None
+        self._temporizador_reindexado.stop()
+        self._cancelar()
+        if self._conectada:
+            _trabajador_busqueda.buscado.disconnect(self._resultado)
+            self._conectada = False
+
+    # --- Navegación ---
+    def actual(self):
+        """Índice (0-based) de la coincidencia seleccionada en el editor, o None."""
+        cursor = self.text_editor.textCursor()
+        inicio = cursor.selectionStart()
+        i = bisect.bisect_left(self.inicios, inicio)
+        if i < len(self.inicios) and self.inicios[i] == inicio and self.longitudes[i] == cursor.selectionEnd() - inicio:
+            return i
+        return None
+
+    def seleccionar(self, adelante=True):
+        """Selecciona la coincidencia siguiente (o anterior) al cursor, dando la vuelta al documento.
+
+        Si el índice vigilado aún no está, se selecciona la siguiente cuando llegue.
+        """
+        self.indexar_ahora()
+        cursor = self.text_editor.textCursor()
+        if not self.lista:
+            if not self.error:
+                self._desde = cursor.selectionEnd()
+            return False
+        if not self.inicios:
+            return False
+        actual = self.actual()
+        if actual is not None:
+            i = actual + 1 if adelante else actual - 1
+        elif adelante:
+            i = bisect.bisect_left(self.inicios, cursor.selectionEnd())
+        else:
+            i = bisect.bisect_left(self.inicios, cursor.selectionStart()) - 1
+        self._ir_a(i % len(self.inicios)) # Da la vuelta al documento
+        self.actualizada.emit()
+        return True
+
+    def _ir_a(self, i):
+        cursor = self.text_editor.textCursor()
+        cursor.setPosition(self.inicios[i])
+        cursor.setPosition(self.inicios[i] + self.longitudes[i], QTextCursor.MoveMode.KeepAnchor)
+        self.text_editor.setTextCursor(cursor)
+
+    # --- Resaltado de la vista ---
+    def pintar_visibles(self):
+        selecciones = []
+        if self.inicios:
+            editor = self.text_editor
+            desde = editor.firstVisibleBlock().position()
+            esquina = QPoint(editor.viewport().width(), editor.viewport().height())
+            hasta = editor.cursorForPosition(esquina).block()
+            hasta = hasta.position() + hasta.length()
+            i = max(0, bisect.bisect_right(self.inicios, desde) - 1)
+            fin = bisect.bisect_left(self.inicios, hasta)
+            for inicio, longitud in zip(self.inicios[i:fin], self.longitudes[i:fin]):
+                seleccion = QTextEdit.ExtraSelection()
+                seleccion.format = self._formato
+                cursor = QTextCursor(self.documento)
+                cursor.setPosition(inicio)
+                cursor.setPosition(inicio + longitud, QTextCursor.MoveMode.KeepAnchor)
+                seleccion.cursor = cursor
+                selecciones.append(seleccion)
+        self.text_editor.setExtraSelections(selecciones)
+
+    # --- Mantenimiento incremental ---
+    def _contenido_cambiado(self, posicion, eliminados, anadidos):
+        self._texto = None
+        if self.patron is None:
+            return
+        if not self.lista:
+            self._obsoleta = True
+            if self._temporizador_reindexado.isActive():
+                self._temporizador_reindexado.start() # Se espera a que se deje de escribir
+            return
+        if not self.segura or anadidos > TAMANO_TRAMO_BUSQUEDA:
+            # No se vuelve a ejecutar el patrón aquí: se rehace el índice en segundo plano
+            self.inicios, self.longitudes = [], []
+            self.lista = False
+            self._temporizador_reindexado.start()
+            self.pintar_visibles()
+            self.actualizada.emit()
+            return
+        documento = self.documento
+        delta = anadidos - eliminados
+        # Se vuelven a buscar las líneas completas que toca el cambio
+        primero = documento.findBlock(posicion)
+        ultimo = documento.findBlock(posicion + anadidos)
+        if not primero.isValid():
+            primero = documento.lastBlock()
+        if not ultimo.isValid():
+            ultimo = documento.lastBlock()
+        desde = primero.position()
+        hasta = ultimo.position() + ultimo.length() - 1 # Fin del tramo en el texto nuevo
+        hasta_antes = hasta - delta # Y en el texto anterior
+
+        inicios, longitudes = self.inicios, self.longitudes
+        # Coincidencias que solapan el tramo (también las que empiezan antes y lo cruzan)
+        i = bisect.bisect_left(inicios, desde)
+        while i > 0 and inicios[i - 1] + longitudes[i - 1] > desde:
+            i -= 1
+        if i < len(inicios) and inicios[i] < desde:
+            desde = documento.findBlock(inicios[i]).position() # Empieza en una línea anterior
+        j = bisect.bisect_right(inicios, hasta_antes)
+
+        # Se busca con la línea siguiente como contexto (para las que cruzan el salto
+        # de línea), pero sólo cuentan las que empiezan en el tramo
+        siguiente = ultimo.next()
+        contexto = siguiente.position() + siguiente.length() - 1 if siguiente.isValid() else hasta
+        cursor = QTextCursor(documento)
+        cursor.setPosition(desde)
+        cursor.setPosition(contexto, QTextCursor.MoveMode.KeepAnchor)
+        nuevos_inicios, nuevas_longitudes = buscar_coincidencias(cursor.selectedText().replace('\u2029', '\n'), self.patron)
+        k = bisect.bisect_right(nuevos_inicios, hasta - desde)
+        nuevos_inicios, nuevas_longitudes = nuevos_inicios[:k], nuevas_longitudes[:k]
+        inicios[i:] = [desde + p for p in nuevos_inicios] + [p + delta for p in inicios[j:]]
+        longitudes[i:] = nuevas_longitudes + longitudes[j:]
+        self.pintar_visibles()
+        self.actualizada.emit()
+
+# --- 11. Búsqueda en la carpeta ---
+
+# Lo que se oculta de la carpeta abierta si themes.json no dice otra cosa ("files_exclude")
+EXCLUIR_POR_DEFECTO = ('.git', '.hg', '.svn', '__pycache__', '*.pyc', '.DS_Store')
+
+def _glob_a_regex(patron):
+    """Traduce un glob de .gitignore a regex: ``*`` y ``?`` no cruzan ``/``; ``**`` sí."""
+    partes = []
+    i = 0
+    while i < len(patron):
+        if patron.startswith('**/', i):
+            partes.append('(?:.*/)?')
+            i += 3
+        elif patron.startswith('**', i):
+            partes.append('.*')
+            i += 2
+        elif patron[i] == '*':
+            partes.append('[^/]*')
+            i += 1
+        elif patron[i] == '?':
+            partes.append('[^/]')
+            i += 1
+        elif patron[i] == '[' and ']' in patron[i + 2:]:
+            fin = patron.index(']', i + 2)
+            clase = patron[i + 1:fin].replace('\\', '\\\\')
+            if clase.startswith('!'):
+                clase = '^' + clase[1:]
+            partes.append(f'[{clase}]')
+            i = fin + 1
+        elif patron[i] == '\\' and i + 1 < len(patron):
+            partes.append(re.escape(patron[i + 1]))
+            i += 2
+        else:
+            partes.append(re.escape(patron[i]))
+            i += 1
+    return ''.join(partes)
+
+def regla_gitignore(linea):
+    """Traduce una línea de .gitignore a ``(regex, negada, solo_carpetas)``; None si no es un patrón.
+
+    La regex se aplica a la ruta relativa a la carpeta del .gitignore, con ``/``.
+    """
+    linea = linea.rstrip('\r\n')
+    while linea.endswith(' ') and not linea.endswith('\\ '):
+        linea = linea[:-1] # Los espacios finales no cuentan salvo escapados
+    if not linea or linea.startswith('#'):
+        return None
+    negada = linea.startswith('!')
+    if negada:
+        linea = linea[1:]
+    solo_carpetas = linea.endswith('/')
+    linea = linea.rstrip('/')
+    if not linea:
+        return None
+    anclada = '/' in linea # Con una barra (que no sea la final) es relativa a su carpeta
+    cuerpo = _glob_a_regex(linea.lstrip('/'))
+    return re.compile(('' if anclada else '(?:.*/)?') + cuerpo + r'\Z'), negada, solo_carpetas
+
+def leer_gitignore(ruta):
+    """Reglas del .gitignore (o archivo de exclusiones) ``ruta``; lista vacía si no existe."""
+    try:
+        with open(ruta, 'r', encoding='utf-8', errors='replace') as f:
+            return [regla for regla in map(regla_gitignore, f) if regla is not None]
+    except OSError:
+        return []
+
+class FiltroCarpeta:
+    """Decide qué se oculta de una raíz: lo que excluyen sus .gitignore (los de
+    cada carpeta y sus antecesoras hasta la raíz, más ``.git/info/exclude``) y
+    los globs de ``excluir`` (``files_exclude`` de themes.json).
+
+    Lo usan el explorador, la búsqueda en la carpeta y los índices, para que
+    todos vean los mismos archivos. Guarda las reglas que va leyendo, así que
+    cada hilo tiene su propia instancia.
+    """
+
+    def __init__(self, raiz, excluir=EXCLUIR_POR_DEFECTO):
+        self.raiz = os.path.abspath(raiz)
+        por_nombre = [fnmatch.translate(glob) for glob in excluir if '/' not in glob]
+        por_ruta = [fnmatch.translate(glob.strip('/')) for glob in excluir if '/' in glob]
+        self._excluir_nombre = re.compile('|'.join(por_nombre)) if por_nombre else None
+        self._excluir_ruta = re.compile('|'.join(por_ruta)) if por_ruta else None
+        self._reglas = {} # Carpeta -> reglas de su .gitignore
+
+    def relativa(self, ruta):
+        """Ruta relativa a la raíz con ``/`` (la raíz es ``''``); None si está fuera."""
+        relativa = os.path.relpath(ruta, self.raiz)
+        if relativa == '.':
+            return ''
+        if relativa == os.pardir or relativa.startswith(os.pardir + os.sep):
+            return None
+        return relativa.replace(os.sep, '/')
+
+    def leer_reglas(self, carpeta, tiene_gitignore=True):
+        """Vuelve a leer el .gitignore de ``carpeta`` (puede ser justo lo que ha cambiado).
+
+        Con ``tiene_gitignore`` a False (quien la ha listado no lo ha visto) no se abre.
+        """
+        reglas = leer_gitignore(os.path.join(carpeta, '.gitignore')) if tiene_gitignore else []
+        if carpeta == self.raiz:
+            reglas = leer_gitignore(os.path.join(carpeta, '.git', 'info', 'exclude')) + reglas
+        self._reglas[carpeta] = reglas
+        return reglas
+
+    def cadena(self, carpeta):
+        """Reglas que afectan a ``carpeta``: ``[(prefijo relativo, reglas)]`` de la raíz hacia dentro."""
+        cadena = []
+        actual = self.raiz
+        relativa = self.relativa(carpeta)
+        partes = relativa.split('/') if relativa else []
+        for n in range(len(partes) + 1):
+            if n:
+                actual = os.path.join(actual, partes[n - 1])
+            reglas = self._reglas.get(actual)
+            if reglas is None:
+                reglas = self.leer_reglas(actual)
+            if reglas:
+                cadena.append(('/'.join(partes[:n]) + '/' if n else '', reglas))
+        return cadena
+
+    def excluida(self, nombre, relativa, es_carpeta, cadena):
+        """Si se oculta la entrada ``nombre`` (``relativa`` a la raíz) con la ``cadena`` de su carpeta."""
+        if self._excluir_nombre is not None and self._excluir_nombre.match(nombre):
+            return True
+        if self._excluir_ruta is not None and self._excluir_ruta.match(relativa):
+            return True
+        excluida = False
+        for prefijo, reglas in cadena: # La última regla que coincide manda, como en git
+            local = relativa[len(prefijo):]
+            for regex, negada, solo_carpetas in reglas:
+                if (es_carpeta or not solo_carpetas) and regex.match(local):
+                    excluida = not negada
+        return excluida
+
+    def oculta(self, ruta, es_carpeta):
+        """Si ``ruta`` está fuera de la raíz o se oculta ella o alguna carpeta que la contiene."""
+        relativa = self.relativa(ruta)
+        if relativa is None:
+            return True
+        partes = relativa.split('/') if relativa else []
+        carpeta = self.raiz
+        for n, nombre in enumerate(partes, 1):
+            if self.excluida(nombre, '/'.join(partes[:n]), es_carpeta or n < len(partes), self.cadena(carpeta)):
+                return True # Como en git, lo que cuelga de una carpeta excluida no se puede volver a incluir
+            carpeta = os.path.join(carpeta, nombre)
+        return False
+
+    def recorrer(self, carpeta):
+        """``os.walk`` de ``carpeta`` sin lo que se oculta; cada .gitignore se lee de nuevo al pasar."""
+        for directorio, subdirectorios, archivos in os.walk(carpeta):
+            relativa = self.relativa(directorio)
+            if relativa is None:
+                continue
+            self.leer_reglas(directorio, '.gitignore' in archivos)
+            cadena = self.cadena(directorio)
+            prefijo = relativa + '/' if relativa else ''
+            subdirectorios[:] = [d for d in subdirectorios if not self.excluida(d, prefijo + d, True, cadena)]
+            archivos[:] = [a for a in archivos if not self.excluida(a, prefijo + a, False, cadena)]
+            yield directorio, subdirectorios, archivos
+
+def leer_texto_buscable(ruta, tamano_maximo):
+    """Lee ``ruta`` para buscar en ella; None si es binaria, mayor de ``tamano_maximo`` o no se puede leer."""
+    try:
+        if os.path.getsize(ruta) > tamano_maximo:
+            return None
+        with open(ruta, 'rb') as f:
+            datos = f.read()
+    except OSError:
+        return None
+    encoding = detectar_codificacion(datos[:CargadorArchivo.TAMANO_FRAGMENTO])
+    if not encoding.startswith(('utf-16', 'utf-32')) and b'\0' in datos[:8192]:
+        return None # Binario
+    return datos.decode(encoding, errors='replace')
+
+def buscar_en_lote(rutas, patron, tamano_maximo, maximo_por_archivo):
+    """Busca ``patron`` en cada archivo de ``rutas`` (se ejecuta en el pool de procesos).
+
+    Devuelve ``(revisados, [(ruta, coincidencias), ...])`` sólo con los archivos
+    que tienen alguna; cada coincidencia es ``(linea, columna, longitud, vista)``
+    con línea y columna desde 0. Se saltan los binarios, los que no se pueden
+    leer y los mayores de ``tamano_maximo`` (se abren en el visor de archivos grandes).
+    """
+    encontrados = []
+    for ruta in rutas:
+        texto = leer_texto_buscable(ruta, tamano_maximo)
+        if texto is None:
+            continue
+        coincidencias = []
+        linea = inicio_linea = anterior = 0
+        for m in patron.finditer(texto):
+            a, b = m.span()
+            if a == b:
+                continue
+            linea += texto.count('\n', anterior, a)
+            salto = texto.rfind('\n', inicio_linea, a)
+            if salto != -1:
+                inicio_linea = salto + 1
+            anterior = a
+            fin_linea = texto.find('\n', a)
+            if fin_linea == -1:
+                fin_linea = len(texto)
+            vista = texto[max(inicio_linea, a - 60):min(fin_linea, b + 100)].strip()
+            coincidencias.append((linea, a - inicio_linea, b - a, vista))
+            if len(coincidencias) >= maximo_por_archivo:
+                break
+        if coincidencias:
+            encontrados.append((ruta, coincidencias))
+    return len(rutas), encontrados
+
+_pool_busqueda = None
+_cerrojo_pool = threading.Lock()
+
+def obtener_pool_busqueda():
+    """Pool de procesos para buscar en carpetas (uno por núcleo), creado la primera vez.
+
+    Es un ``multiprocessing.Pool`` y no un ProcessPoolExecutor porque hace falta
+    ``terminate`` si un lote se queda atascado en una regex catastrófica.
+    """
+    global _pool_busqueda
+    with _cerrojo_pool:
+        if _pool_busqueda is None:
+            contexto = multiprocessing.get_context('spawn') # fork no es seguro con hilos de Qt
+            _pool_busqueda = contexto.Pool(os.cpu_count() or 1)
+            QApplication.instance().aboutToQuit.connect(cerrar_pool_busqueda)
+        return _pool_busqueda
+
+def cerrar_pool_busqueda(pool=None):
+    """Termina el pool (sólo si sigue siendo ``pool``, cuando se indica)."""
+    global _pool_busqueda
+    with _cerrojo_pool:
+        if _pool_busqueda is None or (pool is not None and pool is not _pool_busqueda):
+            return
+        _pool_busqueda.terminate()
+        _pool_busqueda = None
+
+class BuscadorEnCarpeta(QThread):
+    """Recorre una carpeta y reparte sus archivos en lotes entre el pool de procesos.
+
+    Los resultados se emiten según van llegando los lotes. ``cancelar`` deja de
+    repartir y de esperar; si quedan lotes en curso termina el pool, para que no
+    sigan ocupando los procesos (y consumiendo el presupuesto) de la búsqueda
+    siguiente, que ya usará uno nuevo. Si un lote pasa de ``PRESUPUESTO_LOTE`` el
+    pool también se termina. Con un ``indice`` al
+    día sólo se revisan los archivos que contienen los ``trigramas`` del patrón.
+    """
+    encontrados = pyqtSignal(list) # [(ruta, coincidencias), ...] de un lote
+    progreso = pyqtSignal(int) # Archivos revisados hasta ahora
+    busqueda_terminada = pyqtSignal(bool) # True si se cortó al llegar a MAXIMO_RESULTADOS
+    error_busqueda = pyqtSignal(str)
+
+    TAMANO_LOTE = 64
+    MAXIMO_RESULTADOS = 20000
+    MAXIMO_POR_ARCHIVO = 1000
+    PRESUPUESTO_LOTE = 30.0 # Segundos
+
+    def __init__(self, pool, raiz, patron, tamano_maximo, indice=None, trigramas=(), excluir=EXCLUIR_POR_DEFECTO,
+                 parent=None):
+        super().__init__(parent)
+        self.pool = pool
+        self.raiz = raiz
+        self.excluir = excluir
+        self.patron = patron
+        self.tamano_maximo = tamano_maximo
+        self.indice = indice
+        self.trigramas = trigramas
+        self._candidatos = None # Archivos que da el índice (None: recorrer la carpeta)
+        self._cancelado = False
+        self._en_vuelo = [] # (momento de envío, AsyncResult) en orden de envío
+        self._revisados = 0
+        self._resultados = 0
+
+    def cancelar(self):
+        self._cancelado = True
+        if any(not resultado.ready() for _, resultado in list(self._en_vuelo)):
+            cerrar_pool_busqueda(self.pool)
+
+    def _lotes(self):
+        if self._candidatos is not None:
+            for i in range(0, len(self._candidatos), self.TAMANO_LOTE):
+                yield self._candidatos[i:i + self.TAMANO_LOTE]
+            return
+        lote = []
+        for directorio, subdirectorios, archivos in FiltroCarpeta(self.raiz, self.excluir).recorrer(self.raiz):
+            subdirectorios.sort()
+            for nombre in sorted(archivos):
+                lote.append(os.path.join(directorio, nombre))
+                if len(lote) == self.TAMANO_LOTE:
+                    yield lote
+                    lote = []
+        if lote:
+            yield lote
+
+    def _recoger(self):
+        """Espera un poco al lote más antiguo; devuelve False si hay que parar."""
+        if self._cancelado:
+            return False
+        enviado, resultado = self._en_vuelo[0]
+        resultado.wait(0.05)
+        if not resultado.ready():
+            if time.monotonic() - enviado > self.PRESUPUESTO_LOTE:
+                cerrar_pool_busqueda(self.pool)
+                self.error_busqueda.emit("Patrón demasiado costoso")
+                return False
+            return True
+        self._en_vuelo.pop(0)
+        revisados, encontrados = resultado.get()
+        self._revisados += revisados
+        if encontrados and not self._cancelado:
+            restantes = self.MAXIMO_RESULTADOS - self._resultados
+            recortados = []
+            for ruta, coincidencias in encontrados:
+                if restantes <= 0:
+                    break
+                coincidencias = coincidencias[:restantes]
+                recortados.append((ruta, coincidencias))
+                restantes -= len(coincidencias)
+            self._resultados = self.MAXIMO_RESULTADOS - restantes
+            self.encontrados.emit(recortados)
+        self.progreso.emit(self._revisados)
+        return True
+
+    def run(self):
+        try:
+            if self.indice is not None and self.trigramas:
+                self._candidatos = self.indice.candidatos(self.trigramas)
+            if not self._repartir():
+                return # Cancelada o fallida
+        except Exception as e:
+            if not self._cancelado: # Al cancelar, el pool puede terminarse mientras se reparte
+                self.error_busqueda.emit(str(e))
+            return
+        self.busqueda_terminada.emit(self._resultados >= self.MAXIMO_RESULTADOS)
+
+    def _repartir(self):
+        """Envía los lotes y recoge sus resultados; False si se canceló o falló."""
+        limite = 2 * (os.cpu_count() or 1) # Lotes en vuelo: todos los procesos ocupados sin acaparar memoria
+        for lote in self._lotes():
+            argumentos = (lote, self.patron, self.tamano_maximo, self.MAXIMO_POR_ARCHIVO)
+            self._en_vuelo.append((time.monotonic(), self.pool.apply_async(buscar_en_lote, argumentos)))
+            while len(self._en_vuelo) >= limite:
+                if not self._recoger():
+                    return False
+                if self._resultados >= self.MAXIMO_RESULTADOS:
+                    return True
+        while self._en_vuelo:
+            if not self._recoger():
+                return False
+            if self._resultados >= self.MAXIMO_RESULTADOS:
+                return True
+        return True
+
+class PanelBusquedaCarpeta(QWidget):
+    """Panel "Buscar": busca en todos los archivos de la carpeta abierta en el explorador.
+
+    Los resultados se agrupan por archivo, con la línea de cada coincidencia.
+    Escribir, cambiar una opción o pulsar Enter cancela la búsqueda anterior.
+    """
+    abrir_coincidencia = pyqtSignal(str, int, int, int) # Ruta, línea, columna, longitud
+
+    def __init__(self, obtener_raiz, obtener_tamano_maximo, obtener_indice, obtener_excluir=lambda: EXCLUIR_POR_DEFECTO,
+                 parent=None):
+        super().__init__(parent)
+        self.obtener_raiz = obtener_raiz
+        self.obtener_tamano_maximo = obtener_tamano_maximo
+        self.obtener_indice = obtener_indice
+        self.obtener_excluir = obtener_excluir
+        self.buscador = None
+        self.raiz = None
+        self._archivos = 0
+        self._coincidencias = 0
+
+        estilo_campo = "QLineEdit { background-color: #282A36; color: #F8F8F2; border: 1px solid #6272A4; padding: 3px; }"
+        estilo_boton = """
+            QPushButton { background-color: #44475A; color: #F8F8F2; border: 1px solid #6272A4; padding: 2px 6px; }
+            QPushButton:checked { background-color: #6272A4; }
+        """
+        self.campo = QLineEdit()
+        self.campo.setPlaceholderText("Buscar en la carpeta (Ctrl+Shift+F)")
+        self.campo.setStyleSheet(estilo_campo)
+        self.boton_match_case = QPushButton("Aa")
+        self.boton_match_case.setToolTip("Coincidir mayúsculas/minúsculas (Case Sensitive)")
+        self.boton_regex = QPushButton(".*")
+        self.boton_regex.setToolTip("Usar Expresiones Regulares (Regex)")
+        self.boton_palabra_completa = QPushButton("W")
+        self.boton_palabra_completa.setToolTip("Palabra completa")
+
+        self.label_estado = QLabel("")
+        self.label_estado.setStyleSheet("QLabel { color: #6272A4; }")
+        self.arbol = QTreeWidget()
+        self.arbol.setHeaderHidden(True)
+        self.arbol.setUniformRowHeights(True) # Miles de filas: evita medir cada una
+        self.arbol.setStyleSheet("QTreeWidget { background-color: #282A36; color: #F8F8F2; border: none; }")
+
+        fila = QHBoxLayout()
+        fila.setContentsMargins(0, 0, 0, 0)
+        fila.addWidget(self.campo)
+        for boton in (self.boton_match_case, self.boton_regex, self.boton_palabra_completa):
+            boton.setCheckable(True)
+            boton.setStyleSheet(estilo_boton)
+            boton.toggled.connect(lambda: self.buscar())
+            fila.addWidget(boton)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(5, 5, 5, 0)
+        layout.addLayout(fila)
+        layout.addWidget(self.label_estado)
+        layout.addWidget(self.arbol)
+
+        # Se busca al dejar de escribir, como en la barra de búsqueda del archivo
+        self.temporizador = QTimer(self)
+        self.temporizador.setSingleShot(True)
+        self.temporizador.setInterval(300)
+        self.temporizador.timeout.connect(self.buscar)
+        self.campo.textChanged.connect(lambda: self.temporizador.start())
+        self.campo.returnPressed.connect(self.buscar)
+        self.arbol.itemActivated.connect(self._elemento_activado)
+
+    def enfocar(self):
+        self.campo.setFocus()
+        self.campo.selectAll()
+
+    def cancelar(self):
+        """Detiene la búsqueda en curso (sus resultados pendientes se descartan)."""
+        self.temporizador.stop()
+        if self.buscador is not None:
+            self.buscador.encontrados.disconnect()
+            self.buscador.progreso.disconnect()
+            self.buscador.busqueda_terminada.disconnect()
+            self.buscador.error_busqueda.disconnect()
+            self.buscador.cancelar()
+            self.buscador = None
+
+    def buscar(self):
+        self.cancelar()
+        self.arbol.clear()
+        self._archivos = self._coincidencias = 0
+        texto = self.campo.text()
+        if not texto:
+            self.label_estado.setText("")
+            return
+        self.raiz = self.obtener_raiz()
+        if not self.raiz:
+            self.label_estado.setText("Abra una carpeta en el explorador para buscar en ella.")
+            return
+        try:
+            patron = compilar_busqueda(texto, self.boton_regex.isChecked(),
+                                       self.boton_match_case.isChecked(), self.boton_palabra_completa.isChecked())
+        except re.error as e:
+            self.label_estado.setText(f"Expresión regular no válida: {e.msg}")
+            return
+        self.label_estado.setText("Buscando...")
+        indice = self.obtener_indice()
+        if indice is not None and indice.raiz == os.path.abspath(self.raiz):
+            trigramas_patron = trigramas_consulta(texto, self.boton_regex.isChecked())
+        else:
+            indice, trigramas_patron = None, set()
+        self.buscador = BuscadorEnCarpeta(obtener_pool_busqueda(), self.raiz, patron, self.obtener_tamano_maximo(),
+                                          indice, trigramas_patron, self.obtener_excluir())
+        self.buscador.encontrados.connect(self._encontrados)
+        self.buscador.progreso.connect(self._progreso)
+        self.buscador.busqueda_terminada.connect(self._terminada)
+        self.buscador.error_busqueda.connect(self._fallida)
+        conservar_hasta_terminar(self.buscador)
+        self.buscador.start()
+
+    def _encontrados(self, lote):
+        elementos = []
+        for ruta, coincidencias in lote:
+            archivo = QTreeWidgetItem([f"{os.path.relpath(ruta, self.raiz)}  ({len(coincidencias)})"])
+            archivo.setToolTip(0, ruta)
+            for linea, columna, longitud, vista in coincidencias:
+                hijo = QTreeWidgetItem(archivo, [f"{linea + 1}: {vista}"])
+                hijo.setData(0, Qt.ItemDataRole.UserRole, (ruta, linea, columna, longitud))
+            elementos.append(archivo)
+            self._coincidencias += len(coincidencias)
+        self._archivos += len(elementos)
+        self.arbol.addTopLevelItems(elementos)
+        for archivo in elementos:
+            archivo.setExpanded(True)
+
+    def _resumen(self):
+        return f"{self._coincidencias} resultados en {self._archivos} archivos"
+
+    def _progreso(self, revisados):
+        self.label_estado.setText(f"Buscando... {self._resumen()} ({revisados} revisados)")
+
+    def _terminada(self, recortada):
+        self.buscador = None
+        if not self._coincidencias:
+            self.label_estado.setText("Sin resultados")
+        else:
+            self.label_estado.setText(self._resumen() + (" (límite alcanzado)" if recortada else ""))
+
+    def _fallida(self, mensaje):
+        self.buscador = None
+        self.label_estado.setText(mensaje)
+
+    def _elemento_activado(self, elemento):
+        datos = elemento.data(0, Qt.ItemDataRole.UserRole)
+        if datos is not None:
+            self.abrir_coincidencia.emit(*datos)
+
+# --- 12. Índice de trigramas de la carpeta ---
+
+# Caracteres no ASCII que una búsqueda sin distinguir mayúsculas iguala con letras ASCII
+_PLIEGUE_ASCII = str.maketrans({'İ': 'i', 'ı': 'i', 'ſ': 's', 'K': 'k'})
+
+def normalizar_trigramas(texto):
+    """Pasa ``texto`` a bytes ASCII en minúsculas; el resto de caracteres queda como ``?``.
+
+    Textos distintos pueden compartir trigramas (sólo sobran candidatos), pero un
+    archivo que coincide con el patrón, con o sin mayúsculas, contiene todos los suyos.
+    """
+    return texto.translate(_PLIEGUE_ASCII).encode('ascii', 'replace').lower()
+
+def trigramas(datos):
+    """Trigramas distintos de ``datos`` (bytes ya normalizados) como enteros de 24 bits."""
+    return {(a << 16) | (b << 8) | c for a, b, c in set(zip(datos, datos[1:], datos[2:]))}
+
+def _tramos_literales(nodos, tramos, actual):
+    """Añade a ``tramos`` el texto literal que aparece en toda coincidencia de ``nodos``."""
+    for op, av in nodos:
+        if op == sre_parse.LITERAL:
+            actual.append(chr(av))
+            continue
+        if op == sre_parse.SUBPATTERN:
+            _tramos_literales(av[-1], tramos, actual) # El grupo sigue el tramo de fuera
+            continue
+        tramos.append(''.join(actual))
+        actual.clear()
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, 'POSSESSIVE_REPEAT', None)) and av[0] >= 1:
+            interior = []
+            _tramos_literales(av[2], tramos, interior) # Aparece al menos una vez, pero suelto
+            tramos.append(''.join(interior))
+
+def trigramas_consulta(texto, usar_regex=False):
+    """Trigramas que contiene todo archivo con alguna coincidencia; vacío si no se puede acotar."""
+    if not usar_regex:
+        return trigramas(normalizar_trigramas(texto))
+    try:
+        nodos = sre_parse.parse(texto)
+    except (re.error, RecursionError):
+        return set()
+    tramos, actual = [], []
+    _tramos_literales(nodos, tramos, actual)
+    tramos.append(''.join(actual))
+    resultado = set()
+    for tramo in tramos:
+        resultado |= trigramas(normalizar_trigramas(tramo))
+    return resultado
+
+def indexar_lote(rutas, tamano_maximo):
+    """Calcula los trigramas de cada archivo de ``rutas`` (se ejecuta en el pool de procesos).
+
+    Devuelve ``[(ruta, mtime, tamano, estado, trigramas), ...]`` con ``trigramas``
+    como los bytes de un ``array('I')`` ordenado, o None si el archivo no se indexa.
+    La fecha se toma antes de leer: si el archivo cambia mientras tanto, la
+    siguiente sincronización lo vuelve a indexar.
+    """
+    resultado = []
+    for ruta in rutas:
+        try:
+            info = os.stat(ruta)
+        except OSError:
+            continue # Ya no existe: lo quitará la siguiente sincronización
+        if info.st_size > tamano_maximo:
+            resultado.append((ruta, info.st_mtime_ns, info.st_size, IndiceTrigramas.GRANDE, None))
+            continue
+        texto = leer_texto_buscable(ruta, tamano_maximo)
+        if texto is None:
+            resultado.append((ruta, info.st_mtime_ns, info.st_size, IndiceTrigramas.OMITIDO, None))
+            continue
+        lista = array.array('I', sorted(trigramas(normalizar_trigramas(texto))))
+        resultado.append((ruta, info.st_mtime_ns, info.st_size, IndiceTrigramas.INDEXADO, lista.tobytes()))
+    return resultado
+
+def _desempaquetar_trigramas(datos):
+    lista = array.array('I')
+    lista.frombytes(datos)
+    return lista
+
+class ObservadorCarpeta(QObject):
+    """Vigila las carpetas de la raíz abierta y avisa de lo que hay que resincronizar.
+
+    Lo comparten los índices de la carpeta: cada uno le pasa las carpetas que
+    recorre (``vigilar``) y atiende ``cambiado`` con la carpeta o el archivo que
+    hay que revisar. Al volver a la aplicación avisa de la raíz entera, por lo
+    que haya cambiado fuera mientras tanto. Si hay más carpetas de las que
+    caben en ``MAXIMO_VIGILADOS`` emite ``desbordado`` (una vez): desde entonces
+    los índices repasan la raíz entera de vez en cuando.
+    """
+    cambiado = pyqtSignal(str)
+    desbordado = pyqtSignal()
+
+    MAXIMO_VIGILADOS = 2048 # Carpetas con QFileSystemWatcher
+
+    def __init__(self, raiz, parent=None):
+        super().__init__(parent)
+        self.raiz = os.path.abspath(raiz)
+        self.desbordada = False
+        self._inactiva = False
+        self._vigilados = set()
+        self.observador = QFileSystemWatcher(self)
+        self.observador.directoryChanged.connect(self.cambiado)
+        QApplication.instance().applicationStateChanged.connect(self._estado_aplicacion)
+
+    def vigilar(self, directorios):
+        hueco = max(0, self.MAXIMO_VIGILADOS - len(self._vigilados))
+        nuevos = list(dict.fromkeys(d for d in directorios if d not in self._vigilados))
+        if nuevos[:hueco]:
+            self._vigilados.update(nuevos[:hueco])
+            self.observador.addPaths(nuevos[:hueco])
+        if len(nuevos) > hueco and not self.desbordada:
+            self.desbordada = True
+            self.desbordado.emit()
+
+    def avisar(self, ruta):
+        """Avisa de un cambio hecho desde el editor (p. ej. un guardado)."""
+        self.cambiado.emit(ruta)
+
+    def detener(self):
+        QApplication.instance().applicationStateChanged.disconnect(self._estado_aplicacion)
+        if self._vigilados:
+            self.observador.removePaths(list(self._vigilados))
+            self._vigilados.clear()
+
+    def _estado_aplicacion(self, estado):
+        if estado != Qt.ApplicationState.ApplicationActive:
+            self._inactiva = True
+        elif self._inactiva:
+            self._inactiva = False
+            self.cambiado.emit(self.raiz)
+
+class IndiceTrigramas(QThread):
+    """Índice de trigramas de una carpeta, guardado en SQLite en la caché del usuario.
+
+    Al arrancar compara la fecha y el tamaño de cada archivo con lo guardado y
+    reindexa en el pool de procesos sólo lo que ha cambiado; después resincroniza
+    lo que se le indique con ``marcar`` (los avisos del ObservadorCarpeta).
+    Mientras quede una carpeta por sincronizar ``candidatos`` devuelve None y la
+    búsqueda recorre la carpeta entera; los archivos sucios (marcados o a medio
+    reindexar) son siempre candidatos.
+
+    Las carpetas vigiladas no avisan cuando se reescribe un archivo en su sitio,
+    así que cada ``REPASO`` segundos (o más, si el repaso tarda) se compara la
+    fecha y el tamaño de lo indexado con el disco desde el hilo del índice. Si
+    el ObservadorCarpeta no llega a todas las carpetas (``sin_vigilancia``), el
+    repaso recorre la raíz entera.
+    """
+    directorios_encontrados = pyqtSignal(list) # Carpetas recorridas, para vigilarlas
+    sincronizado = pyqtSignal(int) # Archivos indexados tras la primera sincronización
+
+    VERSION = 1
+    TAMANO_LOTE = 64
+    MAXIMO_TRIGRAMAS = 32 # Por consulta: con unos pocos ya quedan muy pocos candidatos
+    REPASO = 10.0 # Segundos mínimos entre repasos
+
+    # Estados de un archivo en el índice
+    INDEXADO = 0
+    OMITIDO = 1 # Binario o ilegible
+    GRANDE = 2 # Mayor que el límite: se indexa si el límite crece
+
+    def __init__(self, raiz, tamano_maximo, excluir=EXCLUIR_POR_DEFECTO, parent=None):
+        super().__init__(parent)
+        self.raiz = os.path.abspath(raiz)
+        self._prefijo = os.path.join(self.raiz, '') # Para pasar a ruta relativa sin os.path.relpath
+        self.tamano_maximo = tamano_maximo
+        self._filtro = FiltroCarpeta(self.raiz, excluir) # Sólo desde el hilo del índice
+        self.ruta_base = ruta_cache_carpeta(self.raiz, '.sqlite3')
+        self._cola = queue.Queue()
+        self._cerrojo = threading.Lock()
+        self._pendientes = 1 # Carpetas por sincronizar (la raíz, al empezar)
+        self._sucios = {} # Ruta absoluta -> veces que falta atenderla
+        self._repasar_todo = False
+        self._listo = False
+        self._cancelado = False
+
+    def marcar(self, ruta):
+        """Pide resincronizar ``ruta`` (archivo o carpeta, con todo lo que contenga)."""
+        ruta = os.path.abspath(ruta)
+        if os.path.isfile(ruta):
+            self._ensuciar([ruta])
+        else:
+            with self._cerrojo:
+                self._pendientes += 1
+        self._cola.put(ruta)
+
+    def sin_vigilancia(self):
+        """El ObservadorCarpeta no vigila todas las carpetas: los repasos recorren la raíz entera."""
+        self._repasar_todo = True
+
+    def _ensuciar(self, rutas):
+        with self._cerrojo:
+            for ruta in rutas:
+                self._sucios[ruta] = self._sucios.get(ruta, 0) + 1
+
+    def _atendidas(self, rutas):
+        """Descuenta ``rutas`` (ya sincronizadas) de los archivos sucios o de las carpetas pendientes."""
+        with self._cerrojo:
+            for ruta in rutas:
+                veces = self._sucios.get(ruta)
+                if veces is None:
+                    self._pendientes -= 1
+                elif veces == 1:
+                    del self._sucios[ruta]
+                else:
+                    self._sucios[ruta] = veces - 1
+
+    def cancelar(self):
+        """Detiene el índice (lo ya guardado sirve para la próxima vez)."""
+        self._cancelado = True
+        self._cola.put(None)
+
+    def candidatos(self, trigramas_buscados):
+        """Rutas de los archivos que contienen todos los trigramas, o None si el índice no está al día.
+
+        Además de lo que dice el índice van los archivos sucios, que aún no se
+        han reindexado. Se puede llamar desde cualquier hilo: cada consulta abre
+        su propia conexión.
+        """
+        with self._cerrojo:
+            if not self._listo or self._pendientes or self._cancelado or not trigramas_buscados:
+                return None
+            sucios = list(self._sucios)
+        parametros = sorted(trigramas_buscados)[:self.MAXIMO_TRIGRAMAS]
+        interseccion = " INTERSECT ".join(["SELECT archivo FROM pares WHERE trigrama = ?"] * len(parametros))
+        try:
+            conexion = sqlite3.connect(self.ruta_base, timeout=1)
+            try:
+                filas = conexion.execute(f"SELECT ruta FROM archivos WHERE id IN ({interseccion})", parametros).fetchall()
+            finally:
+                conexion.close()
+        except sqlite3.Error as e:
+            print(f"No se pudo consultar el índice de búsqueda: {e}")
+            return None
+        return sorted({os.path.join(self.raiz, ruta) for (ruta,) in filas}.union(sucios))
+
+    # --- BASE DE DATOS ---
+    def _abrir_base(self):
+        os.makedirs(os.path.dirname(self.ruta_base), exist_ok=True)
+        try:
+            return self._preparar_base(sqlite3.connect(self.ruta_base, timeout=5))
+        except sqlite3.DatabaseError as e:
+            print(f"Índice de búsqueda dañado, se vuelve a crear: {e}")
+        for sufijo in ('', '-wal', '-shm'):
+            try:
+                os.remove(self.ruta_base + sufijo)
+            except FileNotFoundError:
+                pass
+        return self._preparar_base(sqlite3.connect(self.ruta_base, timeout=5))
+
+    def _preparar_base(self, conexion):
+        conexion.execute("PRAGMA journal_mode=WAL") # Las consultas no esperan a las escrituras
+        conexion.execute("PRAGMA synchronous=NORMAL") # Es una caché: perder lo último sólo obliga a reindexarlo
+        if conexion.execute("PRAGMA user_version").fetchone()[0] != self.VERSION:
+            conexion.executescript(f"""
+                DROP TABLE IF EXISTS archivos;
+                DROP TABLE IF EXISTS pares;
+                CREATE TABLE archivos (
+                    id INTEGER PRIMARY KEY, ruta TEXT UNIQUE NOT NULL,
+                    mtime INTEGER NOT NULL, tamano INTEGER NOT NULL, estado INTEGER NOT NULL, trigramas BLOB
+                );
+                CREATE TABLE pares (
+                    trigrama INTEGER NOT NULL, archivo INTEGER NOT NULL, PRIMARY KEY (trigrama, archivo)
+                ) WITHOUT ROWID;
+                PRAGMA user_version = {self.VERSION};
+            """)
+        return conexion
+
+    def _filas(self, conexion, relativa):
+        """Filas guardadas de ``relativa`` y todo lo que cuelga de ella: {ruta: (id, mtime, tamano, estado)}."""
+        if relativa == '.':
+            cursor = conexion.execute("SELECT ruta, id, mtime, tamano, estado FROM archivos")
+        else:
+            # Rango de las rutas que empiezan por "relativa/" ('0' es el carácter siguiente a '/')
+            cursor = conexion.execute(
+                "SELECT ruta, id, mtime, tamano, estado FROM archivos WHERE ruta = ? OR (ruta > ? AND ruta < ?)",
+                (relativa, relativa + os.sep, relativa + chr(ord(os.sep) + 1)))
+        return {ruta: fila for ruta, *fila in cursor}
+
+    def _quitar_pares(self, conexion, ident, datos):
+        if datos is not None:
+            conexion.executemany("DELETE FROM pares WHERE trigrama = ? AND archivo = ?",
+                                 ((t, ident) for t in _desempaquetar_trigramas(datos)))
+
+    def _guardar(self, conexion, resultados):
+        with conexion:
+            for ruta, mtime, tamano, estado, datos in resultados:
+                relativa = ruta[len(self._prefijo):]
+                fila = conexion.execute("SELECT id, trigramas FROM archivos WHERE ruta = ?", (relativa,)).fetchone()
+                if fila is None:
+                    ident = conexion.execute(
+                        "INSERT INTO archivos (ruta, mtime, tamano, estado, trigramas) VALUES (?, ?, ?, ?, ?)",
+                        (relativa, mtime, tamano, estado, datos)).lastrowid
+                else:
+                    ident = fila[0]
+                    self._quitar_pares(conexion, ident, fila[1])
+                    conexion.execute("UPDATE archivos SET mtime = ?, tamano = ?, estado = ?, trigramas = ? WHERE id = ?",
+                                     (mtime, tamano, estado, datos, ident))
+                if datos is not None:
+                    conexion.executemany("INSERT INTO pares (trigrama, archivo) VALUES (?, ?)",
+                                         ((t, ident) for t in _desempaquetar_trigramas(datos)))
+
+    # --- SINCRONIZACIÓN ---
+    def _recorrer(self, ruta):
+        """Archivos bajo ``ruta`` con su fecha y tamaño ({relativa: (mtime, tamano)}) y carpetas recorridas."""
+        archivos, directorios = {}, []
+        if os.path.isfile(ruta):
+            candidatos = [] if self._filtro.oculta(ruta, False) else [ruta]
+        elif self._filtro.oculta(ruta, True):
+            candidatos = [] # Lo que ya hubiera en el índice se borra
+        else:
+            candidatos = []
+            for directorio, _, nombres in self._filtro.recorrer(ruta):
+                directorios.append(directorio)
+                candidatos.extend(os.path.join(directorio, nombre) for nombre in nombres)
+        for candidato in candidatos:
+            try:
+                info = os.stat(candidato)
+            except OSError:
+                continue
+            archivos[candidato[len(self._prefijo):]] = (info.st_mtime_ns, info.st_size)
+        return archivos, directorios
+
+    def _sincronizar(self, conexion, ruta):
+        """Pone al día el índice de ``ruta``; False si se canceló o se perdió el pool a medias."""
+        relativa = os.path.relpath(ruta, self.raiz)
+        if relativa == os.pardir or relativa.startswith(os.pardir + os.sep):
+            return True
+        filas = self._filas(conexion, relativa)
+        archivos, directorios = self._recorrer(ruta)
+        if directorios:
+            self.directorios_encontrados.emit(directorios)
+        borrados = [(ruta_fila, fila) for ruta_fila, fila in filas.items() if ruta_fila not in archivos]
+        if borrados:
+            with conexion:
+                for ruta_fila, (ident, *_) in borrados:
+                    datos = conexion.execute("SELECT trigramas FROM archivos WHERE id = ?", (ident,)).fetchone()[0]
+                    self._quitar_pares(conexion, ident, datos)
+                    conexion.execute("DELETE FROM archivos WHERE id = ?", (ident,))
+        cambiados = []
+        for ruta_archivo, (mtime, tamano) in archivos.items():
+            fila = filas.get(ruta_archivo)
+            if (fila is None or (fila[1], fila[2]) != (mtime, tamano)
+                    or (fila[3] == self.GRANDE and tamano <= self.tamano_maximo)):
+                cambiados.append(os.path.join(self.raiz, ruta_archivo))
+        return self._reindexar(conexion, cambiados)
+
+    def _repasar(self, conexion):
+        """Busca lo que ha cambiado sin aviso y lo reindexa; False si se canceló o se perdió el pool a medias."""
+        if self._repasar_todo:
+            return self._sincronizar(conexion, self.raiz)
+        cambiados = []
+        for relativa, mtime, tamano in conexion.execute("SELECT ruta, mtime, tamano FROM archivos").fetchall():
+            if self._cancelado:
+                return False
+            ruta = os.path.join(self.raiz, relativa)
+            try:
+                info = os.stat(ruta)
+            except OSError:
+                continue # Borrado: avisa su carpeta
+            if (info.st_mtime_ns, info.st_size) != (mtime, tamano):
+                cambiados.append(ruta)
+        return self._reindexar(conexion, cambiados)
+
+    def _reindexar(self, conexion, rutas):
+        """Como ``_indexar``, pero ``rutas`` quedan sucias (candidatas en toda búsqueda) mientras tanto."""
+        self._ensuciar(rutas)
+        try:
+            return self._indexar(conexion, rutas)
+        finally:
+            self._atendidas(rutas)
+
+    def _indexar(self, conexion, rutas):
+        """Reparte ``rutas`` en lotes entre el pool de procesos y guarda lo que devuelven."""
+        if not rutas:
+            return True
+        pool = obtener_pool_busqueda()
+        limite = 2 * (os.cpu_count() or 1)
+        en_vuelo = []
+        siguiente = 0
+        while siguiente < len(rutas) or en_vuelo:
+            while siguiente < len(rutas) and len(en_vuelo) < limite:
+                lote = rutas[siguiente:siguiente + self.TAMANO_LOTE]
+                siguiente += len(lote)
+                try:
+                    en_vuelo.append(pool.apply_async(indexar_lote, (lote, self.tamano_maximo)))
+                except ValueError:
+                    return False # Una búsqueda terminó el pool entre medias
+            en_vuelo[0].wait(0.1)
+            if self._cancelado or _pool_busqueda is not pool:
+                return False # Cancelado, o una búsqueda terminó el pool
+            if en_vuelo[0].ready():
+                self._guardar(conexion, en_vuelo.pop(0).get())
+        return True
+
+    def run(self):
+        try:
+            conexion = self._abrir_base()
+        except (sqlite3.Error, OSError) as e:
+            print(f"No se pudo abrir el índice de búsqueda: {e}")
+            return
+        try:
+            rutas = [self.raiz]
+            espera = self.REPASO
+            while not self._cancelado:
+                if self.raiz in rutas:
+                    objetivos = [self.raiz]
+                else:
+                    objetivos = sorted(set(rutas))
+                completo = all(self._sincronizar(conexion, ruta) for ruta in objetivos)
+                if self._cancelado:
+                    break
+                if not completo:
+                    self.marcar(self.raiz) # El pool se perdió: se repasa todo con el nuevo
+                elif not self._listo:
+                    self._listo = True
+                    self.sincronizado.emit(conexion.execute(
+                        "SELECT COUNT(*) FROM archivos WHERE estado = ?", (self.INDEXADO,)).fetchone()[0])
+                self._atendidas(rutas)
+                while True:
+                    try:
+                        rutas = [self._cola.get(timeout=espera)]
+                        break
+                    except queue.Empty:
+                        inicio = time.monotonic()
+                        if not self._repasar(conexion) and not self._cancelado:
+                            self.marcar(self.raiz)
+                        # Un repaso largo (carpetas enormes) se espacia: no más de un 5% del tiempo
+                        espera = max(self.REPASO, 20 * (time.monotonic() - inicio))
+                while True: # Los avisos llegan en ráfagas: se atienden juntos
+                    try:
+                        rutas.append(self._cola.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in rutas:
+                    break
+        except Exception as e:
+            print(f"Error al actualizar el índice de búsqueda: {e}")
+            self._listo = False
+        finally:
+            conexion.close()
+
+def ruta_cache_carpeta(raiz, extension):
+    """Archivo de la caché del usuario para ``raiz`` (uno por carpeta y tipo de dato)."""
+    cache = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.GenericCacheLocation)
+    nombre = hashlib.sha1(os.path.normcase(raiz).encode('utf-8', 'surrogatepass')).hexdigest()
+    return os.path.join(cache or tempfile.gettempdir(), 'VisualCode', 'indices', nombre + extension)
+
+# --- 13. Índice de archivos y apertura rápida ---
+
+class CacheListados:
+    """Listados de las carpetas de una raíz guardados en disco, con la fecha de cada carpeta.
+
+    Un listado vale mientras la carpeta conserve la fecha de modificación con la
+    que se guardó: crear, borrar o renombrar algo dentro la cambia. Así, al
+    volver a abrir la carpeta sólo se leen de nuevo las que han cambiado. Cada
+    entrada es ``(tipo, nombre)``: ``'d'`` carpeta, ``'l'`` enlace a carpeta,
+    ``'f'`` archivo y ``'o'`` cualquier otra cosa. Las carpetas se nombran por
+    su ruta relativa con ``/`` (la raíz es ``''``).
+
+    Lo usan el IndiceArchivos y el ListadorCarpetas, cada uno con su conexión y
+    desde su propio hilo. Si la base no se puede abrir, todo se lee del disco.
+    Los listados nuevos se acumulan en memoria y se escriben de golpe cada
+    ``ESCRITURAS_POR_TRANSACCION`` carpetas o ``SEGUNDOS_POR_TRANSACCION``: la
+    transacción, que bloquea a la otra conexión, sólo dura lo que la
+    escritura, no lo que tarda en leerse el disco.
+    """
+    VERSION = 1
+    MARGEN_NS = 2 * 10**9 # Una carpeta con fecha más reciente aún puede cambiar sin que la fecha se mueva
+    ESCRITURAS_POR_TRANSACCION = 64
+    SEGUNDOS_POR_TRANSACCION = 0.1
+
+    def __init__(self, raiz):
+        self.raiz = raiz
+        self.ruta_base = ruta_cache_carpeta(raiz, '.listados.sqlite3')
+        self._conexion = None
+        self._por_guardar = [] # (ruta, mtime, entradas) aún no escritos
+        self._primera_escritura = 0.0
+
+    def abrir(self):
+        try:
+            os.makedirs(os.path.dirname(self.ruta_base), exist_ok=True)
+            conexion = sqlite3.connect(self.ruta_base, timeout=5)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL") # Es una caché: lo perdido se vuelve a listar
+            if conexion.execute("PRAGMA user_version").fetchone()[0] != self.VERSION:
+                conexion.executescript(f"""
+                    DROP TABLE IF EXISTS carpetas;
+                    CREATE TABLE carpetas (ruta TEXT PRIMARY KEY, mtime INTEGER NOT NULL, entradas TEXT NOT NULL);
+                    PRAGMA user_version = {self.VERSION};
+                """)
+            self._conexion = conexion
+        except (sqlite3.Error, OSError) as e:
+            print(f"No se pudo abrir la caché de la carpeta: {e}")
+
+    def cerrar(self):
+        if self._conexion is not None:
+            self._conexion.close()
+            self._conexion = None
+
+    @staticmethod
+    def _desempaquetar(texto):
+        return [(entrada[0], entrada[1:]) for entrada in texto.split('\0')] if texto else []
+
+    def listar(self, relativa):
+        """Entradas de la carpeta ``relativa``, de la caché si sigue valiendo y si no del disco.
+
+        Devuelve ``(entradas, leida)``; ``leida`` es True si hubo que leerla
+        (y se guardó). Si la carpeta ya no existe lanza OSError.
+        """
+        carpeta = os.path.join(self.raiz, *relativa.split('/')) if relativa else self.raiz
+        mtime = os.stat(carpeta).st_mtime_ns
+        if self._conexion is not None:
+            try:
+                fila = self._conexion.execute(
+                    "SELECT entradas FROM carpetas WHERE ruta = ? AND mtime = ?", (relativa, mtime)).fetchone()
+            except sqlite3.Error:
+                fila = None
+            if fila is not None:
+                return self._desempaquetar(fila[0]), False
+        entradas = []
+        with os.scandir(carpeta) as iterador:
+            for entrada in iterador:
+                try:
+                    if entrada.is_dir():
+                        tipo = 'l' if entrada.is_symlink() else 'd'
+                    else:
+                        tipo = 'f' if entrada.is_file() else 'o'
+                except OSError:
+                    tipo = 'o'
+                entradas.append((tipo, entrada.name))
+        # La fecha tiene la resolución del reloj del núcleo: lo que cambie en el
+        # mismo tic no la mueve, así que las carpetas recién tocadas no se guardan
+        if self._conexion is not None and time.time_ns() - mtime > self.MARGEN_NS:
+            ahora = time.perf_counter()
+            if not self._por_guardar:
+                self._primera_escritura = ahora
+            self._por_guardar.append((relativa, mtime, '\0'.join(tipo + nombre for tipo, nombre in entradas)))
+            if (len(self._por_guardar) >= self.ESCRITURAS_POR_TRANSACCION
+                    or ahora - self._primera_escritura >= self.SEGUNDOS_POR_TRANSACCION):
+                self.confirmar()
+        return entradas, True
+
+    def guardadas(self):
+        """Todas las carpetas guardadas, sin comprobar nada: ``{relativa: entradas}``."""
+        if self._conexion is None:
+            return {}
+        try:
+            return {ruta: self._desempaquetar(texto)
+                    for ruta, texto in self._conexion.execute("SELECT ruta, entradas FROM carpetas")}
+        except sqlite3.Error:
+            return {}
+
+    def carpetas(self):
+        """Rutas relativas de las carpetas guardadas."""
+        if self._conexion is None:
+            return []
+        try:
+            return [ruta for (ruta,) in self._conexion.execute("SELECT ruta FROM carpetas")]
+        except sqlite3.Error:
+            return []
+
+    def olvidar(self, relativas):
+        """Quita de la caché carpetas que ya no existen."""
+        if self._conexion is not None and relativas:
+            try:
+                self._conexion.executemany("DELETE FROM carpetas WHERE ruta = ?", ((r,) for r in relativas))
+            except sqlite3.Error:
+                pass
+
+    def confirmar(self):
+        """Escribe los listados acumulados y cierra la transacción."""
+        if self._conexion is not None:
+            por_guardar, self._por_guardar = self._por_guardar, []
+            try:
+                self._conexion.executemany(
+                    "INSERT OR REPLACE INTO carpetas (ruta, mtime, entradas) VALUES (?, ?, ?)", por_guardar)
+                self._conexion.commit()
+            except sqlite3.Error as e:
+                print(f"No se pudo guardar la caché de la carpeta: {e}")
+
+class TablaRutas:
+    """Instantánea de los archivos de una carpeta preparada para el filtro de la apertura rápida.
+
+    Las rutas son relativas, con ``/`` y ordenadas; las demás listas van en paralelo.
+    ``nombres_unidos`` junta los nombres en minúsculas, uno por línea, para buscar
+    en todos de una pasada; ``inicios_unidos`` dice dónde empieza cada uno.
+    No se modifica nunca: el índice crea otra y la sustituye.
+    """
+    __slots__ = ('rutas', 'minusculas', 'nombres', 'inicios_nombre', 'nombres_unidos', 'inicios_unidos')
+
+    def __init__(self, rutas):
+        self.rutas = rutas
+        self.minusculas = [ruta.lower() for ruta in rutas]
+        self.inicios_nombre = [ruta.rfind('/') + 1 for ruta in rutas]
+        self.nombres = [ruta[inicio:] for ruta, inicio in zip(self.minusculas, self.inicios_nombre)]
+        self.nombres_unidos = '\n' + '\n'.join(self.nombres) + '\n'
+        self.inicios_unidos = list(itertools.accumulate((len(nombre) + 1 for nombre in self.nombres), initial=1))
+
+class IndiceArchivos(QThread):
+    """Lista de los archivos de una carpeta, recorrida con ``os.scandir`` en segundo plano.
+
+    ``tabla`` (una TablaRutas) se sustituye entera en cada cambio, así que se
+    puede leer desde cualquier hilo sin cerrojos. ``marcar`` vuelve a recorrer una
+    carpeta o un archivo (los avisos del ObservadorCarpeta). Se omite lo que
+    oculta el explorador (un FiltroCarpeta con los globs de ``excluir``).
+
+    Al arrancar publica enseguida lo que había en la CacheListados y después la
+    pone al día: sólo se vuelven a leer las carpetas cuya fecha ha cambiado. Si
+    el ObservadorCarpeta no llega a todas las carpetas (``sin_vigilancia``), la
+    raíz se repasa así cada ``REPASO`` segundos (o más, si el repaso tarda).
+    """
+    actualizado = pyqtSignal()
+    directorios_encontrados = pyqtSignal(list) # Carpetas recorridas, para vigilarlas
+
+    REPASO = 10.0 # Segundos mínimos entre repasos
+
+    def __init__(self, raiz, excluir=EXCLUIR_POR_DEFECTO, parent=None):
+        super().__init__(parent)
+        self.raiz = os.path.abspath(raiz)
+        self._filtro = FiltroCarpeta(self.raiz, excluir) # Sólo desde el hilo del índice
+        self.tabla = TablaRutas([])
+        self.listo = False
+        self._cola = queue.Queue()
+        self._repasar_todo = False
+        self._cancelado = False
+
+    def marcar(self, ruta):
+        self._cola.put(os.path.abspath(ruta))
+
+    def sin_vigilancia(self):
+        """El ObservadorCarpeta no vigila todas las carpetas: se repasa la raíz ya y de vez en cuando."""
+        self._repasar_todo = True
+        self.marcar(self.raiz)
+
+    def cancelar(self):
+        self._cancelado = True
+        self._cola.put(None)
+
+    def _recorrer(self, directorio, relativa, listar=None):
+        """Archivos bajo ``directorio`` (rutas que empiezan por ``relativa``) y carpetas recorridas.
+
+        ``listar(relativa)`` da las entradas de cada carpeta (por defecto, la
+        caché comprobada contra el disco). El .gitignore de una carpeta sólo se
+        lee si aparece entre sus entradas.
+        """
+        listar = listar or (lambda carpeta: self._cache.listar(carpeta)[0])
+        archivos, directorios = [], []
+        pila = [(directorio, relativa)]
+        while pila and not self._cancelado:
+            actual, prefijo = pila.pop()
+            try:
+                entradas = listar(prefijo[:-1])
+            except OSError:
+                continue
+            directorios.append(actual)
+            self._filtro.leer_reglas(actual, ('f', '.gitignore') in entradas)
+            cadena = self._filtro.cadena(actual)
+            for tipo, nombre in entradas:
+                # Como os.walk: no se entra en enlaces a carpetas (evita ciclos)
+                if tipo == 'd':
+                    if not self._filtro.excluida(nombre, prefijo + nombre, True, cadena):
+                        pila.append((os.path.join(actual, nombre), prefijo + nombre + '/'))
+                elif tipo == 'f' and not self._filtro.excluida(nombre, prefijo + nombre, False, cadena):
+                    archivos.append(prefijo + nombre)
+        return archivos, directorios
+
+    def _desde_cache(self):
+        """Publica la tabla que dice la caché, sin tocar el disco (se corrige al recorrer)."""
+        guardadas = self._cache.guardadas()
+        if '' not in guardadas:
+            return
+        archivos, _ = self._recorrer(self.raiz, '', lambda carpeta: guardadas.get(carpeta, ()))
+        if archivos and not self._cancelado:
+            archivos.sort()
+            self.tabla = TablaRutas(archivos)
+            self.listo = True
+            self.actualizado.emit()
+
+    def _actualizar(self, ruta):
+        """Vuelve a recorrer ``ruta`` y sustituye sus entradas en la tabla."""
+        relativa = os.path.relpath(ruta, self.raiz)
+        if relativa == '.':
+            archivos, directorios = self._recorrer(self.raiz, '')
+            archivos.sort()
+            self._olvidar_desaparecidas(directorios)
+        else:
+            partes = relativa.split(os.sep)
+            if partes[0] == os.pardir:
+                return
+            relativa = '/'.join(partes)
+            archivos, directorios = [], []
+            if os.path.isdir(ruta):
+                if not self._filtro.oculta(ruta, True):
+                    archivos, directorios = self._recorrer(ruta, relativa + '/')
+                    archivos.sort()
+            elif os.path.isfile(ruta) and not self._filtro.oculta(ruta, False):
+                archivos = [relativa]
+            rutas = list(self.tabla.rutas)
+            # Lo que cuelga de la carpeta está seguido ('0' es el carácter siguiente a '/')
+            inicio = bisect.bisect_left(rutas, relativa + '/')
+            del rutas[inicio:bisect.bisect_left(rutas, relativa + '0')]
+            i = bisect.bisect_left(rutas, relativa)
+            if i < len(rutas) and rutas[i] == relativa:
+                del rutas[i]
+            if archivos == [relativa]:
+                bisect.insort(rutas, relativa)
+            else:
+                rutas[inicio:inicio] = archivos
+            archivos = rutas
+        self._cache.confirmar()
+        if self._cancelado:
+            return
+        cambiada = archivos != self.tabla.rutas
+        if cambiada:
+            self.tabla = TablaRutas(archivos)
+        if cambiada or not self.listo:
+            self.listo = True
+            self.actualizado.emit()
+        if directorios:
+            self.directorios_encontrados.emit(directorios)
+
+    def _olvidar_desaparecidas(self, recorridas):
+        """Tras recorrer la raíz, quita de la caché las carpetas que ya no existen."""
+        recorridas = {os.path.relpath(d, self.raiz).replace(os.sep, '/') for d in recorridas}
+        recorridas.add('')
+        self._cache.olvidar([carpeta for carpeta in self._cache.carpetas()
+                             if carpeta not in recorridas and not os.path.isdir(os.path.join(self.raiz, carpeta))])
+
+    def run(self):
+        self._cache = CacheListados(self.raiz)
+        self._cache.abrir()
+        try:
+            self._desde_cache()
+            rutas = [self.raiz]
+            espera = self.REPASO
+            while not self._cancelado:
+                objetivos = [self.raiz] if self.raiz in rutas else sorted(set(rutas))
+                inicio = time.monotonic()
+                for ruta in objetivos:
+                    self._actualizar(ruta)
+                if objetivos == [self.raiz]:
+                    # Un repaso largo (carpetas enormes) se espacia: no más de un 5% del tiempo
+                    espera = max(self.REPASO, 20 * (time.monotonic() - inicio))
+                try:
+                    rutas = [self._cola.get(timeout=espera if self._repasar_todo else None)]
+                except queue.Empty:
+                    rutas = [self.raiz]
+                    continue
+                while True: # Los avisos llegan en ráfagas: se atienden juntos
+                    try:
+                        rutas.append(self._cola.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in rutas:
+                    break
+        except Exception as e:
+            print(f"Error al recorrer la carpeta: {e}")
+        finally:
+            self._cache.cerrar()
+
+def es_subsecuencia(corta, larga):
+    """True si los caracteres de ``corta`` aparecen en ``larga`` en el mismo orden."""
+    restantes = iter(larga)
+    return all(caracter in restantes for caracter in corta)
+
+def patron_subsecuencia(consulta):
+    """Regex que encuentra ``consulta`` como subsecuencia sin retroceder (cada hueco excluye el carácter siguiente)."""
+    partes = []
+    for i, caracter in enumerate(consulta):
+        if i:
+            partes.append(f"[^{re.escape(caracter)}]*")
+        partes.append(re.escape(caracter))
+    return re.compile(''.join(partes))
+
+# Caracteres tras los que empieza una palabra en una ruta
+_SEPARADORES_RUTA = frozenset('/\\_-. ')
+
+def puntuar_ruta(consulta, ruta, minusculas, inicio_nombre):
+    """Puntuación de ``ruta`` para ``consulta`` (en minúsculas); None si no la contiene en orden.
+
+    Cada carácter se busca lo más a la derecha posible, para que caiga en el
+    nombre del archivo. Suman los caracteres seguidos, los que empiezan una
+    palabra (tras un separador o en un cambio a mayúscula) y los del nombre;
+    a igualdad gana la ruta más corta.
+    """
+    posicion = len(minusculas)
+    posiciones = []
+    for caracter in reversed(consulta):
+        posicion = minusculas.rfind(caracter, 0, posicion)
+        if posicion == -1:
+            return None
+        posiciones.append(posicion)
+    puntos = 0
+    anterior = -2
+    for posicion in reversed(posiciones):
+        if posicion == anterior + 1:
+            puntos += 5
+        if (posicion == 0 or ruta[posicion - 1] in _SEPARADORES_RUTA
+                or (ruta[posicion].isupper() and ruta[posicion - 1].islower())):
+            puntos += 8
+        if posicion >= inicio_nombre:
+            puntos += 3
+        anterior = posicion
+    return puntos * 1000 - len(ruta)
+
+class TrabajoApertura:
+    """Una consulta de la apertura rápida contra una TablaRutas.
+
+    Preselecciona por niveles, de mejor a peor: el nombre empieza por la
+    consulta, la contiene seguida, la contiene en orden y, por último, la ruta
+    entera la contiene en orden. Los dos primeros se buscan de una pasada en
+    ``nombres_unidos``; si no bastan, se filtran las rutas archivo a archivo en
+    tramos (para poder cancelar y soltar el GIL) y de ellas salen los otros
+    dos. En cuanto hay
+    ``MAXIMO_PUNTUADOS`` (los más cortos de cada nivel) se puntúan en Python.
+    Si ``anterior`` era una subsecuencia de esta consulta sobre la misma tabla,
+    los dos últimos niveles sólo miran lo que él dejó.
+    """
+    TRAMO = 2048
+    MAXIMO_PUNTUADOS = 500
+
+    def __init__(self, solicitante, consulta, tabla, maximo, anterior=None):
+        self.solicitante = solicitante
+        self.consulta = consulta
+        self.tabla = tabla
+        self.maximo = maximo
+        self.anterior = anterior
+        self.cancelado = False
+        self.candidatos = None # Índices que pueden contener la consulta en orden (None: todos)
+        self.resultados = [] # Rutas relativas, de mejor a peor
+
+    def _filtrar(self, patron, textos, indices):
+        quedan = []
+        for i in range(0, len(indices), self.TRAMO):
+            if self.cancelado:
+                return None
+            tramo = indices[i:i + self.TRAMO]
+            quedan.extend(itertools.compress(tramo, map(patron, map(textos.__getitem__, tramo))))
+        return quedan
+
+    def _nombres_con(self, patron):
+        """Índices de los nombres donde ``patron`` encuentra algo (una pasada sobre ``nombres_unidos``)."""
+        inicios = self.tabla.inicios_unidos
+        indices = []
+        for n, m in enumerate(patron.finditer(self.tabla.nombres_unidos)):
+            if n % self.TRAMO == 0 and self.cancelado:
+                return None
+            indice = bisect.bisect_right(inicios, m.start()) - 1
+            if not indices or indices[-1] != indice:
+                indices.append(indice)
+        return indices
+
+    def ejecutar(self):
+        tabla, consulta = self.tabla, self.consulta
+        if not consulta:
+            self.resultados = tabla.rutas[:self.maximo]
+            return
+        anterior = self.anterior
+        if anterior is not None and anterior.tabla is tabla and es_subsecuencia(anterior.consulta, consulta):
+            self.candidatos = anterior.candidatos
+        todos = range(len(tabla.rutas)) if self.candidatos is None else self.candidatos
+        literal = re.escape(consulta)
+        subsecuencia = patron_subsecuencia(consulta).search
+
+        def en_orden():
+            self.candidatos = self._filtrar(subsecuencia, tabla.minusculas, todos) # Refina la siguiente
+            return self.candidatos
+
+        niveles = (
+            lambda: self._nombres_con(re.compile('(?<=\n)' + literal)), # Empieza por la consulta
+            lambda: self._nombres_con(re.compile(literal + '[^\n]*')), # La contiene (una vez por nombre)
+            lambda: None if en_orden() is None else self._filtrar(subsecuencia, tabla.nombres, self.candidatos),
+            lambda: self.candidatos,
+        )
+        elegidos = set()
+        for nivel in niveles:
+            indices = nivel()
+            if indices is None:
+                return
+            nuevos = [i for i in indices if i not in elegidos]
+            hueco = self.MAXIMO_PUNTUADOS - len(elegidos)
+            if len(nuevos) > hueco:
+                nuevos = heapq.nsmallest(hueco, nuevos, key=lambda i: len(tabla.rutas[i]))
+            elegidos.update(nuevos)
+            if len(elegidos) >= self.MAXIMO_PUNTUADOS:
+                break
+        puntuados = []
+        for i in elegidos:
+            puntos = puntuar_ruta(consulta, tabla.rutas[i], tabla.minusculas[i], tabla.inicios_nombre[i])
+            if puntos is not None:
+                puntuados.append((puntos, i))
+        self.resultados = [tabla.rutas[i] for _, i in heapq.nlargest(self.maximo, puntuados)]
+
+class TrabajadorApertura(QThread):
+    """Hilo que resuelve las consultas de la apertura rápida; sólo atiende la más reciente."""
+    resuelto = pyqtSignal(object) # Emite el TrabajoApertura ya resuelto
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._cola = queue.Queue()
+
+    def encolar(self, trabajo):
+        self._cola.put(trabajo)
+
+    def detener(self):
+        self._cola.put(None)
+        self.wait()
+
+    def run(self):
+        while True:
+            trabajo = self._cola.get()
+            while not self._cola.empty(): # Con cada tecla llega otra: sólo cuenta la última
+                trabajo = self._cola.get()
+            if trabajo is None:
+                break
+            if trabajo.cancelado:
+                continue
+            try:
+                trabajo.ejecutar()
+            except Exception as e:
+                print(f"Error en la apertura rápida: {e}")
+                continue
+            if not trabajo.cancelado:
+                self.resuelto.emit(trabajo)
+
+_trabajador_apertura = None
+
+def obtener_trabajador_apertura():
+    """Devuelve el hilo de la apertura rápida del proceso, creándolo la primera vez."""
+    global _trabajador_apertura
+    if _trabajador_apertura is None:
+        _trabajador_apertura = TrabajadorApertura()
+        _trabajador_apertura.start()
+        QApplication.instance().aboutToQuit.connect(_trabajador_apertura.detener)
+    return _trabajador_apertura
+
+class PaletaApertura(QFrame):
+    """Paleta "Ir a archivo" (Ctrl+P): filtra por aproximación los archivos de la carpeta abierta.
+
+    Flota sobre la ventana, arriba y centrada. Las flechas mueven la selección
+    sin salir del campo, Enter abre el archivo y Escape o perder el foco la cierra.
+    """
+    archivo_elegido = pyqtSignal(str)
+
+    MAXIMO_RESULTADOS = 50
+    ANCHO = 600
+
+    def __init__(self, obtener_indice, parent):
+        super().__init__(parent)
+        self.obtener_indice = obtener_indice
+        self._trabajo = None
+        self._ultimo = None # Último trabajo resuelto: la siguiente consulta refina sus coincidencias
+        self._raiz = None
+        self.setStyleSheet("""
+            PaletaApertura { background-color: #21222C; border: 1px solid #6272A4; }
+            QLineEdit { background-color: #282A36; color: #F8F8F2; border: 1px solid #6272A4; padding: 4px; }
+            QListWidget { background-color: #21222C; color: #F8F8F2; border: none; }
+            QListWidget::item:selected { background-color: #44475A; }
+            QLabel { color: #6272A4; }
+        """)
+        self.campo = QLineEdit()
+        self.campo.setPlaceholderText("Ir a archivo por nombre (Ctrl+P)")
+        self.label_estado = QLabel("")
+        self.lista = QListWidget()
+        self.lista.setUniformItemSizes(True)
+        self.lista.setFocusPolicy(Qt.FocusPolicy.NoFocus) # El foco se queda en el campo
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(6, 6, 6, 6)
+        layout.addWidget(self.campo)
+        layout.addWidget(self.label_estado)
+        layout.addWidget(self.lista)
+
+        self.campo.textChanged.connect(self.refrescar)
+        self.campo.returnPressed.connect(self._elegir)
+        self.campo.installEventFilter(self)
+        self.lista.itemActivated.connect(self._elegir)
+        obtener_trabajador_apertura().resuelto.connect(self._resuelto)
+        self.hide()
+
+    def abrir(self):
+        ventana = self.parentWidget()
+        ancho = min(self.ANCHO, ventana.width() - 40)
+        self.setGeometry((ventana.width() - ancho) // 2, ventana.menuBar().height() + 40, ancho, min(400, ventana.height() - 80))
+        self.show()
+        self.raise_()
+        self.campo.setFocus()
+        self.campo.selectAll()
+        self.refrescar()
+
+    def cerrar(self):
+        if self._trabajo is not None:
+            self._trabajo.cancelado = True
+            self._trabajo = None
+        self.hide()
+
+    def eventFilter(self, objeto, evento):
+        if objeto is self.campo:
+            if evento.type() == QEvent.Type.KeyPress:
+                tecla = evento.key()
+                if tecla == Qt.Key.Key_Escape:
+                    self.cerrar()
+                    return True
+                if tecla in (Qt.Key.Key_Up, Qt.Key.Key_Down, Qt.Key.Key_PageUp, Qt.Key.Key_PageDown):
+                    QApplication.sendEvent(self.lista, evento)
+                    return True
+            elif evento.type() == QEvent.Type.FocusOut:
+                self.cerrar()
+        return super().eventFilter(objeto, evento)
+
+    def refrescar(self):
+        """Vuelve a filtrar con el texto del campo (también cuando cambia la tabla del índice)."""
+        if not self.isVisible():
+            return
+        if self._trabajo is not None:
+            self._trabajo.cancelado = True
+            self._trabajo = None
+        indice = self.obtener_indice()
+        if indice is None:
+            self.lista.clear()
+            self.label_estado.setText("Abra una carpeta en el explorador para ir a sus archivos.")
+            return
+        if not indice.listo:
+            self.label_estado.setText("Recorriendo la carpeta...")
+        self._raiz = indice.raiz
+        consulta = ''.join(self.campo.text().lower().split())
+        self._trabajo = TrabajoApertura(self, consulta, indice.tabla, self.MAXIMO_RESULTADOS, self._ultimo)
+        obtener_trabajador_apertura().encolar(self._trabajo)
+
+    def _resuelto(self, trabajo):
+        if trabajo is not self._trabajo:
+            return
+        self._trabajo = None
+        self._ultimo = trabajo
+        self.lista.clear()
+        for ruta in trabajo.resultados:
+            carpeta, _, nombre = ruta.rpartition('/')
+            elemento = QListWidgetItem(f"{nombre}    {carpeta}" if carpeta else nombre)
+            elemento.setData(Qt.ItemDataRole.UserRole, ruta)
+            elemento.setToolTip(ruta)
+            self.lista.addItem(elemento)
+        if self.lista.count():
+            self.lista.setCurrentRow(0)
+        indice = self.obtener_indice()
+        if indice is not None and not indice.listo:
+            self.label_estado.setText("Recorriendo la carpeta...")
+        else:
+            self.label_estado.setText("" if self.lista.count() else "Sin resultados")
+
+    def _elegir(self):
+        elemento = self.lista.currentItem()
+        if elemento is None:
+            return
+        ruta = os.path.join(self._raiz, *elemento.data(Qt.ItemDataRole.UserRole).split('/'))
+        self.cerrar()
+        self.archivo_elegido.emit(ruta)
+
+# --- 14. Explorador de archivos ---
+
+class ListadorCarpetas(QThread):
+    """Lista en segundo plano las carpetas que pide el explorador, ya filtradas y ordenadas.
+
+    Oculta lo que oculta un FiltroCarpeta con los globs de ``excluir``. Las
+    peticiones que llegan juntas se atienden de una vez y sin repetir. Las
+    carpetas que no han cambiado salen de la CacheListados sin leer el disco.
+    """
+    listada = pyqtSignal(str, list) # Carpeta, [(nombre, es_carpeta), ...]
+
+    def __init__(self, raiz, excluir, parent=None):
+        super().__init__(parent)
+        self.raiz = raiz
+        self._filtro = FiltroCarpeta(raiz, excluir) # Sólo desde este hilo
+        self._cola = queue.Queue()
+        self._cancelado = False
+
+    def pedir(self, carpeta):
+        self._cola.put(carpeta)
+
+    def cancelar(self):
+        self._cancelado = True
+        self._cola.put(None)
+
+    def _listar(self, carpeta):
+        relativa = self._filtro.relativa(carpeta)
+        try:
+            contenido, _ = self._cache.listar(relativa)
+        except OSError:
+            return [] # Ya no existe: la carpeta de arriba se encargará de quitarla
+        self._filtro.leer_reglas(carpeta) # Su .gitignore puede ser justo lo que ha cambiado
+        cadena = self._filtro.cadena(carpeta)
+        entradas = []
+        for tipo, nombre in contenido:
+            es_carpeta = tipo in 'dl'
+            ruta = f"{relativa}/{nombre}" if relativa else nombre
+            if not self._filtro.excluida(nombre, ruta, es_carpeta, cadena):
+                entradas.append((nombre, es_carpeta))
+        entradas.sort(key=clave_explorador)
+        return entradas
+
+    def run(self):
+        self._cache = CacheListados(self.raiz)
+        self._cache.abrir()
+        try:
+            self._atender()
+        finally:
+            self._cache.cerrar()
+
+    def _atender(self):
+        while not self._cancelado:
+            carpetas = [self._cola.get()]
+            while True:
+                try:
+                    carpetas.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            if None in carpetas:
+                break
+            for carpeta in dict.fromkeys(carpetas): # Sin repetir, en el orden pedido
+                if self._cancelado:
+                    return
+                try:
+                    self.listada.emit(carpeta, self._listar(carpeta))
+                except Exception as e:
+                    print(f"Error al listar {carpeta}: {e}")
+            self._cache.confirmar()
+
+def clave_explorador(entrada):
+    """Orden del explorador: primero carpetas, luego archivos, por nombre sin mayúsculas."""
+    nombre, es_carpeta = entrada
+    return (not es_carpeta, nombre.casefold(), nombre)
+
+class ModeloExplorador(QStandardItemModel):
+    """Modelo del explorador que sólo carga (y vigila) las carpetas desplegadas.
+
+    Cada carpeta sin cargar lleva un hijo "Cargando..." para que la vista dibuje
+    la flecha. Al desplegarla se pide su listado al ListadorCarpetas y se vigila
+    con QFileSystemWatcher; al plegarla se descargan sus hijos y se deja de
+    vigilar todo lo que colgaba de ella. Así la memoria y los vigilantes crecen
+    con lo que está a la vista, no con el tamaño de la carpeta.
+    """
+    ROL_RUTA = Qt.ItemDataRole.UserRole
+    ROL_CARPETA = Qt.ItemDataRole.UserRole + 1
+    TRAMO_FILAS = 1000 # Filas por vuelta del bucle de eventos al llenar una carpeta enorme
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setHorizontalHeaderLabels(["Nombre"])
+        self.raiz = ''
+        self.listador = None
+        self._cargadas = {} # Ruta -> QStandardItem de cada carpeta cargada (la raíz es el invisible)
+        self._tramos = {} # Ruta -> marca del llenado por tramos en curso
+        self.observador = QFileSystemWatcher(self)
+        self.observador.directoryChanged.connect(self.refrescar)
+        proveedor = QFileIconProvider()
+        self._icono_carpeta = proveedor.icon(QFileIconProvider.IconType.Folder)
+        self._icono_archivo = proveedor.icon(QFileIconProvider.IconType.File)
+
+    def establecer_raiz(self, raiz, excluir=EXCLUIR_POR_DEFECTO):
+        if self.listador is not None:
+            self.listador.cancelar()
+        if self.observador.directories():
+            self.observador.removePaths(self.observador.directories())
+        self.clear()
+        self.setHorizontalHeaderLabels(["Nombre"])
+        self._tramos.clear()
+        self.raiz = os.path.abspath(raiz)
+        self._cargadas = {}
+        self.listador = ListadorCarpetas(self.raiz, excluir)
+        self.listador.listada.connect(self._listada)
+        conservar_hasta_terminar(self.listador)
+        self.listador.start()
+        self._cargar(self.raiz, self.invisibleRootItem())
+
+    def ruta(self, indice):
+        """Ruta del elemento (None para el "Cargando...")."""
+        return self.itemFromIndex(indice).data(self.ROL_RUTA) if indice.isValid() else self.raiz
+
+    def es_carpeta(self, indice):
+        return bool(self.itemFromIndex(indice).data(self.ROL_CARPETA)) if indice.isValid() else True
+
+    def desplegada(self, indice):
+        elemento = self.itemFromIndex(indice)
+        ruta = elemento.data(self.ROL_RUTA)
+        if elemento.data(self.ROL_CARPETA) and ruta not in self._cargadas:
+            self._cargar(ruta, elemento)
+
+    def plegada(self, indice):
+        elemento = self.itemFromIndex(indice)
+        ruta = elemento.data(self.ROL_RUTA)
+        if ruta in self._cargadas:
+            self._descargar(ruta)
+            elemento.removeRows(0, elemento.rowCount())
+            elemento.appendRow(self._marcador())
+
+    def refrescar(self, carpeta):
+        """Vuelve a listar ``carpeta`` si está cargada (p. ej. tras crear algo en ella)."""
+        carpeta = os.path.abspath(carpeta)
+        if carpeta in self._cargadas:
+            self.listador.pedir(carpeta)
+
+    def _cargar(self, ruta, elemento):
+        self._cargadas[ruta] = elemento
+        self.observador.addPath(ruta)
+        self.listador.pedir(ruta)
+
+    def _descargar(self, ruta):
+        """Olvida ``ruta`` y todo lo cargado debajo de ella (deja de vigilarlo)."""
+        prefijo = os.path.join(ruta, '')
+        for cargada in [c for c in self._cargadas if c == ruta or c.startswith(prefijo)]:
+            del self._cargadas[cargada]
+            self._tramos.pop(cargada, None)
+            self.observador.removePath(cargada)
+
+    def _marcador(self):
+        marcador = QStandardItem("Cargando...")
+        marcador.setFlags(Qt.ItemFlag.ItemIsEnabled)
+        return marcador
+
+    def _crear(self, carpeta, entrada):
+        nombre, es_carpeta = entrada
+        elemento = QStandardItem(self._icono_carpeta if es_carpeta else self._icono_archivo, nombre)
+        elemento.setEditable(False)
+        elemento.setData(os.path.join(carpeta, nombre), self.ROL_RUTA)
+        elemento.setData(es_carpeta, self.ROL_CARPETA)
+        if es_carpeta:
+            elemento.appendRow(self._marcador())
+        return elemento
+
+    def _listada(self, ruta, entradas):
+        elemento = self._cargadas.get(ruta)
+        if elemento is None:
+            return # Se plegó mientras se listaba
+        self._tramos.pop(ruta, None) # Este listado sustituye al llenado que quedara a medias
+        if elemento.rowCount() == 1 and elemento.child(0).data(self.ROL_RUTA) is None:
+            elemento.removeRow(0)
+        nuevas = set(entradas)
+        for fila in reversed(range(elemento.rowCount())):
+            hijo = elemento.child(fila)
+            if (hijo.text(), bool(hijo.data(self.ROL_CARPETA))) not in nuevas:
+                self._descargar(hijo.data(self.ROL_RUTA))
+                elemento.removeRow(fila)
+        if not elemento.rowCount():
+            self._llenar(ruta, elemento, entradas)
+            return
+        # Las filas que quedan y las entradas siguen el mismo orden: se intercalan las nuevas
+        fila = 0
+        for entrada in entradas:
+            hijo = elemento.child(fila)
+            if hijo is None or (hijo.text(), bool(hijo.data(self.ROL_CARPETA))) != entrada:
+                elemento.insertRow(fila, self._crear(ruta, entrada))
+            fila += 1
+
+    def _llenar(self, ruta, elemento, entradas):
+        elemento.appendRows([self._crear(ruta, entrada) for entrada in entradas[:self.TRAMO_FILAS]])
+        if len(entradas) > self.TRAMO_FILAS:
+            marca = self._tramos[ruta] = object()
+            resto = entradas[self.TRAMO_FILAS:]
+            QTimer.singleShot(0, lambda: self._tramos.get(ruta) is marca and self._llenar(ruta, elemento, resto))
 
 # --- NUEVA CLASE ---
 
@@ -115,6 +4028,21 @@ class EditorConNumeros(QWidget):
         
         self.ruta_archivo = None # Ruta específica para este editor
         self.es_guardado = True # Estado de guardado del archivo
+        self.cargador = None # CargadorArchivo mientras el archivo se está leyendo
+        self.recargador = None # CargadorArchivo de una recarga tras un cambio en disco
+        self.firma_disco = None # firma_archivo de la versión del disco que refleja la pestaña
+        self.bytes_disco = 0 # Bytes del archivo que hay en el documento
+        self.seguidor = None # SeguidorArchivo en modo seguimiento
+        self.maximo_lineas = 0 # Líneas que se conservan en modo seguimiento
+        self._parcial = False # El documento sólo tiene el final del archivo
+        self.aviso_conflicto = None # QMessageBox abierto por un cambio en disco con cambios sin guardar
+        self._guardados_en_curso = 0
+        self.encoding = 'utf-8' # Codificación con la que se leyó y se guardará
+        self.fin_linea = os.linesep # Salto de línea original del archivo
+        self._conectado_a_guardado = False
+        self._reemplazo_en_curso = None # TrabajoBusqueda de un "reemplazar todo" vigilado
+        self._destino = None # (línea, columna, longitud) a seleccionar cuando termine la carga
+        self.progreso_carga = None # Porcentaje leído (None si no se está cargando)
         
         # El widget de texto real
         self.text_editor = QPlainTextEdit()
@@ -153,27 +4081,42 @@ class EditorConNumeros(QWidget):
         layout.addWidget(self.area_numeros)
         layout.addWidget(self.text_editor)
 
-        # Resaltador
+        # Resaltador (colorea primero la vista y el resto en segundo plano)
         self.highlighter = PythonHighlighter(self.text_editor.document())
+        self.programador_resaltado = ProgramadorResaltado(self.highlighter, self.text_editor)
+        self.highlighter.usar_trabajador(obtener_trabajador_tokenizacion())
+
+        # Búsqueda de la barra (inactiva hasta que se busca algo)
+        self.sesion_busqueda = SesionBusqueda(self.text_editor)
+        self.sesion_busqueda.actualizada.connect(self._busqueda_actualizada)
+
+        # Contadores para la barra de estado
+        self.estadisticas = EstadisticasDocumento(self.text_editor)
+        self.estadisticas.cambiadas.connect(self._estadisticas_cambiadas)
 
         # Conexiones específicas de este editor
         self.text_editor.document().blockCountChanged.connect(self.actualizar_ancho_area_numeros)
         self.text_editor.updateRequest.connect(self.actualizar_area_numeros_update)
-        self.text_editor.textChanged.connect(self.marcar_no_guardado)
-        self.text_editor.cursorPositionChanged.connect(self.parent_window.actualizar_barra_estado)
+        # textChanged también salta con los formatos del resaltado diferido; el flag de modificación no
+        self.text_editor.document().modificationChanged.connect(self._modificacion_cambiada)
+        self.text_editor.cursorPositionChanged.connect(lambda: self.parent_window.programador_estado.marcar('posicion'))
         
+        self._digitos_numeros = 0
+        self._ancho_numeros = 0
         self.actualizar_ancho_area_numeros()
         
     # --- MÉTODOS DE NÚMEROS DE LÍNEA (Movidos desde la ventana principal) ---
     def ancho_area_numeros(self):
-        """Calcula el ancho necesario basado en el número máximo de líneas."""
-        digitos = max(1, len(str(self.text_editor.document().blockCount())))
-        ancho = 10 + self.text_editor.fontMetrics().horizontalAdvance('9') * digitos
-        return ancho
+        """Ancho necesario para el número máximo de líneas (calculado en actualizar_ancho_area_numeros)."""
+        return self._ancho_numeros
 
     def actualizar_ancho_area_numeros(self):
-        """Informa al layout que el ancho de la barra de números ha cambiado."""
-        self.area_numeros.updateGeometry()
+        """Recalcula el ancho sólo si cambia el número de dígitos e informa al layout."""
+        digitos = max(1, len(str(self.text_editor.document().blockCount())))
+        if digitos != self._digitos_numeros:
+            self._digitos_numeros = digitos
+            self._ancho_numeros = 10 + self.text_editor.fontMetrics().horizontalAdvance('9') * digitos
+            self.area_numeros.updateGeometry()
 
     def actualizar_area_numeros_update(self, rect, dy):
         """Maneja el scroll y repinta el área de números."""
@@ -185,42 +4128,460 @@ class EditorConNumeros(QWidget):
 
     def dibujar_area_numeros(self, event):
         """El método de dibujo real para los números de línea."""
-        painter = QPainter(self.area_numeros)
+        area = self.area_numeros
+        painter = QPainter(area)
         painter.fillRect(event.rect(), QColor("#383A59"))
-        
+        painter.setFont(area.fuente)
+        painter.setPen(QColor("#6272A4"))
+
         bloque = self.text_editor.firstVisibleBlock()
         numero_linea = bloque.blockNumber()
         pos_y_inicial = self.text_editor.blockBoundingGeometry(bloque).translated(self.text_editor.contentOffset()).top()
         top = int(pos_y_inicial)
 
-        font = painter.font()
-        font.setPointSize(10)
-        painter.setFont(font)
-        
-        COLOR_LINEA = QColor("#6272A4")
-        painter.setPen(COLOR_LINEA)
-        
-        while bloque.isValid() and top <= event.rect().bottom():
+        # Sólo la franja dañada: al desplazar, scroll() mueve el resto ya pintado
+        arriba = event.rect().top()
+        abajo = event.rect().bottom()
+        derecha = self._ancho_numeros - 5
+        while bloque.isValid() and top <= abajo:
             altura_bloque = int(self.text_editor.blockBoundingRect(bloque).height())
 
-            if bloque.isVisible() and top >= event.rect().top():
-                ancho = self.ancho_area_numeros() - 5
-                rect = QRect(0, top, ancho, altura_bloque)
-                painter.drawText(rect, int(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter), str(numero_linea + 1))
+            if bloque.isVisible() and top + altura_bloque > arriba:
+                area.dibujar_numero(painter, numero_linea + 1, derecha, top, altura_bloque)
             
             top += altura_bloque
             bloque = bloque.next()
             numero_linea += 1
             
+    # --- MÉTODOS DE CICLO DE VIDA ---
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.programador_resaltado.reanudar()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.programador_resaltado.pausar()
+
+    def cerrar(self):
+        """Detiene el trabajo en segundo plano antes de destruir la pestaña."""
+        if self.cargador is not None:
+            self.cargador.formato_detectado.disconnect()
+            self.cargador.fragmento_leido.disconnect()
+            self.cargador.carga_reiniciada.disconnect()
+            self.cargador.progreso.disconnect()
+            self.cargador.carga_terminada.disconnect()
+            self.cargador.error_carga.disconnect()
+            self.cargador.cancelar()
+            self.cargador = None
+        if self.recargador is not None:
+            self.recargador.cancelar() # Sus avisos ya en cola se ignoran
+            self.recargador = None
+        if self.seguidor is not None:
+            self.seguidor.cancelar()
+            self.seguidor = None
+        if self._conectado_a_guardado:
+            _trabajador_guardado.guardado.disconnect(self._guardado_terminado)
+            self._conectado_a_guardado = False
+        if self._reemplazo_en_curso is not None:
+            self._reemplazo_en_curso.cancelado = True
+            _trabajador_busqueda.buscado.disconnect(self._reemplazo_buscado)
+            self._reemplazo_en_curso = None
+        self.sesion_busqueda.terminar()
+        self.programador_resaltado.detener()
+        self.highlighter.soltar_trabajador()
+
+    def cargar_tema(self, theme_file):
+        self.highlighter.load_theme(theme_file)
+
+    # --- CARGA EN SEGUNDO PLANO ---
+    def cargar_archivo(self, ruta_archivo):
+        """Lee el archivo en un hilo e inserta el texto por lotes; la pestaña responde mientras tanto."""
+        self.ruta_archivo = ruta_archivo
+        self.progreso_carga = 0
+        self.text_editor.setReadOnly(True)
+        self.text_editor.document().setUndoRedoEnabled(False) # La carga no es deshacible
+
+        self.cargador = CargadorArchivo(ruta_archivo)
+        self.cargador.formato_detectado.connect(self._formato_detectado)
+        self.cargador.fragmento_leido.connect(self._anadir_fragmento)
+        self.cargador.carga_reiniciada.connect(self._carga_reiniciada)
+        self.cargador.progreso.connect(self._mostrar_progreso)
+        self.cargador.carga_terminada.connect(self._carga_terminada)
+        self.cargador.error_carga.connect(self._carga_fallida)
+        conservar_hasta_terminar(self.cargador)
+        self.cargador.start()
+
+    def _formato_detectado(self, encoding, fin_linea):
+        self.encoding = encoding
+        self.fin_linea = fin_linea
+        if self is self.parent_window.obtener_editor_activo():
+            self.parent_window.programador_estado.marcar('codificacion')
+
+    def _anadir_fragmento(self, texto):
+        documento = self.text_editor.document()
+        primero = documento.isEmpty()
+        cursor = QTextCursor(documento)
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(texto)
+        if primero:
+            self.text_editor.moveCursor(QTextCursor.MoveOperation.Start)
+        self.cargador.fragmento_aplicado()
+
+    def _carga_reiniciada(self, motivo):
+        # La codificación detectada no valía para todo el archivo: se vuelve a leer con otra
+        cursor = QTextCursor(self.text_editor.document())
+        cursor.select(QTextCursor.SelectionType.Document)
+        cursor.removeSelectedText()
+        self.parent_window.barra_estado.showMessage(
+            f"{os.path.basename(self.ruta_archivo)} {motivo}: se vuelve a leer con otra codificación", 5000)
+
+    def _mostrar_progreso(self, porcentaje):
+        self.progreso_carga = porcentaje
+        self.parent_window.actualizar_titulo_pestana(self)
+
+    def _terminar_carga(self):
+        self.cargador = None
+        self.progreso_carga = None
+        self.text_editor.setReadOnly(False)
+        self.text_editor.document().setUndoRedoEnabled(True)
+
+    def _carga_terminada(self):
+        self.firma_disco = self.cargador.firma
+        self.bytes_disco = self.cargador.leidos
+        self._terminar_carga()
+        self.marcar_guardado()
+        if self._destino is not None:
+            self.ir_a(*self._destino)
+        self.parent_window.carga_completada(self)
+        self.comprobar_disco() # Por si cambió mientras se leía
+
+    # --- CAMBIOS EN DISCO ---
+    def comprobar_disco(self):
+        """Compara el archivo en disco con la versión que refleja la pestaña.
+
+        Si cambió, la pestaña sin cambios se recarga en segundo plano y la que
+        tiene cambios sin guardar pregunta qué hacer; si se borró, queda como
+        modificada para que guardar lo vuelva a crear.
+        """
+        if self.seguidor is not None:
+            self.seguidor.avisar() # Sólo se leen los bytes nuevos
+            return
+        if self.ruta_archivo is None or self.cargador is not None or self._guardados_en_curso:
+            return
+        firma = firma_archivo(self.ruta_archivo)
+        if firma == self.firma_disco:
+            return
+        if firma is None:
+            self.firma_disco = None
+            self.text_editor.document().setModified(True)
+            self.parent_window.barra_estado.showMessage(f"{os.path.basename(self.ruta_archivo)} se ha borrado del disco", 5000)
+        elif self.es_guardado:
+            self.recargar()
+        else:
+            self.parent_window.conflicto_en_disco(self)
+
+    def recargar(self, descartar=False):
+        """Vuelve a leer el archivo en un hilo y sustituye sólo el tramo que cambió.
+
+        El cursor y el desplazamiento se conservan. Si el texto se edita
+        mientras se lee, se pregunta en lugar de recargar (salvo ``descartar``).
+        """
+        if self.recargador is not None:
+            self.recargador.cancelar()
+        self.recargador = cargador = CargadorArchivo(self.ruta_archivo)
+        fragmentos, formato = [], []
+        cargador.formato_detectado.connect(lambda encoding, fin_linea: formato.extend((encoding, fin_linea)))
+        cargador.fragmento_leido.connect(lambda texto: (fragmentos.append(texto), cargador.fragmento_aplicado()))
+        cargador.carga_reiniciada.connect(lambda motivo: (fragmentos.clear(), formato.clear()))
+        cargador.carga_terminada.connect(lambda: self._recarga_terminada(cargador, ''.join(fragmentos), *formato, descartar))
+        cargador.error_carga.connect(lambda mensaje: self._recarga_fallida(cargador, mensaje))
+        conservar_hasta_terminar(cargador)
+        cargador.start()
+
+    def _recarga_terminada(self, cargador, texto, encoding, fin_linea, descartar):
+        if cargador is not self.recargador:
+            return
+        self.recargador = None
+        if not descartar and self.text_editor.document().isModified():
+            self.parent_window.conflicto_en_disco(self)
+            return
+        self.encoding = encoding
+        self.fin_linea = fin_linea
+        self.firma_disco = cargador.firma
+        self.bytes_disco = cargador.leidos
+        self.parent_window.registro_documentos.registrar(self, self.ruta_archivo) # Puede ser otro inodo
+        self._sustituir_texto(texto)
+        self.marcar_guardado()
+        if self is self.parent_window.obtener_editor_activo():
+            self.parent_window.programador_estado.marcar('codificacion')
+        self.comprobar_disco()
+
+    def _recarga_fallida(self, cargador, mensaje):
+        if cargador is self.recargador:
+            self.recargador = None
+            self.parent_window.barra_estado.showMessage(f"Error al recargar {os.path.basename(self.ruta_archivo)}: {mensaje}", 5000)
+
+    def _sustituir_texto(self, nuevo):
+        documento = self.text_editor.document()
+        viejo = texto_documento(documento)
+        inicio, fin_viejo, fin_nuevo = tramo_cambiado(viejo, nuevo)
+        if inicio == fin_viejo == fin_nuevo:
+            return
+        cursor = self.text_editor.textCursor()
+        linea, columna = cursor.blockNumber(), cursor.positionInBlock()
+        vertical = self.text_editor.verticalScrollBar().value()
+        horizontal = self.text_editor.horizontalScrollBar().value()
+        desde, hasta = posiciones_utf16(viejo, (inicio, fin_viejo))
+        cursor = QTextCursor(documento)
+        self.programador_resaltado.suspender()
+        try:
+            cursor.beginEditBlock()
+            cursor.setPosition(desde)
+            cursor.setPosition(hasta, QTextCursor.MoveMode.KeepAnchor)
+            cursor.insertText(nuevo[inicio:fin_nuevo])
+            cursor.endEditBlock()
+        finally:
+            self.programador_resaltado.reactivar()
+        bloque = documento.findBlockByNumber(min(linea, documento.blockCount() - 1))
+        cursor = QTextCursor(bloque)
+        cursor.setPosition(bloque.position() + min(columna, bloque.length() - 1))
+        self.text_editor.setTextCursor(cursor)
+        self.text_editor.verticalScrollBar().setValue(vertical)
+        self.text_editor.horizontalScrollBar().setValue(horizontal)
+
+    def _carga_fallida(self, mensaje):
+        self._terminar_carga()
+        self.parent_window.carga_fallida(self, mensaje)
+
+    # --- MODO SEGUIMIENTO ---
+    def seguir(self, maximo_lineas, desde_final=False):
+        """Sigue el final del archivo: añade lo que se le escribe sin releer lo anterior.
+
+        La pestaña queda de sólo lectura y sin deshacer, conserva unas
+        ``maximo_lineas`` (recorta por arriba al pasarse un 10 %) y baja sola
+        mientras la vista esté al final. Con ``desde_final`` empieza por el
+        último tramo del archivo en lugar de por lo ya cargado. Devuelve un
+        mensaje si la pestaña no se puede seguir.
+        """
+        if self.ruta_archivo is None:
+            return "la pestaña no tiene archivo"
+        if self.seguidor is not None:
+            return "ya se está siguiendo"
+        if self.cargador is not None:
+            return "el archivo aún se está cargando"
+        if not self.es_guardado:
+            return "la pestaña tiene cambios sin guardar"
+        if self.recargador is not None:
+            self.recargador.cancelar() # El documento sigue siendo los bytes_disco primeros
+            self.recargador = None
+        self.maximo_lineas = maximo_lineas
+        self._parcial = desde_final
+        self.text_editor.setReadOnly(True)
+        self.text_editor.document().setUndoRedoEnabled(False)
+        self.seguidor = SeguidorArchivo(self.ruta_archivo, self.encoding,
+                                        None if desde_final else self.bytes_disco, self.firma_disco)
+        self.seguidor.anadido.connect(self._anadir_seguido)
+        self.seguidor.reiniciado.connect(self._seguido_reiniciado)
+        conservar_hasta_terminar(self.seguidor)
+        self.seguidor.start()
+        self._recortar()
+        return None
+
+    def dejar_de_seguir(self):
+        """Sale del modo seguimiento. Devuelve True si el documento sólo tiene el final del archivo."""
+        self.seguidor.anadido.disconnect(self._anadir_seguido)
+        self.seguidor.reiniciado.disconnect(self._seguido_reiniciado)
+        self.seguidor.cancelar()
+        self.seguidor = None
+        self.text_editor.setReadOnly(False)
+        self.text_editor.document().setUndoRedoEnabled(True)
+        if not self._parcial:
+            self.comprobar_disco() # Lo escrito desde la última lectura
+        return self._parcial
+
+    def _anadir_seguido(self, texto, firma):
+        seguidor = self.sender()
+        if seguidor is not self.seguidor:
+            return
+        barra = self.text_editor.verticalScrollBar()
+        al_final = barra.value() >= barra.maximum()
+        if texto:
+            documento = self.text_editor.document()
+            cursor = QTextCursor(documento)
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            cursor.insertText(texto)
+            documento.setModified(False) # Lo que llega del disco no es una modificación
+            self._recortar()
+            if al_final:
+                barra.setValue(barra.maximum())
+        if firma is not None:
+            self.firma_disco = firma
+            self.bytes_disco = firma[1]
+        seguidor.fragmento_aplicado()
+
+    def _recortar(self):
+        documento = self.text_editor.document()
+        sobran = documento.blockCount() - self.maximo_lineas
+        if sobran <= self.maximo_lineas // 10:
+            return # Se recorta de vez en cuando, no en cada línea
+        barra = self.text_editor.verticalScrollBar()
+        valor = barra.value()
+        cursor = QTextCursor(documento)
+        cursor.movePosition(QTextCursor.MoveOperation.NextBlock, QTextCursor.MoveMode.KeepAnchor, sobran)
+        self.programador_resaltado.suspender()
+        try:
+            cursor.removeSelectedText()
+        finally:
+            self.programador_resaltado.reactivar()
+        documento.setModified(False)
+        self._parcial = True
+        barra.setValue(max(0, valor - sobran)) # Lo que se estaba leyendo no se mueve
+
+    def _seguido_reiniciado(self):
+        if self.sender() is not self.seguidor:
+            return
+        cursor = QTextCursor(self.text_editor.document())
+        cursor.select(QTextCursor.SelectionType.Document)
+        cursor.removeSelectedText() # Conserva el formato de bloque (clear() lo perdería)
+        self.text_editor.document().setModified(False)
+        self._parcial = False
+        self.parent_window.registro_documentos.registrar(self, self.ruta_archivo) # Tras una rotación es otro inodo
+        self.parent_window.barra_estado.showMessage(
+            f"{os.path.basename(self.ruta_archivo)} se ha truncado o sustituido: se sigue desde el principio", 5000)
+
+    def ir_a(self, linea, columna=0, longitud=0):
+        """Selecciona ``longitud`` caracteres en la línea y columna dadas (desde 0).
+
+        Si el archivo aún se está leyendo, se hace al terminar la carga.
+        """
+        if self.progreso_carga is not None:
+            self._destino = (linea, columna, longitud)
+            return
+        self._destino = None
+        bloque = self.text_editor.document().findBlockByNumber(linea)
+        if not bloque.isValid():
+            return
+        texto = bloque.text()
+        inicio, fin = posiciones_utf16(texto, (min(columna, len(texto)), min(columna + longitud, len(texto))))
+        cursor = QTextCursor(bloque)
+        cursor.setPosition(bloque.position() + inicio)
+        cursor.setPosition(bloque.position() + fin, QTextCursor.MoveMode.KeepAnchor)
+        self.text_editor.setTextCursor(cursor)
+        self.text_editor.centerCursor()
+        self.text_editor.setFocus()
+
+    # --- REEMPLAZO ---
+    def reemplazar_todo(self, patron, reemplazo, vigilado=False):
+        """Reemplaza todas las coincidencias de ``patron`` con una sola edición (un paso de deshacer).
+
+        Las coincidencias se buscan sobre una instantánea y sólo se reescribe el
+        tramo que va de la primera a la última, así el resaltador, las
+        estadísticas y la barra de estado reciben un único cambio.
+
+        Con ``vigilado`` (regex del usuario) la búsqueda se hace en el
+        VigilanteRegex: devuelve None y el resultado llega a
+        ``VentanaPrincipal.reemplazo_completado``.
+        """
+        if vigilado:
+            texto = self.sesion_busqueda.instantanea() # Deja de ser vigente si se edita
+            if self._reemplazo_en_curso is not None:
+                self._reemplazo_en_curso.cancelado = True
+            else:
+                obtener_trabajador_busqueda().buscado.connect(self._reemplazo_buscado)
+            self._reemplazo_en_curso = TrabajoBusqueda(self, 0, patron, texto, vigilado=True, reemplazo=reemplazo)
+            _trabajador_busqueda.encolar(self._reemplazo_en_curso)
+            return None
+        texto = texto_documento(self.text_editor.document())
+        return self._aplicar_reemplazo(texto, reemplazar_en_texto(texto, patron, reemplazo))
+
+    def _reemplazo_buscado(self, trabajo):
+        if trabajo is not self._reemplazo_en_curso:
+            return
+        _trabajador_busqueda.buscado.disconnect(self._reemplazo_buscado)
+        self._reemplazo_en_curso = None
+        if trabajo.error:
+            self.parent_window.reemplazo_completado(self, 0, trabajo.error)
+        elif not self.sesion_busqueda.vigente(trabajo.texto):
+            self.parent_window.reemplazo_completado(self, 0, "El documento cambió durante la búsqueda")
+        else:
+            self.parent_window.reemplazo_completado(self, self._aplicar_reemplazo(trabajo.texto, trabajo.resultado))
+
+    def _aplicar_reemplazo(self, texto, resultado):
+        if resultado is None:
+            return 0
+        documento = self.text_editor.document()
+        inicio, fin, nuevo, contador = resultado
+        inicio, fin = posiciones_utf16(texto, (inicio, fin))
+        cursor = QTextCursor(documento)
+        self.programador_resaltado.suspender()
+        try:
+            cursor.beginEditBlock()
+            cursor.setPosition(inicio)
+            cursor.setPosition(fin, QTextCursor.MoveMode.KeepAnchor)
+            cursor.insertText(nuevo)
+            cursor.endEditBlock()
+        finally:
+            self.programador_resaltado.reactivar()
+        return contador
+
+    # --- GUARDADO EN SEGUNDO PLANO ---
+    def guardar(self, ruta_archivo):
+        """Encola una instantánea del texto para escribirla en ``ruta_archivo``.
+
+        El documento se da por no modificado desde ya: si se edita mientras se
+        escribe, vuelve a marcarse como modificado y el guardado no lo limpia.
+        """
+        # Con otro guardado en cola el disco aún no tiene la versión esperada: sólo se comprueba el primero
+        firma = None if self._guardados_en_curso else self.firma_disco
+        trabajo = TrabajoGuardado(self, ruta_archivo, self.text_editor.toPlainText(), self.encoding, self.fin_linea, firma,
+                                  MASCARA_PERMISOS)
+        self._guardados_en_curso += 1
+        self.text_editor.document().setModified(False)
+        trabajador = obtener_trabajador_guardado()
+        if not self._conectado_a_guardado:
+            trabajador.guardado.connect(self._guardado_terminado)
+            self._conectado_a_guardado = True
+        trabajador.encolar(trabajo)
+
+    def _guardado_terminado(self, trabajo):
+        if trabajo.solicitante is not self:
+            return
+        self._guardados_en_curso -= 1
+        if trabajo.error is not None:
+            self.text_editor.document().setModified(True)
+        else:
+            if trabajo.ruta_archivo == self.ruta_archivo and trabajo.firma is not None:
+                self.firma_disco = trabajo.firma
+                self.bytes_disco = trabajo.firma[1]
+            if not self.text_editor.document().isModified():
+                self.marcar_guardado()
+        self.parent_window.guardado_completado(self, trabajo)
+        if not trabajo.conflicto:
+            self.comprobar_disco() # Lo que cambió en disco mientras se guardaba
+
     # --- MÉTODOS DE ESTADO ---
+    def _busqueda_actualizada(self):
+        if self is self.parent_window.obtener_editor_activo():
+            self.parent_window.actualizar_contador_busqueda()
+
+    def _estadisticas_cambiadas(self):
+        if self is self.parent_window.obtener_editor_activo():
+            self.parent_window.programador_estado.marcar('contador')
+
+    def _modificacion_cambiada(self, modificado):
+        if modificado:
+            self.marcar_no_guardado()
+
     def marcar_no_guardado(self):
+        if self.progreso_carga is not None or self.seguidor is not None:
+            return # El texto que llega del disco no es una modificación
         if self.es_guardado:
             self.es_guardado = False
             self.parent_window.actualizar_titulo_pestana(self)
-            self.parent_window.actualizar_contador_caracteres()
             
     def marcar_guardado(self):
         self.es_guardado = True
+        self.text_editor.document().setModified(False)
         self.parent_window.actualizar_titulo_pestana(self)
 
 class VentanaPrincipal(QMainWindow):
@@ -261,6 +4622,9 @@ class VentanaPrincipal(QMainWindow):
         self.drag_pos = None # Movido a la barra de título, pero mantenemos la referencia aquí
 
         self.cargar_configuracion_temas()
+        self.vigilante_documentos = VigilanteDocumentos(self) # Cambios en disco de los archivos abiertos
+        self.vigilante_documentos.cambiado.connect(self.documento_cambiado)
+        self.registro_documentos = RegistroDocumentos(self.vigilante_documentos) # Pestañas abiertas por ruta
 
         # --- Panel de botones izquierdo ---
         self.barra_actividades = QToolBar("Barra de Actividades")
@@ -285,7 +4649,7 @@ class VentanaPrincipal(QMainWindow):
 
         # Tooltips para los botones
         self.boton_explorador.setToolTip("Explorador de archivos")
-        self.boton_buscar.setToolTip("Buscar en el archivo")
+        self.boton_buscar.setToolTip("Buscar en la carpeta")
         self.boton_git.setToolTip("Control de versiones")
         self.boton_ajustes.setToolTip("Ajustes")
 
@@ -352,15 +4716,14 @@ class VentanaPrincipal(QMainWindow):
         layout_bienvenida.addWidget(self.boton_abrir_archivo_explorador)
 
         # --- Vista del Árbol de Archivos ---
-        self.model = QFileSystemModel()
+        self.model = ModeloExplorador() # Sólo carga y vigila las carpetas desplegadas
         self.tree_view = QTreeView()
         self.tree_view.setModel(self.model)
         self.tree_view.setAnimated(True) # Pequeña animación al expandir/colapsar
         self.tree_view.setIndentation(15) # Indentación para los elementos
-        self.tree_view.setSortingEnabled(True)
-        self.tree_view.hideColumn(1)
-        self.tree_view.hideColumn(2)
-        self.tree_view.hideColumn(3)
+        self.tree_view.setUniformRowHeights(True) # Carpetas con miles de archivos: evita medir cada fila
+        self.tree_view.expanded.connect(self.model.desplegada)
+        self.tree_view.collapsed.connect(self.model.plegada)
 
         # --- StackedWidget para cambiar entre bienvenida y árbol ---
         self.stacked_widget_explorador = QStackedWidget()
@@ -389,12 +4752,33 @@ class VentanaPrincipal(QMainWindow):
         self.boton_nuevo_archivo.clicked.connect(self.crear_nuevo_archivo)
         self.boton_nueva_carpeta.clicked.connect(self.crear_nueva_carpeta)
 
+        # --- Panel de Búsqueda en la Carpeta (Dock Widget) ---
+        self.dock_busqueda_carpeta = QDockWidget("Buscar", self)
+        self.dock_busqueda_carpeta.setAllowedAreas(Qt.DockWidgetArea.LeftDockWidgetArea | Qt.DockWidgetArea.RightDockWidgetArea)
+        self.dock_busqueda_carpeta.setStyleSheet("QDockWidget { background-color: #282A36; color: #F8F8F2; }")
+        self.indice_carpeta = None # IndiceTrigramas de la carpeta abierta
+        self.indice_archivos = None # IndiceArchivos de la carpeta abierta (apertura rápida)
+        self.observador_carpeta = None # ObservadorCarpeta que comparten los dos índices
+        self.panel_busqueda_carpeta = PanelBusquedaCarpeta(
+            self.carpeta_abierta, self.umbral_archivo_grande, lambda: self.indice_carpeta, self.exclusiones)
+        self.panel_busqueda_carpeta.abrir_coincidencia.connect(self.abrir_coincidencia)
+        self.dock_busqueda_carpeta.setWidget(self.panel_busqueda_carpeta)
+        self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.dock_busqueda_carpeta)
+        self.dock_busqueda_carpeta.hide() # Oculto por defecto
+
+        # --- Paleta de apertura rápida (Ctrl+P), flotando sobre la ventana ---
+        self.paleta_apertura = PaletaApertura(lambda: self.indice_archivos, self)
+        self.paleta_apertura.archivo_elegido.connect(self.abrir_archivo_con_ruta)
+
         # 🟢 NUEVO: QTabWidget como widget central
         self.tab_widget = QTabWidget()
         self.tab_widget.setTabsClosable(True) # Permitir cerrar pestañas
         self.tab_widget.setDocumentMode(True) # Estilo moderno, similar a VS Code
         self.tab_widget.tabCloseRequested.connect(self.cerrar_pestana) # Conectar la señal de cierre
-        self.tab_widget.currentChanged.connect(self.actualizar_estado_completo)
+        self.tab_widget.currentChanged.connect(lambda: self.programador_estado.marcar())
+        self.tab_widget.currentChanged.connect(lambda: self.reiniciar_busqueda())
+        self.tab_widget.currentChanged.connect(lambda: self.accion_seguir.setChecked(
+            getattr(self.obtener_editor_activo(), 'seguidor', None) is not None))
 
         # Estilo para las pestañas (Dracula)
         self.tab_widget.setStyleSheet("""
@@ -451,12 +4835,19 @@ class VentanaPrincipal(QMainWindow):
         """Devuelve la instancia actual de EditorConNumeros en la pestaña activa."""
         return self.tab_widget.currentWidget()
 
+    def obtener_editor_texto(self):
+        """Como obtener_editor_activo, pero None si la pestaña es un VisorArchivoGrande."""
+        editor = self.tab_widget.currentWidget()
+        return editor if isinstance(editor, EditorConNumeros) else None
+
     def actualizar_titulo_pestana(self, editor):
         """Actualiza el título de la pestaña para mostrar si está modificado (*)."""
         index = self.tab_widget.indexOf(editor)
         if index != -1:
             nombre_base = os.path.basename(editor.ruta_archivo) if editor.ruta_archivo else "Sin título"
             titulo = f"{nombre_base}{' *' if not editor.es_guardado else ''}"
+            if editor.progreso_carga is not None:
+                titulo = f"{nombre_base} ({editor.progreso_carga}%)"
             self.tab_widget.setTabText(index, titulo)
 
     def cerrar_pestana(self, index):
@@ -470,6 +4861,8 @@ class VentanaPrincipal(QMainWindow):
             return
 
         self.tab_widget.removeTab(index)
+        self.registro_documentos.quitar(editor_a_cerrar)
+        editor_a_cerrar.cerrar()
         editor_a_cerrar.deleteLater()
 
     # --- MÉTODOS DE ARCHIVO ---
@@ -477,69 +4870,94 @@ class VentanaPrincipal(QMainWindow):
     def abrir_archivo(self):
         ruta_archivo, _ = QFileDialog.getOpenFileName(self, "Abrir Archivo", "", "Archivos de texto (*.txt);;Todos los archivos (*)")
         if ruta_archivo:
-            # Verificar si el archivo ya está abierto
-            for i in range(self.tab_widget.count()):
-                editor_existente = self.tab_widget.widget(i)
-                if editor_existente.ruta_archivo == ruta_archivo:
-                    self.tab_widget.setCurrentIndex(i)
-                    self.barra_estado.showMessage(f"Archivo ya abierto en la pestaña {i+1}", 3000)
-                    return
-            
-            try:
-                with open(ruta_archivo, 'r', encoding='utf-8') as f:
-                    contenido = f.read()
-                
-                nuevo_editor_widget = EditorConNumeros(self)
-                nuevo_editor_widget.text_editor.setPlainText(contenido)
-                nuevo_editor_widget.ruta_archivo = ruta_archivo
-                nuevo_editor_widget.marcar_guardado()
-
-                index = self.tab_widget.addTab(nuevo_editor_widget, os.path.basename(ruta_archivo))
-                self.tab_widget.setCurrentIndex(index)
-                
-                self.actualizar_info_lenguaje()
-                self.actualizar_barra_estado()
-
-            except Exception as e:
-                print(f"Error al abrir el archivo: {e}")
+            self.abrir_archivo_con_ruta(ruta_archivo)
 
     def guardar_archivo(self):
-        editor = self.obtener_editor_activo()
+        editor = self.obtener_editor_texto()
         if not editor: return
+        if editor.seguidor is not None:
+            self.barra_estado.showMessage("La pestaña está siguiendo el archivo: no se guarda", 3000)
+            return
 
         if editor.ruta_archivo:
-            try:
-                with open(editor.ruta_archivo, 'w', encoding='utf-8') as f:
-                    f.write(editor.text_editor.toPlainText())
-                editor.marcar_guardado()
-                self.barra_estado.showMessage(f"Archivo guardado: {os.path.basename(editor.ruta_archivo)}", 3000)
-            except Exception as e:
-                print(f"Error al guardar el archivo: {e}")
+            editor.guardar(editor.ruta_archivo)
+            self.barra_estado.showMessage(f"Guardando {os.path.basename(editor.ruta_archivo)}...")
         else:
             self.guardar_como()
 
     def guardar_como(self):
-        editor = self.obtener_editor_activo()
+        editor = self.obtener_editor_texto()
         if not editor: return
+        if editor.seguidor is not None:
+            self.barra_estado.showMessage("La pestaña está siguiendo el archivo: no se guarda", 3000)
+            return
 
         ruta_archivo, _ = QFileDialog.getSaveFileName(self, "Guardar Archivo", "", "Archivos de texto (*.txt);;Todos los archivos (*)")
         if ruta_archivo:
-            try:
-                with open(ruta_archivo, 'w', encoding='utf-8') as f:
-                    f.write(editor.text_editor.toPlainText())
-                editor.ruta_archivo = ruta_archivo
-                editor.marcar_guardado()
-                self.actualizar_titulo_pestana(editor)
-                self.actualizar_info_lenguaje()
-                self.barra_estado.showMessage(f"Archivo guardado en: {os.path.basename(ruta_archivo)}", 3000)
-            except Exception as e:
-                print(f"Error al guardar el archivo: {e}")
-                
+            otro = self.registro_documentos.buscar(ruta_archivo)
+            if otro is not None and otro is not editor:
+                self.barra_estado.showMessage("Error: ese archivo está abierto en otra pestaña.", 5000)
+                return
+            editor.ruta_archivo = ruta_archivo
+            editor.firma_disco = None # El diálogo ya ha pedido confirmación para sobrescribir
+            self.registro_documentos.registrar(editor, ruta_archivo)
+            editor.guardar(ruta_archivo)
+            self.actualizar_titulo_pestana(editor)
+            self.actualizar_info_lenguaje()
+            self.barra_estado.showMessage(f"Guardando {os.path.basename(ruta_archivo)}...")
+
+    def guardado_completado(self, editor, trabajo):
+        """Informa del resultado de un TrabajoGuardado en la barra de estado."""
+        if trabajo.error is not None:
+            print(f"Error al guardar el archivo: {trabajo.error}")
+            self.barra_estado.showMessage(f"Error al guardar {os.path.basename(trabajo.ruta_archivo)}: {trabajo.error}", 5000)
+            if trabajo.conflicto:
+                self.conflicto_en_disco(editor)
+        else:
+            if editor.ruta_archivo == trabajo.ruta_archivo:
+                # El archivo puede ser nuevo (guardar como) o tener otro inodo tras el renombrado
+                self.registro_documentos.registrar(editor, trabajo.ruta_archivo)
+            if self.observador_carpeta is not None:
+                self.observador_carpeta.avisar(trabajo.ruta_archivo)
+            self.barra_estado.showMessage(f"Archivo guardado: {os.path.basename(trabajo.ruta_archivo)}", 3000)
+
+    def documento_cambiado(self, clave):
+        """Atiende un aviso del VigilanteDocumentos: la pestaña decide si recargar o preguntar."""
+        editor = self.registro_documentos.buscar(clave)
+        if editor is not None:
+            editor.comprobar_disco()
+
+    def conflicto_en_disco(self, editor):
+        """Pregunta qué hacer con una pestaña con cambios sin guardar cuyo archivo cambió en disco."""
+        if editor.aviso_conflicto is not None:
+            return
+        aviso = QMessageBox(QMessageBox.Icon.Warning, "Archivo cambiado en disco",
+                            f"{os.path.basename(editor.ruta_archivo)} ha cambiado en disco y la pestaña tiene cambios sin guardar.",
+                            parent=self)
+        recargar = aviso.addButton("Recargar del disco", QMessageBox.ButtonRole.DestructiveRole)
+        conservar = aviso.addButton("Conservar mis cambios", QMessageBox.ButtonRole.RejectRole)
+        aviso.setDefaultButton(conservar)
+        aviso.finished.connect(lambda: self._conflicto_resuelto(editor, aviso.clickedButton() is recargar))
+        editor.aviso_conflicto = aviso
+        aviso.open() # No bloquea el bucle de eventos: las demás pestañas siguen recargándose
+
+    def _conflicto_resuelto(self, editor, recargar):
+        editor.aviso_conflicto.deleteLater()
+        editor.aviso_conflicto = None
+        if self.tab_widget.indexOf(editor) == -1:
+            return
+        if recargar:
+            editor.recargar(descartar=True)
+        else:
+            # El siguiente guardado sobrescribe la versión del disco
+            editor.firma_disco = firma_archivo(editor.ruta_archivo)
+            editor.text_editor.document().setModified(True)
+
     def abrir_archivo_desde_explorador(self, index):
         """Abre un archivo al hacer doble clic en el QTreeView."""
-        ruta_archivo = self.model.filePath(index)
-        # Asegurarse de que no es un directorio
-        if not self.model.isDir(index):
+        ruta_archivo = self.model.ruta(index)
+        # Asegurarse de que no es un directorio (ni el "Cargando..." de una carpeta)
+        if ruta_archivo and not self.model.es_carpeta(index):
             # Reutilizamos la lógica de abrir_archivo, pero pasándole la ruta
             self.abrir_archivo_con_ruta(ruta_archivo)
     
@@ -547,11 +4965,11 @@ class VentanaPrincipal(QMainWindow):
         """Abre un diálogo para seleccionar una carpeta y la muestra en el QTreeView."""
         directorio = QFileDialog.getExistingDirectory(self, "Seleccionar Carpeta")
         if directorio:
-            self.model.setRootPath(directorio)
-            self.tree_view.setRootIndex(self.model.index(directorio))
+            self.model.establecer_raiz(directorio, self.exclusiones())
             self.stacked_widget_explorador.setCurrentWidget(self.tree_view)
             self.cabecera_explorador.show()
             self.dock_explorador.setWindowTitle(f"Explorador - {os.path.basename(directorio)}")
+            self.indexar_carpeta(directorio)
 
     def abrir_archivo_y_carpeta_en_explorador(self):
         """Abre un archivo y carga su carpeta contenedora en el explorador."""
@@ -560,39 +4978,111 @@ class VentanaPrincipal(QMainWindow):
             self.abrir_archivo_con_ruta(ruta_archivo)
             # Cargar la carpeta contenedora en el explorador
             directorio = os.path.dirname(ruta_archivo)
-            self.model.setRootPath(directorio)
-            self.tree_view.setRootIndex(self.model.index(directorio))
+            self.model.establecer_raiz(directorio, self.exclusiones())
             self.stacked_widget_explorador.setCurrentWidget(self.tree_view)
             self.cabecera_explorador.show()
             self.dock_explorador.setWindowTitle(f"Explorador - {os.path.basename(directorio)}")
+            self.indexar_carpeta(None) # La carpeta de un archivo suelto no se indexa
+
+    def indexar_carpeta(self, directorio):
+        """Cambia los índices de la carpeta (búsqueda y apertura rápida) a ``directorio`` (None: sin índices)."""
+        for indice in (self.indice_carpeta, self.indice_archivos):
+            if indice is not None:
+                indice.cancelar()
+        if self.observador_carpeta is not None:
+            self.observador_carpeta.detener()
+        self.indice_carpeta = self.indice_archivos = self.observador_carpeta = None
+        if not directorio:
+            return
+        self.observador_carpeta = ObservadorCarpeta(directorio, self)
+        self.indice_carpeta = IndiceTrigramas(directorio, self.umbral_archivo_grande(), self.exclusiones())
+        self.indice_carpeta.sincronizado.connect(
+            lambda n: self.barra_estado.showMessage(f"Índice de búsqueda listo ({n} archivos)", 3000))
+        self.indice_archivos = IndiceArchivos(directorio, self.exclusiones())
+        self.indice_archivos.actualizado.connect(self.paleta_apertura.refrescar)
+        for indice in (self.indice_carpeta, self.indice_archivos):
+            indice.directorios_encontrados.connect(self.observador_carpeta.vigilar)
+            self.observador_carpeta.cambiado.connect(indice.marcar)
+            self.observador_carpeta.desbordado.connect(indice.sin_vigilancia)
+            conservar_hasta_terminar(indice)
+            indice.start()
+
+    def exclusiones(self):
+        """Globs que se ocultan de la carpeta abierta, además de sus .gitignore."""
+        return self.theme_config.get('files_exclude', EXCLUIR_POR_DEFECTO)
+
+    def umbral_archivo_grande(self):
+        """Tamaño a partir del cual un archivo se abre en el visor de archivos grandes."""
+        return self.theme_config.get('large_file_threshold_mb', 64) * 1024 * 1024
 
     def abrir_archivo_con_ruta(self, ruta_archivo):
-        """Función auxiliar para abrir un archivo desde una ruta dada (usada por explorador)."""
-        for i in range(self.tab_widget.count()):
-            editor_existente = self.tab_widget.widget(i)
-            if editor_existente.ruta_archivo == ruta_archivo:
-                self.tab_widget.setCurrentIndex(i)
-                return
+        """Abre un archivo desde una ruta dada (diálogo, explorador); el contenido se carga en segundo plano."""
+        # Verificar si el archivo ya está abierto (con esta u otra forma de la ruta)
+        editor_existente = self.registro_documentos.buscar(ruta_archivo)
+        if editor_existente is not None:
+            i = self.tab_widget.indexOf(editor_existente)
+            self.tab_widget.setCurrentIndex(i)
+            self.barra_estado.showMessage(f"Archivo ya abierto en la pestaña {i+1}", 3000)
+            return
         try:
-            with open(ruta_archivo, 'r', encoding='utf-8') as f:
-                contenido = f.read()
+            tamano = os.path.getsize(ruta_archivo)
+        except OSError:
+            tamano = 0 # El cargador informará del error
+        umbral = self.umbral_archivo_grande()
+        if tamano >= umbral and not self._codificacion_ancha(ruta_archivo):
+            # Archivos enormes: visor de sólo lectura proyectado en memoria
+            try:
+                nuevo_editor = VisorArchivoGrande(self, ruta_archivo)
+            except (OSError, ValueError) as e:
+                print(f"Error al abrir el archivo: {e}")
+                self.barra_estado.showMessage(f"Error al abrir {os.path.basename(ruta_archivo)}: {e}", 5000)
+                return
+            self.tab_widget.addTab(nuevo_editor, os.path.basename(ruta_archivo))
+            self.tab_widget.setCurrentWidget(nuevo_editor)
+            self.barra_estado.showMessage("Archivo grande: abierto en modo de sólo lectura", 5000)
+        else:
             nuevo_editor = EditorConNumeros(self)
-            nuevo_editor.text_editor.setPlainText(contenido)
-            nuevo_editor.ruta_archivo = ruta_archivo
-            nuevo_editor.marcar_guardado()
-            index = self.tab_widget.addTab(nuevo_editor, os.path.basename(ruta_archivo))
+            nuevo_editor.ruta_archivo = ruta_archivo # Antes de añadir la pestaña: fija el lenguaje
+            self.tab_widget.addTab(nuevo_editor, os.path.basename(ruta_archivo))
             self.tab_widget.setCurrentWidget(nuevo_editor)
+            nuevo_editor.cargar_archivo(ruta_archivo)
+        self.registro_documentos.registrar(nuevo_editor, ruta_archivo)
+        self.actualizar_titulo_pestana(nuevo_editor)
+        self.actualizar_estado_completo()
+
+    def _codificacion_ancha(self, ruta_archivo):
+        """True si el archivo es UTF-16/32: el visor de archivos grandes separa líneas por bytes."""
+        try:
+            with open(ruta_archivo, 'rb') as f:
+                encoding = detectar_codificacion(f.read(CargadorArchivo.TAMANO_FRAGMENTO))
+        except OSError:
+            return False
+        return encoding.startswith(('utf-16', 'utf-32'))
+
+    def carga_completada(self, editor):
+        """Refresca la pestaña y la barra de estado cuando termina de leerse un archivo."""
+        self.actualizar_titulo_pestana(editor)
+        if editor is self.obtener_editor_activo():
             self.actualizar_estado_completo()
-        except Exception as e:
-            print(f"Error al abrir archivo desde explorador: {e}")
+
+    def carga_fallida(self, editor, mensaje):
+        """Cierra la pestaña provisional de un archivo que no se pudo leer."""
+        print(f"Error al abrir el archivo: {mensaje}")
+        self.barra_estado.showMessage(f"Error al abrir {os.path.basename(editor.ruta_archivo)}: {mensaje}", 5000)
+        index = self.tab_widget.indexOf(editor)
+        if index != -1:
+            self.tab_widget.removeTab(index)
+        self.registro_documentos.quitar(editor)
+        editor.cerrar()
+        editor.deleteLater()
 
     def crear_nuevo_archivo(self):
         """Crea un nuevo archivo en el directorio seleccionado o en la raíz."""
         indices = self.tree_view.selectedIndexes()
-        ruta_base = self.model.rootPath()
-        if indices:
-            ruta_seleccionada = self.model.filePath(indices[0])
-            if self.model.isDir(indices[0]):
+        ruta_base = self.model.raiz
+        if indices and self.model.ruta(indices[0]):
+            ruta_seleccionada = self.model.ruta(indices[0])
+            if self.model.es_carpeta(indices[0]):
                 ruta_base = ruta_seleccionada
             else:
                 ruta_base = os.path.dirname(ruta_seleccionada)
@@ -602,16 +5092,17 @@ class VentanaPrincipal(QMainWindow):
             ruta_completa = os.path.join(ruta_base, nombre_archivo)
             if not os.path.exists(ruta_completa):
                 open(ruta_completa, 'a').close() # Crea el archivo vacío
+                self.model.refrescar(ruta_base)
             else:
                 self.barra_estado.showMessage("Error: El archivo ya existe.", 3000)
 
     def crear_nueva_carpeta(self):
         """Crea una nueva carpeta en el directorio seleccionado o en la raíz."""
         indices = self.tree_view.selectedIndexes()
-        ruta_base = self.model.rootPath()
-        if indices:
-            ruta_seleccionada = self.model.filePath(indices[0])
-            if self.model.isDir(indices[0]):
+        ruta_base = self.model.raiz
+        if indices and self.model.ruta(indices[0]):
+            ruta_seleccionada = self.model.ruta(indices[0])
+            if self.model.es_carpeta(indices[0]):
                 ruta_base = ruta_seleccionada
             else:
                 ruta_base = os.path.dirname(ruta_seleccionada)
@@ -619,6 +5110,7 @@ class VentanaPrincipal(QMainWindow):
         nombre_carpeta, ok = QInputDialog.getText(self, "Nueva Carpeta", "Introduce el nombre de la carpeta:")
         if ok and nombre_carpeta:
             os.makedirs(os.path.join(ruta_base, nombre_carpeta), exist_ok=True)
+            self.model.refrescar(ruta_base)
             
     def cargar_configuracion_temas(self):
         """Carga la configuración de temas desde el archivo JSON."""
@@ -644,6 +5136,16 @@ class VentanaPrincipal(QMainWindow):
         self.campo_buscar.setPlaceholderText("Buscar (Ctrl+F)")
         self.campo_buscar.setStyleSheet("QLineEdit { background-color: #282A36; color: #F8F8F2; border: 1px solid #6272A4; padding: 3px; }")
         self.campo_buscar.returnPressed.connect(self.buscar_siguiente)
+        self.campo_buscar.textChanged.connect(self._texto_busqueda_cambiado)
+
+        # Búsqueda mientras se escribe: se espera a que el usuario haga una pausa
+        self.temporizador_busqueda = QTimer(self)
+        self.temporizador_busqueda.setSingleShot(True)
+        self.temporizador_busqueda.setInterval(150)
+        self.temporizador_busqueda.timeout.connect(lambda: self.reiniciar_busqueda(seleccionar=True))
+
+        self.label_coincidencias = QLabel("")
+        self.label_coincidencias.setStyleSheet("QLabel { color: #F8F8F2; border: none; }")
 
         self.campo_reemplazar = QLineEdit()
         self.campo_reemplazar.setPlaceholderText("Reemplazar (Ctrl+H)")
@@ -661,6 +5163,9 @@ class VentanaPrincipal(QMainWindow):
         self.boton_palabra_completa.setCheckable(True)
         self.boton_palabra_completa.setToolTip("Palabra completa")
 
+        for boton in (self.boton_match_case, self.boton_regex, self.boton_palabra_completa):
+            boton.toggled.connect(lambda: self.reiniciar_busqueda())
+
         self.boton_anterior = QPushButton("▲")
         self.boton_anterior.setToolTip("Anterior (Shift+F3)")
         self.boton_anterior.clicked.connect(self.buscar_anterior)
@@ -680,6 +5185,7 @@ class VentanaPrincipal(QMainWindow):
         self.boton_cerrar.clicked.connect(self.ocultar_barra_busqueda)
 
         layout.addWidget(self.campo_buscar)
+        layout.addWidget(self.label_coincidencias)
         layout.addWidget(self.boton_match_case)
         layout.addWidget(self.boton_regex)
         layout.addWidget(self.boton_palabra_completa)
@@ -692,7 +5198,7 @@ class VentanaPrincipal(QMainWindow):
         return busqueda_container
 
     def mostrar_barra_busqueda(self, modo_reemplazar=False):
-        editor = self.obtener_editor_activo()
+        editor = self.obtener_editor_texto()
         if editor is None: return
 
         self._configurar_modo_busqueda(modo_reemplazar)
@@ -709,8 +5215,10 @@ class VentanaPrincipal(QMainWindow):
 
     def ocultar_barra_busqueda(self):
         self.widget_busqueda.hide()
-        editor = self.obtener_editor_activo()
+        self.temporizador_busqueda.stop()
+        editor = self.obtener_editor_texto()
         if editor:
+            editor.sesion_busqueda.buscar(None) # Quita el resaltado de las coincidencias
             editor.text_editor.setFocus()
         self.boton_buscar.setChecked(False)
 
@@ -744,62 +5252,81 @@ class VentanaPrincipal(QMainWindow):
         else:
             self.mostrar_barra_busqueda()
 
-    def get_opciones_busqueda(self):
-        opciones = QTextDocument.FindFlag(0)
-        if self.boton_match_case.isChecked():
-            opciones |= QTextDocument.FindFlag.FindCaseSensitively
-        if self.boton_palabra_completa.isChecked():
-            opciones |= QTextDocument.FindFlag.FindWholeWords
-        return opciones
-
-    def buscar_siguiente(self):
-        editor = self.obtener_editor_activo()
-        if not editor: return
+    def consulta_busqueda(self):
+        """``(texto, usar_regex, mayusculas, palabra_completa)`` de la barra, o None si está vacía."""
         texto_a_buscar = self.campo_buscar.text()
-        if not texto_a_buscar: return
-        
-        opciones = self.get_opciones_busqueda()
-        
-        # Determinar si buscar con Regex o texto plano
-        if self.boton_regex.isChecked():
-            patron = QRegularExpression(texto_a_buscar)
-            encontrado = editor.text_editor.find(patron, opciones)
+        if not texto_a_buscar:
+            return None
+        return (texto_a_buscar, self.boton_regex.isChecked(),
+                self.boton_match_case.isChecked(), self.boton_palabra_completa.isChecked())
+
+    def patron_busqueda(self):
+        """Compila la búsqueda de la barra; None (con aviso) si está vacía o no es válida."""
+        consulta = self.consulta_busqueda()
+        if consulta is None:
+            return None
+        try:
+            return compilar_busqueda(*consulta)
+        except re.error as e:
+            self.barra_estado.showMessage(f"Expresión regular no válida: {e.msg}", 5000)
+            return None
+
+    def sesion_busqueda_activa(self, seleccionar=False):
+        """Sesión del editor activo con la búsqueda actual de la barra (la crea si cambió)."""
+        self.temporizador_busqueda.stop() # Lo escrito hasta ahora se aplica ya
+        editor = self.obtener_editor_texto()
+        if not editor: return None
+        sesion = editor.sesion_busqueda
+        patron = self.patron_busqueda()
+        if patron is None:
+            return None
+        if sesion.patron != patron:
+            sesion.buscar(patron, self.consulta_busqueda(), seleccionar)
+        return sesion
+
+    def _texto_busqueda_cambiado(self, texto):
+        self.label_coincidencias.setText("..." if texto else "")
+        self.temporizador_busqueda.start() # Reinicia la espera con cada tecla
+
+    def reiniciar_busqueda(self, seleccionar=False):
+        """Vuelve a indexar al cambiar el texto u opciones (sólo si la barra está abierta)."""
+        editor = self.obtener_editor_texto()
+        if not editor: return
+        if self.widget_busqueda.isVisible() and self.campo_buscar.text():
+            self.sesion_busqueda_activa(seleccionar)
+        else:
+            editor.sesion_busqueda.buscar(None)
+        self.actualizar_contador_busqueda()
+
+    def actualizar_contador_busqueda(self):
+        """Muestra "n de N" para la sesión del editor activo."""
+        editor = self.obtener_editor_texto()
+        sesion = editor.sesion_busqueda if editor else None
+        if sesion is None or sesion.patron is None:
+            self.label_coincidencias.setText("")
+        elif sesion.error:
+            self.label_coincidencias.setText(sesion.error)
+        elif not sesion.lista:
+            self.label_coincidencias.setText("...")
+        elif not sesion.inicios:
+            self.label_coincidencias.setText("Sin resultados")
         else:
-            encontrado = editor.text_editor.find(texto_a_buscar, opciones)
+            actual = sesion.actual()
+            posicion = actual + 1 if actual is not None else "?"
+            self.label_coincidencias.setText(f"{posicion} de {len(sesion.inicios)}")
 
-        if not encontrado:
-            editor.text_editor.moveCursor(QTextCursor.MoveOperation.Start)
-            # Reintentar la búsqueda desde el principio
-            if self.boton_regex.isChecked():
-                editor.text_editor.find(QRegularExpression(texto_a_buscar), opciones)
-            else:
-                editor.text_editor.find(texto_a_buscar, opciones)
+    def buscar_siguiente(self):
+        sesion = self.sesion_busqueda_activa()
+        if sesion is not None:
+            sesion.seleccionar(adelante=True)
 
     def buscar_anterior(self):
-        editor = self.obtener_editor_activo()
-        if not editor: return
-        texto_a_buscar = self.campo_buscar.text()
-        if not texto_a_buscar: return
-
-        opciones = self.get_opciones_busqueda() | QTextDocument.FindFlag.FindBackward
-        
-        # Determinar si buscar con Regex o texto plano
-        if self.boton_regex.isChecked():
-            patron = QRegularExpression(texto_a_buscar)
-            encontrado = editor.text_editor.find(patron, opciones)
-        else:
-            encontrado = editor.text_editor.find(texto_a_buscar, opciones)
-
-        if not encontrado:
-            editor.text_editor.moveCursor(QTextCursor.MoveOperation.End)
-            # Reintentar la búsqueda desde el final
-            if self.boton_regex.isChecked():
-                editor.text_editor.find(QRegularExpression(texto_a_buscar), opciones)
-            else:
-                editor.text_editor.find(texto_a_buscar, opciones)
+        sesion = self.sesion_busqueda_activa()
+        if sesion is not None:
+            sesion.seleccionar(adelante=False)
 
     def reemplazar_uno(self):
-        editor = self.obtener_editor_activo()
+        editor = self.obtener_editor_texto()
         if not editor: return
 
         cursor = editor.text_editor.textCursor()
@@ -808,32 +5335,22 @@ class VentanaPrincipal(QMainWindow):
         self.buscar_siguiente()
 
     def reemplazar_todo(self):
-        editor = self.obtener_editor_activo()
+        editor = self.obtener_editor_texto()
         if not editor: return
-        texto_a_buscar = self.campo_buscar.text()
-        if not texto_a_buscar: return
-        texto_reemplazo = self.campo_reemplazar.text()
-        opciones = self.get_opciones_busqueda()
-        
-        documento = editor.text_editor.document()
-        cursor = QTextCursor(documento)
-        documento.undoStack().beginMacro("Reemplazar todo")
+        patron = self.patron_busqueda()
+        if patron is None: return
 
-        contador = 0
-        while True:
-            # Usar QRegularExpression si el botón está activado
-            if self.boton_regex.isChecked():
-                cursor = documento.find(QRegularExpression(texto_a_buscar), cursor, opciones)
-            else:
-                cursor = documento.find(texto_a_buscar, cursor, opciones)
+        vigilado = self.boton_regex.isChecked() # Las regex del usuario no se ejecutan en la interfaz
+        contador = editor.reemplazar_todo(patron, self.campo_reemplazar.text(), vigilado)
+        if contador is None:
+            self.barra_estado.showMessage("Reemplazando...")
+        else:
+            self.reemplazo_completado(editor, contador)
 
-            if cursor.isNull():
-                break
-            cursor.insertText(texto_reemplazo)
-            contador += 1
-        documento.undoStack().endMacro()
-        
-        if contador > 0:
+    def reemplazo_completado(self, editor, contador, error=None):
+        if error:
+            self.barra_estado.showMessage(f"No se pudo reemplazar: {error}", 5000)
+        elif contador > 0:
             self.barra_estado.showMessage(f"Reemplazados {contador} elementos.", 3000)
         else:
             self.barra_estado.showMessage("No se encontraron coincidencias.", 3000)
@@ -844,6 +5361,9 @@ class VentanaPrincipal(QMainWindow):
         if not editor:
             self.label_posicion_cursor.setText("Línea: --, Col: --")
             return
+        if isinstance(editor, VisorArchivoGrande):
+            self.label_posicion_cursor.setText(f"Línea: {editor.vista.primera_linea() + 1}, Col: --")
+            return
         cursor = editor.text_editor.textCursor()
         linea = cursor.blockNumber() + 1
         columna = cursor.columnNumber() + 1
@@ -854,15 +5374,28 @@ class VentanaPrincipal(QMainWindow):
         if not editor:
             self.label_contador_caracteres.setText("Caracteres: 0")
             return
-        num_caracteres = len(editor.text_editor.toPlainText())
-        self.label_contador_caracteres.setText(f"Caracteres: {num_caracteres}")
+        if isinstance(editor, VisorArchivoGrande):
+            self.label_contador_caracteres.setText(f"Líneas: {editor.total_lineas}")
+            return
+        estadisticas = editor.estadisticas
+        texto = f"Caracteres: {estadisticas.caracteres}  Palabras: {estadisticas.palabras}  Líneas: {estadisticas.lineas}"
+        if estadisticas.seleccion:
+            texto += f"  ({estadisticas.seleccion} seleccionados)"
+        self.label_contador_caracteres.setText(texto)
+
+    def actualizar_info_codificacion(self):
+        editor = self.obtener_editor_activo()
+        encoding = editor.encoding if editor else 'utf-8'
+        fin_linea = editor.fin_linea if editor else os.linesep
+        self.label_encoding.setText(NOMBRES_CODIFICACION.get(encoding, encoding.upper()))
+        self.label_fin_linea.setText(NOMBRES_FIN_LINEA[fin_linea])
 
     def actualizar_info_lenguaje(self):
         editor = self.obtener_editor_activo()
         if not editor or not editor.ruta_archivo:
             self.label_lenguaje.setText(self.theme_config.get('default_name', 'Texto Plano'))
             if editor:
-                editor.highlighter.load_theme(self.theme_config.get('default_theme', 'lib/txt/txt.lib'))
+                editor.cargar_tema(self.theme_config.get('default_theme', 'lib/txt/txt.lib'))
             return
 
         _, ext = os.path.splitext(editor.ruta_archivo)
@@ -871,15 +5404,14 @@ class VentanaPrincipal(QMainWindow):
 
         if lang_config:
             self.label_lenguaje.setText(lang_config.get('name', 'Desconocido'))
-            editor.highlighter.load_theme(lang_config.get('theme'))
+            editor.cargar_tema(lang_config.get('theme'))
         else:
             self.label_lenguaje.setText(self.theme_config.get('default_name', 'Texto Plano'))
-            editor.highlighter.load_theme(self.theme_config.get('default_theme', 'lib/txt/txt.lib'))
+            editor.cargar_tema(self.theme_config.get('default_theme', 'lib/txt/txt.lib'))
     
     def actualizar_estado_completo(self):
-        self.actualizar_barra_estado()
-        self.actualizar_contador_caracteres()
-        self.actualizar_info_lenguaje()
+        """Pide refrescar toda la barra de estado en el próximo fotograma."""
+        self.programador_estado.marcar()
 
     # --- MÉTODOS DE BARRAS/ACCIONES ---
 
@@ -889,23 +5421,23 @@ class VentanaPrincipal(QMainWindow):
         # 🟢 NUEVOS ATAJOS BÁSICOS
         self.accion_deshacer = QAction("&Deshacer", self)
         self.accion_deshacer.setShortcut("Ctrl+Z")
-        self.accion_deshacer.triggered.connect(lambda: self.obtener_editor_activo().text_editor.undo() if self.obtener_editor_activo() else None)
+        self.accion_deshacer.triggered.connect(lambda: self.obtener_editor_texto().text_editor.undo() if self.obtener_editor_texto() else None)
 
         self.accion_rehacer = QAction("&Rehacer", self)
         self.accion_rehacer.setShortcut("Ctrl+Y")
-        self.accion_rehacer.triggered.connect(lambda: self.obtener_editor_activo().text_editor.redo() if self.obtener_editor_activo() else None)
+        self.accion_rehacer.triggered.connect(lambda: self.obtener_editor_texto().text_editor.redo() if self.obtener_editor_texto() else None)
 
         self.accion_cortar = QAction("&Cortar", self)
         self.accion_cortar.setShortcut("Ctrl+X")
-        self.accion_cortar.triggered.connect(lambda: self.obtener_editor_activo().text_editor.cut() if self.obtener_editor_activo() else None)
+        self.accion_cortar.triggered.connect(lambda: self.obtener_editor_texto().text_editor.cut() if self.obtener_editor_texto() else None)
 
         self.accion_copiar = QAction("&Copiar", self)
         self.accion_copiar.setShortcut("Ctrl+C")
-        self.accion_copiar.triggered.connect(lambda: self.obtener_editor_activo().text_editor.copy() if self.obtener_editor_activo() else None)
+        self.accion_copiar.triggered.connect(lambda: self.obtener_editor_texto().text_editor.copy() if self.obtener_editor_texto() else None)
 
         self.accion_pegar = QAction("&Pegar", self)
         self.accion_pegar.setShortcut("Ctrl+V")
-        self.accion_pegar.triggered.connect(lambda: self.obtener_editor_activo().text_editor.paste() if self.obtener_editor_activo() else None)
+        self.accion_pegar.triggered.connect(lambda: self.obtener_editor_texto().text_editor.paste() if self.obtener_editor_texto() else None)
 
         self.accion_buscar = QAction("Buscar...", self)
         self.accion_buscar.setShortcut("Ctrl+F")
@@ -916,6 +5448,11 @@ class VentanaPrincipal(QMainWindow):
         self.accion_reemplazar.setShortcut("Ctrl+H")
         self.accion_reemplazar.setStatusTip("Muestra la barra de búsqueda y reemplazo")
         self.accion_reemplazar.triggered.connect(lambda: self.mostrar_barra_busqueda(modo_reemplazar=True))
+
+        self.accion_buscar_en_carpeta = QAction("Buscar en la carpeta...", self)
+        self.accion_buscar_en_carpeta.setShortcut("Ctrl+Shift+F")
+        self.accion_buscar_en_carpeta.setStatusTip("Busca en todos los archivos de la carpeta abierta")
+        self.accion_buscar_en_carpeta.triggered.connect(self.mostrar_busqueda_carpeta)
         
         # 🖥️ Menú Ver
         self.accion_wrap = QAction("&Ajuste de Línea", self)
@@ -925,12 +5462,63 @@ class VentanaPrincipal(QMainWindow):
         self.accion_wrap.setStatusTip("Activa/Desactiva el ajuste automático de línea")
         self.accion_wrap.triggered.connect(self.alternar_wrap)
 
+        self.accion_seguir = QAction("&Seguir el final del archivo", self)
+        self.accion_seguir.setCheckable(True)
+        self.accion_seguir.setStatusTip("Muestra lo que se va añadiendo al archivo (registros) sin volver a leerlo")
+        self.accion_seguir.triggered.connect(self.alternar_seguimiento)
+
         # Conectar el botón de la barra de actividades
-        self.boton_buscar.clicked.connect(self.mostrar_u_ocultar_busqueda)
+        self.boton_buscar.clicked.connect(self.alternar_panel_busqueda_carpeta)
         
+    def alternar_seguimiento(self, activo):
+        """Activa o desactiva el modo seguimiento en la pestaña actual.
+
+        Un archivo grande abierto en el visor pasa a una pestaña de texto que
+        sólo tiene su final; al dejar de seguir vuelve al visor.
+        """
+        editor = self.obtener_editor_activo()
+        maximo = self.theme_config.get('tail_max_lines', 10000)
+        if activo and isinstance(editor, VisorArchivoGrande):
+            nuevo = EditorConNumeros(self)
+            nuevo.ruta_archivo = editor.ruta_archivo
+            nuevo.encoding, nuevo.fin_linea = editor.encoding, editor.fin_linea
+            self._sustituir_pestana(editor, nuevo)
+            nuevo.seguir(maximo, desde_final=True)
+            self.accion_seguir.setChecked(True) # El cambio de pestaña la ha desmarcado
+        elif activo and isinstance(editor, EditorConNumeros):
+            error = editor.seguir(maximo)
+            if error:
+                self.accion_seguir.setChecked(False)
+                self.barra_estado.showMessage(f"No se puede seguir el archivo: {error}", 5000)
+        elif isinstance(editor, EditorConNumeros) and editor.seguidor is not None:
+            if editor.dejar_de_seguir():
+                # El documento no tiene el archivo entero: se vuelve a abrir como al principio
+                try:
+                    grande = os.path.getsize(editor.ruta_archivo) >= self.umbral_archivo_grande()
+                    visor = VisorArchivoGrande(self, editor.ruta_archivo) if grande else None
+                except (OSError, ValueError):
+                    visor = None
+                if visor is not None:
+                    self._sustituir_pestana(editor, visor)
+                else:
+                    editor.recargar(descartar=True)
+        else:
+            self.accion_seguir.setChecked(False)
+
+    def _sustituir_pestana(self, anterior, nuevo):
+        indice = self.tab_widget.indexOf(anterior)
+        self.tab_widget.insertTab(indice, nuevo, os.path.basename(nuevo.ruta_archivo))
+        self.tab_widget.setCurrentWidget(nuevo)
+        self.tab_widget.removeTab(indice + 1)
+        self.registro_documentos.quitar(anterior)
+        self.registro_documentos.registrar(nuevo, nuevo.ruta_archivo)
+        anterior.cerrar()
+        anterior.deleteLater()
+        self.actualizar_titulo_pestana(nuevo)
+
     def alternar_wrap(self, checked):
         """Alterna el modo de ajuste de texto."""
-        editor = self.obtener_editor_activo()
+        editor = self.obtener_editor_texto()
         if not editor: return
         if checked:
             # Ajustar al ancho de la ventana (el equivalente es WordWrap)
@@ -946,6 +5534,11 @@ class VentanaPrincipal(QMainWindow):
         self.accion_abrir.setStatusTip("Abrir un archivo de texto")
         self.accion_abrir.triggered.connect(self.abrir_archivo)
 
+        self.accion_ir_a_archivo = QAction("Ir a archivo...", self)
+        self.accion_ir_a_archivo.setShortcut("Ctrl+P")
+        self.accion_ir_a_archivo.setStatusTip("Abre un archivo de la carpeta escribiendo parte de su nombre")
+        self.accion_ir_a_archivo.triggered.connect(self.paleta_apertura.abrir)
+
         self.accion_guardar = QAction("&Guardar", self)
         self.accion_guardar.setShortcut("Ctrl+S")
         self.accion_guardar.setStatusTip("Guardar el archivo actual")
@@ -970,6 +5563,7 @@ class VentanaPrincipal(QMainWindow):
         # 📂 Menú Archivo
         menu_archivo = menu_bar.addMenu("&Archivo")
         menu_archivo.addAction(self.accion_abrir)
+        menu_archivo.addAction(self.accion_ir_a_archivo)
         menu_archivo.addAction(self.accion_guardar)
         menu_archivo.addAction(self.accion_guardar_como)
         menu_archivo.addSeparator()  # Línea separadora
@@ -986,10 +5580,12 @@ class VentanaPrincipal(QMainWindow):
         menu_editar.addSeparator()
         menu_editar.addAction(self.accion_buscar)
         menu_editar.addAction(self.accion_reemplazar)
+        menu_editar.addAction(self.accion_buscar_en_carpeta)
 
         # 🖥️ Menú Ver
         menu_ver = menu_bar.addMenu("&Ver")
         menu_ver.addAction(self.accion_wrap)
+        menu_ver.addAction(self.accion_seguir)
 
         # --- Controles de Ventana (Minimizar, Maximizar, Cerrar) ---
         controles_ventana_widget = QWidget()
@@ -1036,16 +5632,27 @@ class VentanaPrincipal(QMainWindow):
         self.label_posicion_cursor = QLabel("Línea: 1, Col: 1")
         self.label_contador_caracteres = QLabel("Caracteres: 0")
         self.label_encoding = QLabel("UTF-8")
+        self.label_fin_linea = QLabel(NOMBRES_FIN_LINEA[os.linesep])
         self.label_lenguaje = QLabel("Texto Plano")
 
         # Añadir widgets permanentes a la derecha (se añaden de derecha a izquierda)
         self.barra_estado.addPermanentWidget(self.label_posicion_cursor)
         self.barra_estado.addPermanentWidget(self.label_contador_caracteres)
         self.barra_estado.addPermanentWidget(self.label_encoding)
+        self.barra_estado.addPermanentWidget(self.label_fin_linea)
         self.barra_estado.addPermanentWidget(self.label_lenguaje)
 
+        # Los refrescos se agrupan y se aplican como mucho una vez por fotograma
+        self.programador_estado = ProgramadorBarraEstado({
+            'posicion': self.actualizar_barra_estado,
+            'contador': self.actualizar_contador_caracteres,
+            'codificacion': self.actualizar_info_codificacion,
+            'lenguaje': self.actualizar_info_lenguaje,
+        }, self)
+
         # Actualizar los contadores iniciales
-        self.actualizar_estado_completo()
+        self.programador_estado.marcar()
+        self.programador_estado.aplicar()
 
     # --- MÉTODOS PARA PANELES ---
     def alternar_panel_explorador(self):
@@ -1055,6 +5662,32 @@ class VentanaPrincipal(QMainWindow):
         else:
             self.dock_explorador.show()
             
+    def alternar_panel_busqueda_carpeta(self):
+        """Muestra u oculta el panel de búsqueda en la carpeta."""
+        if self.dock_busqueda_carpeta.isVisible():
+            self.dock_busqueda_carpeta.hide()
+        else:
+            self.mostrar_busqueda_carpeta()
+
+    def mostrar_busqueda_carpeta(self):
+        self.dock_busqueda_carpeta.show()
+        self.panel_busqueda_carpeta.enfocar()
+
+    def carpeta_abierta(self):
+        """Carpeta raíz del explorador, o None si no se ha abierto ninguna."""
+        if self.stacked_widget_explorador.currentWidget() is not self.tree_view:
+            return None
+        return self.model.raiz or None
+
+    def abrir_coincidencia(self, ruta_archivo, linea, columna, longitud):
+        """Abre (o activa) el archivo de un resultado de búsqueda y selecciona la coincidencia."""
+        self.abrir_archivo_con_ruta(ruta_archivo)
+        editor = self.registro_documentos.buscar(ruta_archivo)
+        if isinstance(editor, EditorConNumeros):
+            editor.ir_a(linea, columna, longitud)
+        elif isinstance(editor, VisorArchivoGrande):
+            editor.vista.verticalScrollBar().setValue(linea)
+
     def alternar_maximizado(self):
         """Maximiza la ventana si está en modo normal, o la restaura si está maximizada."""
         if self.isMaximized():
@@ -1063,6 +5696,7 @@ class VentanaPrincipal(QMainWindow):
             self.showMaximized()
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support() # El vigilante de regex lanza procesos también en el ejecutable
     app = QApplication(sys.argv)
     editor = VentanaPrincipal()
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,30 @@
+import VisualCode as V
+
+def puntuar(consulta, ruta):
+    return V.puntuar_ruta(consulta, ruta, ruta.lower(), ruta.rfind('/') + 1)
+
+def mejores(consulta, rutas):
+    puntuadas = [(puntuar(consulta, ruta), ruta) for ruta in rutas]
+    return [ruta for puntos, ruta in sorted(puntuadas, key=lambda p: -p[0]) if puntos is not None]
+
+def test_los_caracteres_deben_ir_en_orden():
+    assert puntuar('abc', 'a/b/c.txt') is not None
+    assert puntuar('cba', 'a/b/c.txt') is None
+    assert puntuar('z', 'a/b/c.txt') is None
+
+def test_gana_lo_que_cae_en_el_nombre():
+    assert mejores('main', ['main/otros/x.py', 'src/main.py']) == ['src/main.py', 'main/otros/x.py']
+
+def test_gana_lo_seguido_y_los_comienzos_de_palabra():
+    assert mejores('ic', ['src/indice_carpeta.py', 'src/ic.py', 'src/logic.py'])[0] == 'src/ic.py'
+    assert mejores('ic', ['src/indice_carpeta.py', 'src/basico.py'])[0] == 'src/indice_carpeta.py'
+    assert mejores('lc', ['src/LectorCarpeta.py', 'src/logica.py'])[0] == 'src/LectorCarpeta.py' # Cambio a mayúscula
+
+def test_a_igualdad_gana_la_ruta_mas_corta():
+    assert mejores('a', ['x/yy/a.py', 'x/a.py']) == ['x/a.py', 'x/yy/a.py']
+
+def test_subsecuencia():
+    assert V.es_subsecuencia('vcp', 'visualcode.py')
+    assert not V.es_subsecuencia('pcv', 'visualcode.py')
+    assert V.patron_subsecuencia('v.p').search('visual.py')
+    assert not V.patron_subsecuencia('v.p').search('vxp')
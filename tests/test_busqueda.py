@@ -0,0 +1,38 @@
+import pytest
+
+import VisualCode as V
+
+def consulta(texto, usar_regex=False, mayusculas=False, palabra_completa=False):
+    return (texto, usar_regex, mayusculas, palabra_completa)
+
+@pytest.mark.parametrize('anterior, nueva, refina', [
+    (consulta('fun'), consulta('func'), True),
+    (consulta('Fun'), consulta('func'), False), # Otro texto tecleado: se busca de cero
+    (consulta('fun'), consulta('fan'), False), # No es una continuación
+    (consulta('aa'), consulta('aab'), False), # Prefijo que también es sufijo: hubo solapes
+    (consulta('abab'), consulta('ababc'), False),
+    (consulta('Aa', mayusculas=True), consulta('Aab', mayusculas=True), True),
+    (consulta('aA'), consulta('aAb'), False), # Sin mayúsculas 'a' y 'A' son el mismo borde
+    (consulta('fun'), consulta('func', mayusculas=True), False),
+    (consulta('fun', usar_regex=True), consulta('func'), False),
+    (consulta('fun'), consulta('fun.', usar_regex=True), False),
+    (consulta('fun', palabra_completa=True), consulta('func', palabra_completa=True), False),
+    (None, consulta('func'), False),
+])
+def test_consulta_refina(anterior, nueva, refina):
+    assert V.consulta_refina(anterior, nueva) == refina
+
+@pytest.mark.parametrize('texto, corta, larga', [
+    ('def funcion(): return funcion_2() + fun', 'fun', 'funcion'),
+    ('FuncFUNCfunc', 'fun', 'func'),
+    ('año 😀 año 😀 añoñ', 'añ', 'año'), # Posiciones de Qt con caracteres astrales
+])
+def test_refinar_da_lo_mismo_que_buscar_de_cero(texto, corta, larga):
+    anteriores, _ = V.buscar_coincidencias(texto, V.compilar_busqueda(corta))
+    patron = V.compilar_busqueda(larga)
+    assert V.refinar_coincidencias(texto, patron, anteriores) == V.buscar_coincidencias(texto, patron)
+
+def test_refinar_se_puede_cancelar():
+    texto = 'ab' * 10
+    anteriores, _ = V.buscar_coincidencias(texto, V.compilar_busqueda('a'))
+    assert V.refinar_coincidencias(texto, V.compilar_busqueda('ab'), anteriores, lambda: True) is None
@@ -0,0 +1,37 @@
+import codecs
+import os
+
+import pytest
+
+import VisualCode as V
+
+@pytest.mark.parametrize('datos, esperada', [
+    (codecs.BOM_UTF8 + 'hola'.encode('utf-8'), 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE + 'hola'.encode('utf-16-le'), 'utf-16'),
+    (codecs.BOM_UTF16_BE + 'hola'.encode('utf-16-be'), 'utf-16'),
+    (codecs.BOM_UTF32_LE + 'hola'.encode('utf-32-le'), 'utf-32'),
+    ('año'.encode('utf-8'), 'utf-8'),
+    (b'', 'utf-8'),
+    ('línea 1\nlínea 2\n'.encode('utf-16-le'), 'utf-16-le'),
+    ('línea 1\nlínea 2\n'.encode('utf-16-be'), 'utf-16-be'),
+    ('café “cita”'.encode('cp1252'), 'cp1252'),
+    (b'\x81\x8d', 'latin-1'), # Bytes que Windows 1252 no define
+])
+def test_detectar_codificacion(datos, esperada):
+    assert V.detectar_codificacion(datos) == esperada
+
+def test_un_caracter_cortado_al_final_del_prefijo_sigue_siendo_utf8():
+    datos = 'ñandú'.encode('utf-8')
+    assert V.detectar_codificacion(datos[:-1]) == 'utf-8'
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('a\nb\nc', '\n'),
+    ('a\r\nb\r\nc', '\r\n'),
+    ('a\rb\rc', '\r'),
+    ('a\r\nb\r\nc\nd', '\r\n'), # Manda el más frecuente
+])
+def test_detectar_fin_linea(texto, esperado):
+    assert V.detectar_fin_linea(texto) == esperado
+
+def test_sin_saltos_de_linea_usa_el_del_sistema():
+    assert V.detectar_fin_linea('una sola línea') == os.linesep
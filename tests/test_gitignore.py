@@ -0,0 +1,75 @@
+import os
+import re
+
+import pytest
+
+import VisualCode as V
+
+def coincide(linea, relativa, es_carpeta=False):
+    regex, negada, solo_carpetas = V.regla_gitignore(linea)
+    return bool(regex.match(relativa)) and (es_carpeta or not solo_carpetas)
+
+@pytest.mark.parametrize('glob, ruta, esperado', [
+    ('*.py', 'a.py', True),
+    ('*.py', 'src/a.py', False), # * no cruza /
+    ('a?c', 'abc', True),
+    ('a?c', 'a/c', False),
+    ('**/b', 'x/y/b', True),
+    ('**/b', 'b', True),
+    ('a/**', 'a/x/y', True),
+    ('a/**/b', 'a/b', True),
+    ('[abc].txt', 'b.txt', True),
+    ('[!abc].txt', 'b.txt', False),
+    ('\\*.txt', '*.txt', True),
+    ('\\*.txt', 'a.txt', False),
+])
+def test_glob_a_regex(glob, ruta, esperado):
+    assert bool(re.fullmatch(V._glob_a_regex(glob), ruta)) == esperado
+
+@pytest.mark.parametrize('linea', ['', '# comentario', '   ', '/', '!'])
+def test_lineas_sin_patron(linea):
+    assert V.regla_gitignore(linea) is None
+
+def test_sin_barra_vale_a_cualquier_profundidad():
+    assert coincide('*.log', 'a.log')
+    assert coincide('*.log', 'x/y/a.log')
+
+def test_con_barra_es_relativa_a_su_carpeta():
+    assert coincide('/build', 'build')
+    assert not coincide('/build', 'src/build')
+    assert coincide('doc/*.txt', 'doc/a.txt')
+    assert not coincide('doc/*.txt', 'x/doc/a.txt')
+
+def test_barra_final_solo_carpetas():
+    assert coincide('build/', 'build', es_carpeta=True)
+    assert not coincide('build/', 'build', es_carpeta=False)
+
+def test_negada_y_espacios():
+    assert V.regla_gitignore('!keep.log')[1]
+    assert coincide('a.txt   \n', 'a.txt') # Los espacios finales no cuentan
+    assert coincide('a\\ ', 'a ') # Salvo escapados
+
+def test_leer_gitignore(tmp_path):
+    ruta = tmp_path / '.gitignore'
+    ruta.write_text('# cosas\n*.log\n\n!keep.log\nbuild/\n', encoding='utf-8')
+    reglas = V.leer_gitignore(str(ruta))
+    assert [(negada, solo_carpetas) for _, negada, solo_carpetas in reglas] == [
+        (False, False), (True, False), (False, True)]
+    assert V.leer_gitignore(str(tmp_path / 'no_existe')) == []
+
+def test_filtro_carpeta(tmp_path):
+    (tmp_path / '.gitignore').write_text('*.log\n!keep.log\nbuild/\n', encoding='utf-8')
+    (tmp_path / 'src' / 'gen').mkdir(parents=True)
+    (tmp_path / 'src' / '.gitignore').write_text('gen/\n', encoding='utf-8')
+    (tmp_path / 'build').mkdir()
+    for nombre in ('a.log', 'keep.log', 'src/a.py', 'src/gen/b.py', 'build/c.py', 'd.pyc'):
+        (tmp_path / nombre).write_text('x', encoding='utf-8')
+    filtro = V.FiltroCarpeta(str(tmp_path), V.EXCLUIR_POR_DEFECTO)
+    archivos = sorted(
+        os.path.relpath(os.path.join(directorio, nombre), tmp_path).replace(os.sep, '/')
+        for directorio, _, nombres in filtro.recorrer(str(tmp_path)) for nombre in nombres)
+    assert archivos == ['.gitignore', 'keep.log', 'src/.gitignore', 'src/a.py']
+    assert filtro.oculta(str(tmp_path / 'src' / 'gen' / 'b.py'), False)
+    assert filtro.oculta(str(tmp_path / 'd.pyc'), False) # files_exclude
+    assert not filtro.oculta(str(tmp_path / 'keep.log'), False)
+    assert filtro.oculta(str(tmp_path.parent), True) # Fuera de la raíz
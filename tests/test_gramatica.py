@@ -0,0 +1,51 @@
+import os
+
+import VisualCode as V
+
+RUTA_PYTHON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lib', 'python', 'py.lib')
+
+def categorias(texto, tramos):
+    return [(texto[inicio:inicio + longitud], categoria) for inicio, longitud, categoria in tramos]
+
+def test_un_solo_recorrido_sin_solapes():
+    g = V.obtener_gramatica(RUTA_PYTHON)
+    texto = 'def f(x): return "if" # if'
+    tramos, estado = g.tokenizar(texto)
+    assert estado == 0
+    assert ('def', 'keyword') in categorias(texto, tramos)
+    assert ('f', 'function') in categorias(texto, tramos)
+    assert ('"if"', 'string') in categorias(texto, tramos)
+    assert ('# if', 'comment') in categorias(texto, tramos)
+    # La palabra clave dentro de la cadena y del comentario no se marca aparte
+    assert categorias(texto, tramos).count(('if', 'keyword')) == 0
+    fines = [inicio + longitud for inicio, longitud, _ in tramos]
+    assert all(fin <= siguiente for fin, (siguiente, _, _) in zip(fines, tramos[1:]))
+
+def test_la_apertura_triple_gana_a_la_cadena_vacia():
+    g = V.obtener_gramatica(RUTA_PYTHON)
+    tramos, estado = g.tokenizar('x = """doc')
+    assert estado != 0
+    assert categorias('x = """doc', tramos)[-1] == ('"""doc', 'string')
+
+def test_el_estado_de_bloque_pasa_de_linea_en_linea():
+    g = V.Gramatica([('keyword', r'\bif\b')], [('comment', '/*', '*/'), ('string', '"""', '"""')])
+    lineas = ['if /* abre', 'if dentro', 'sigue */ if', 'if """', 'fin """']
+    estado = 0
+    estados = []
+    resultados = []
+    for linea in lineas:
+        tramos, estado = g.tokenizar(linea, estado)
+        estados.append(estado)
+        resultados.append(categorias(linea, tramos))
+    assert estados == [1, 1, 0, 2, 0]
+    assert resultados[1] == [('if dentro', 'comment')]
+    assert resultados[2] == [('sigue */', 'comment'), ('if', 'keyword')]
+    assert resultados[4] == [('fin """', 'string')]
+
+def test_posiciones_en_unidades_utf16():
+    g = V.Gramatica([('keyword', r'\bif\b')])
+    tramos, _ = g.tokenizar('😀 if')
+    assert tramos == [(3, 2, 'keyword')] # El emoji ocupa dos unidades en Qt
+
+def test_sin_reglas_es_texto_plano():
+    assert V.Gramatica([]).tokenizar('lo que sea', 3) == ([], 0)
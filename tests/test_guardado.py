@@ -0,0 +1,83 @@
+import codecs
+import os
+import stat
+
+import pytest
+
+import VisualCode as V
+
+def guardar(ruta, texto, **opciones):
+    trabajo = V.TrabajoGuardado(None, str(ruta), texto, **opciones)
+    trabajo.ejecutar()
+    return trabajo
+
+def test_sustituye_el_archivo_de_una_vez(tmp_path):
+    ruta = tmp_path / 'a.txt'
+    ruta.write_bytes(b'viejo')
+    inodo = os.stat(ruta).st_ino
+    trabajo = guardar(ruta, 'nuevo')
+    assert ruta.read_bytes() == b'nuevo'
+    assert os.stat(ruta).st_ino != inodo # Renombrado encima, no reescrito en el sitio
+    assert trabajo.firma == V.firma_archivo(str(ruta))
+    assert os.listdir(tmp_path) == ['a.txt'] # Sin temporales sueltos
+
+def test_si_falla_el_original_queda_intacto(tmp_path):
+    ruta = tmp_path / 'a.txt'
+    ruta.write_bytes(b'original')
+    with pytest.raises(UnicodeEncodeError):
+        guardar(ruta, 'ñ', encoding='ascii')
+    assert ruta.read_bytes() == b'original'
+    assert os.listdir(tmp_path) == ['a.txt']
+
+@pytest.mark.parametrize('encoding, bom', [
+    ('utf-8-sig', codecs.BOM_UTF8),
+    ('utf-16', codecs.BOM_UTF16),
+    ('utf-32', codecs.BOM_UTF32),
+])
+def test_una_sola_bom_aunque_se_escriba_por_fragmentos(tmp_path, monkeypatch, encoding, bom):
+    monkeypatch.setattr(V.TrabajoGuardado, 'TAMANO_FRAGMENTO', 4)
+    ruta = tmp_path / 'a.txt'
+    texto = 'línea uno\nlínea dos\n'
+    guardar(ruta, texto, encoding=encoding, fin_linea='\n')
+    datos = ruta.read_bytes()
+    assert datos.startswith(bom)
+    assert datos.count(bom) == 1
+    assert datos.decode(encoding) == texto
+
+@pytest.mark.parametrize('fin_linea', ['\n', '\r\n', '\r'])
+def test_conserva_el_fin_de_linea(tmp_path, fin_linea):
+    ruta = tmp_path / 'a.txt'
+    guardar(ruta, 'a\nb\nc\n', fin_linea=fin_linea)
+    assert ruta.read_bytes() == f'a{fin_linea}b{fin_linea}c{fin_linea}'.encode()
+
+def test_conserva_los_permisos(tmp_path):
+    ruta = tmp_path / 'script.sh'
+    ruta.write_bytes(b'#!/bin/sh\n')
+    os.chmod(ruta, 0o750)
+    guardar(ruta, '#!/bin/sh\necho hola\n', fin_linea='\n')
+    assert stat.S_IMODE(os.stat(ruta).st_mode) == 0o750
+
+def test_un_archivo_nuevo_usa_la_mascara(tmp_path):
+    ruta = tmp_path / 'nuevo.txt'
+    guardar(ruta, 'x', mascara=0o027)
+    assert stat.S_IMODE(os.stat(ruta).st_mode) == 0o640
+
+def test_sigue_los_enlaces(tmp_path):
+    destino = tmp_path / 'destino.txt'
+    destino.write_bytes(b'viejo')
+    enlace = tmp_path / 'enlace.txt'
+    enlace.symlink_to(destino)
+    guardar(enlace, 'nuevo')
+    assert enlace.is_symlink()
+    assert destino.read_bytes() == b'nuevo'
+
+def test_no_pisa_un_archivo_cambiado_en_disco(tmp_path):
+    ruta = tmp_path / 'a.txt'
+    ruta.write_bytes(b'leido')
+    firma = V.firma_archivo(str(ruta))
+    ruta.write_bytes(b'cambiado por otro programa')
+    trabajo = V.TrabajoGuardado(None, str(ruta), 'mio', firma_esperada=firma)
+    with pytest.raises(V.ArchivoCambiadoEnDisco):
+        trabajo.ejecutar()
+    assert trabajo.conflicto
+    assert ruta.read_bytes() == b'cambiado por otro programa'
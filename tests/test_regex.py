@@ -0,0 +1,32 @@
+import re
+
+import pytest
+
+import VisualCode as V
+
+@pytest.mark.parametrize('patron', [
+    r'funcion_\d+',
+    r'def \w+\(',
+    r'(?:ab)+c',
+    r'a{1,5}b{2,}',
+    r'x|y|z', # Alternativa fuera de un cuantificador
+    r'(?:a|b){3}', # Dentro de uno acotado
+])
+def test_patrones_seguros(patron):
+    assert V.analizar_regex(re.compile(patron)) is None
+
+@pytest.mark.parametrize('patron, motivo', [
+    (r'(a+)+b', "cuantificadores anidados"),
+    (r'(?:\w*\s*)*$', "cuantificadores anidados"),
+    (r'(a|aa)*b', "alternativas"),
+    (r'(x+)\1', "referencias"),
+    (r'(a)?(?(1)b|c)', "referencias"),
+])
+def test_patrones_costosos(patron, motivo):
+    assert motivo in V.analizar_regex(re.compile(patron))
+
+def test_lo_que_no_retrocede_no_se_marca():
+    if not hasattr(V.sre_parse, 'POSSESSIVE_REPEAT'):
+        pytest.skip("cuantificadores posesivos desde Python 3.11")
+    assert V.analizar_regex(re.compile(r'(?>a+)+b')) is None
+    assert V.analizar_regex(re.compile(r'(?:a++)+b')) is None
@@ -0,0 +1,46 @@
+import re
+
+import pytest
+
+import VisualCode as V
+
+def trigrama(texto):
+    a, b, c = texto.encode('ascii')
+    return (a << 16) | (b << 8) | c
+
+def test_normalizar_pasa_a_ascii_en_minusculas():
+    assert V.normalizar_trigramas('HolA') == b'hola'
+    assert V.normalizar_trigramas('año') == b'a?o'
+    # Lo que una búsqueda sin mayúsculas iguala con ASCII queda como su letra
+    assert V.normalizar_trigramas('İK') == b'ik'
+
+def test_trigramas_distintos():
+    assert V.trigramas(b'abcab') == {trigrama('abc'), trigrama('bca'), trigrama('cab')}
+    assert V.trigramas(b'ab') == set()
+
+def test_consulta_literal():
+    assert V.trigramas_consulta('Func') == {trigrama('fun'), trigrama('unc')}
+    assert V.trigramas_consulta('a.b') == {trigrama('a.b')} # Sin regex el punto es literal
+
+@pytest.mark.parametrize('patron, esperados', [
+    (r'funcion_\d+_x', {'fun', 'unc', 'nci', 'cio', 'ion', 'on_'}),
+    (r'(?:hola)+ mundo', {'hol', 'ola', ' mu', 'mun', 'und', 'ndo'}), # La repetición puede seguir a sí misma
+    (r'foo(bar)?baz', {'foo', 'baz'}), # Lo opcional no se exige
+    (r'abc|xyz', set()), # Alternativas: ningún trigrama está en todas
+    (r'a.b', set()),
+])
+def test_consulta_regex(patron, esperados):
+    assert V.trigramas_consulta(patron, True) == {trigrama(t) for t in esperados}
+
+def test_regex_no_valida_no_acota():
+    assert V.trigramas_consulta('(abc', True) == set()
+
+@pytest.mark.parametrize('patron, texto', [
+    (r'(?i)DEF funcion_19_(1|2)_3\(', 'def FUNCION_19_2_3(x):'),
+    (r'funcion_1\d_9_2\b', 'llamar a funcion_17_9_2 ya'),
+    ('İstanbul', 'istanbul'),
+])
+def test_todo_texto_que_coincide_contiene_los_trigramas(patron, texto):
+    assert re.search(patron, texto, re.IGNORECASE)
+    consulta = V.trigramas_consulta(patron, True)
+    assert consulta <= V.trigramas(V.normalizar_trigramas(texto))